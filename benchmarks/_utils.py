@@ -0,0 +1,42 @@
+"""
+Shared helpers of the benchmark modules.
+
+Every benchmark module exposes ``run(number)`` returning a list of results (see ``result``), and can be run standalone.
+"""
+from __future__ import print_function
+
+import timeit
+
+import opentracing
+
+from basictracer import BasicTracer
+
+
+REPEAT = 5
+
+
+def tracers():
+    """The tracers every benchmark runs against: the no-op tracer (decorator own overhead) and BasicTracer."""
+    return (opentracing.Tracer(), BasicTracer())
+
+
+def per_call_us(case, number, repeat=REPEAT):
+    """Best per call time of ``case`` in microseconds."""
+    return min(timeit.repeat(case, number=number, repeat=repeat)) / number * 1e6
+
+
+def result(benchmark, tracer, case, value, number, unit='us/call'):
+    return {
+        'benchmark': benchmark,
+        'tracer': type(tracer).__name__ if tracer is not None else None,
+        'case': case,
+        'value': round(value, 4),
+        'unit': unit,
+        'number': number,
+    }
+
+
+def print_results(results):
+    for r in results:
+        print('{:<18} {:<12} {:<45} {:>12.3f} {}'.format(
+            r['benchmark'], r['tracer'] or '-', r['case'], r['value'], r['unit']))
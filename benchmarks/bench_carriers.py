@@ -0,0 +1,102 @@
+"""
+Span context extraction from a WSGI request environ: copying the headers into a dict vs all the request headers
+(``get_wsgi_headers``, the fallback for tracers with unknown propagation headers) vs the tracer propagation headers
+only (``get_wsgi_carrier``), with a few and many (e.g. behind a gateway) headers.
+
+Usage::
+
+    python benchmarks/bench_carriers.py [number]
+"""
+from __future__ import print_function
+
+import sys
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils.common import get_wsgi_headers
+from opentracing_utils.tracers import get_wsgi_carrier
+
+from _utils import per_call_us, print_results, result
+
+
+BENCHMARK = 'carriers'
+
+# Extra headers added by a gateway.
+GATEWAY_HEADERS = 60
+
+
+def request_environ(tracer, extra_headers=0):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': '/users/42',
+        'QUERY_STRING': 'fields=name',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8080',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': '0',
+        'HTTP_HOST': 'localhost:8080',
+        'HTTP_USER_AGENT': 'python-requests/2.25.1',
+        'HTTP_ACCEPT': '*/*',
+        'HTTP_ACCEPT_ENCODING': 'gzip, deflate',
+        'HTTP_CONNECTION': 'keep-alive',
+        'HTTP_AUTHORIZATION': 'Bearer token',
+        'HTTP_X_FORWARDED_FOR': '10.0.0.1',
+        'HTTP_X_REQUEST_ID': 'a2f1b3c4',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': None,
+        'wsgi.errors': None,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+    headers = {}
+    tracer.inject(tracer.start_span('parent').context, opentracing.Format.HTTP_HEADERS, headers)
+    environ.update(('HTTP_' + k.upper().replace('-', '_'), v) for k, v in headers.items())
+    environ.update(('HTTP_X_GATEWAY_HEADER_{}'.format(i), 'value') for i in range(extra_headers))
+
+    return environ
+
+
+def copied_headers(environ):
+    # The former Django middleware headers copy.
+    headers = {}
+
+    for k, v in environ.items():
+        k = k.lower().replace('_', '-')
+        k = k.replace('http-', '') if k.startswith('http-') else k
+        headers[k] = v
+
+    return headers
+
+
+def run(number):
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+
+    results = []
+    for headers, extra_headers in (('few headers', 0), ('gateway headers', GATEWAY_HEADERS)):
+        environ = request_environ(tracer, extra_headers)
+
+        cases = (
+            ('dict copy', lambda: tracer.extract(opentracing.Format.HTTP_HEADERS, copied_headers(environ))),
+            ('get_wsgi_headers', lambda: tracer.extract(opentracing.Format.HTTP_HEADERS, get_wsgi_headers(environ))),
+            ('get_wsgi_carrier',
+             lambda: tracer.extract(opentracing.Format.HTTP_HEADERS, get_wsgi_carrier(environ, tracer))),
+        )
+
+        results.extend(
+            result(BENCHMARK, tracer, '{}, {}'.format(name, headers), per_call_us(case, number), number)
+            for name, case in cases)
+
+    return results
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,102 @@
+"""
+Binary span wire format vs a JSON baseline: encoding and decoding cost, and encoded size. Also the recording cost of
+the span file recorders (buffered file writes vs memory-mapped file).
+
+Usage::
+
+    python benchmarks/bench_codec.py [number]
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from basictracer import BasicTracer
+
+from opentracing_utils.codec import HEADER, MmapSpanRecorder, SpanDecoder, SpanEncoder, SpanFileRecorder
+
+from _utils import REPEAT, print_results, result
+
+
+BENCHMARK = 'codec'
+
+BATCH = 100
+
+
+def finished_spans(tracer, count):
+    spans = []
+    for i in range(count):
+        span = tracer.start_span(operation_name='http_request', tags={
+            'component': 'flask', 'span.kind': 'server', 'http.method': 'GET', 'http.status_code': 200,
+            'http.url': 'http://example.org/users/{}'.format(i), 'error': False})
+        span.log_kv({'event': 'validated', 'items': i})
+        span.finish()
+        spans.append(span)
+
+    return spans
+
+
+def json_encode(spans):
+    return [json.dumps({
+        'trace_id': span.context.trace_id, 'span_id': span.context.span_id, 'parent_id': span.parent_id,
+        'operation_name': span.operation_name, 'start_time': span.start_time, 'duration': span.duration,
+        'tags': span.tags, 'logs': [[log.timestamp, log.key_values] for log in span.logs],
+    }).encode('utf-8') for span in spans]
+
+
+def json_decode(lines):
+    return [json.loads(line.decode('utf-8')) for line in lines]
+
+
+def binary_encode(spans):
+    encoder = SpanEncoder()
+    return [encoder.encode(span) for span in spans]
+
+
+def binary_decode(chunks):
+    return list(SpanDecoder().decode(b''.join(chunks)))
+
+
+def run(number):
+    tracer = BasicTracer()
+    spans = finished_spans(tracer, BATCH)
+    calls = max(number // BATCH, 1)
+
+    results = []
+    for name, encode, decode in (('json', json_encode, json_decode), ('binary', binary_encode, binary_decode)):
+        encoded = encode(spans)
+
+        encode_us = min(timeit.repeat(lambda: encode(spans), number=calls, repeat=REPEAT)) / (calls * BATCH) * 1e6
+        decode_us = min(timeit.repeat(lambda: decode(encoded), number=calls, repeat=REPEAT)) / (calls * BATCH) * 1e6
+        size = (sum(len(chunk) for chunk in encoded) + (len(HEADER) if name == 'binary' else 0)) / float(BATCH)
+
+        results.extend((
+            result(BENCHMARK, tracer, '{} encode'.format(name), encode_us, calls * BATCH, unit='us/span'),
+            result(BENCHMARK, tracer, '{} decode'.format(name), decode_us, calls * BATCH, unit='us/span'),
+            result(BENCHMARK, tracer, '{} size'.format(name), size, BATCH, unit='bytes/span'),
+        ))
+
+    directory = tempfile.mkdtemp()
+    try:
+        for name, recorder_class in (('file', SpanFileRecorder), ('mmap', MmapSpanRecorder)):
+            recording_us = []
+            for _ in range(REPEAT):
+                recorder = recorder_class(os.path.join(directory, '{}.bin'.format(name)))
+                recording_us.append(timeit.timeit(lambda: recorder.extend(spans), number=calls))
+                recorder.close()
+
+            results.append(result(
+                BENCHMARK, tracer, '{} recorder'.format(name), min(recording_us) / (calls * BATCH) * 1e6,
+                calls * BATCH, unit='us/span'))
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,170 @@
+"""
+Per-worker span recording cost: forwarding to a single aggregator vs a reporter per worker.
+
+Both setups pay the same export (spans serialized to JSON and sent in UDP datagrams, as agent reporters do): the
+per-worker reporter exports from an ``AsyncBatchRecorder`` thread in the worker itself, while forwarding workers only
+encode and send datagrams to a ``SpanAggregator`` doing the export in another process (a forked child, or a thread of
+this process where ``os.fork`` is not available).
+
+Timings are the worker process CPU time per recorded span (all its threads, not the aggregator child), including the
+final flush (``close``) of the worker recorder. The spans dropped by each setup (e.g. by the aggregator socket not
+keeping up with bursts) are reported too, since dropped spans are cheaper to record.
+
+Usage::
+
+    python benchmarks/bench_forwarding.py [number]
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import timeit
+
+from basictracer import BasicTracer
+
+from opentracing_utils import AsyncBatchRecorder, ForwardingRecorder, SpanAggregator
+
+from _utils import REPEAT, print_results, result
+
+
+BENCHMARK = 'forwarding'
+
+# Spans per exported UDP datagram.
+EXPORT_BATCH = 50
+
+# Worker CPU time (Python 3), wall time otherwise.
+cpu_timer = getattr(time, 'process_time', timeit.default_timer)
+
+
+class Exporter(object):
+    """Stand-in for a tracer reporter: JSON encoding and UDP datagrams to a local (never read) agent socket."""
+
+    def __init__(self):
+        self.agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.agent.bind(('127.0.0.1', 0))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, spans):
+        for index in range(0, len(spans), EXPORT_BATCH):
+            data = json.dumps([to_dict(span) for span in spans[index:index + EXPORT_BATCH]]).encode('utf-8')
+            try:
+                self.socket.sendto(data, self.agent.getsockname())
+            except socket.error:  # pragma: no cover
+                pass
+
+    def close(self):
+        self.socket.close()
+        self.agent.close()
+
+
+def to_dict(span):
+    # basictracer spans and forwarded ``SpanRecord``.
+    ids = getattr(span, 'context', span)
+    return {
+        'trace_id': ids.trace_id, 'span_id': ids.span_id, 'parent_id': span.parent_id,
+        'operation_name': span.operation_name, 'start_time': span.start_time, 'duration': span.duration,
+        'tags': span.tags,
+    }
+
+
+def finished_span():
+    span = BasicTracer().start_span(operation_name='http_request', tags={
+        'component': 'flask', 'span.kind': 'server', 'http.method': 'GET', 'http.url': 'http://example.org/users/42'})
+    span.finish()
+    return span
+
+
+def start_aggregator(socket_path):
+    """Start an exporting aggregator, return its stop function."""
+    if not hasattr(os, 'fork'):
+        exporter = Exporter()
+        aggregator = SpanAggregator(socket_path, exporter, max_queue_size=10 ** 6).start()
+
+        def stop():
+            aggregator.close()
+            exporter.close()
+
+        return stop
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            SpanAggregator(socket_path, Exporter(), max_queue_size=10 ** 6).serve_forever()
+        finally:
+            os._exit(0)
+
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+
+    def stop():
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    return stop
+
+
+def record(recorder, span, number):
+    """Seconds to record ``number`` spans and close ``recorder``."""
+    start = cpu_timer()
+    for _ in range(number):
+        recorder.record_span(span)
+    recorder.close()
+    return cpu_timer() - start
+
+
+def run(number):
+    span = finished_span()
+    tracer = BasicTracer()
+
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'spans.sock')
+    stop_aggregator = start_aggregator(socket_path)
+
+    def reporter():
+        exporter = Exporter()
+        recorder = AsyncBatchRecorder(exporter, max_queue_size=10 ** 6)
+        return recorder, recorder, exporter.close
+
+    def forwarding():
+        recorder = ForwardingRecorder(socket_path)
+        return recorder, recorder, None
+
+    def batched_forwarding():
+        forwarder = ForwardingRecorder(socket_path)
+        return AsyncBatchRecorder(forwarder.extend, max_queue_size=10 ** 6), forwarder, forwarder.close
+
+    cases = (
+        ('per-worker reporter (AsyncBatchRecorder)', reporter),
+        ('forwarding, datagram per span', forwarding),
+        ('forwarding, batched datagrams', batched_forwarding),
+    )
+
+    results = []
+    try:
+        for name, factory in cases:
+            timings = []
+            dropped = 0
+            for _ in range(REPEAT):
+                recorder, counter, cleanup = factory()
+                timings.append(record(recorder, span, number))
+                dropped = max(dropped, counter.dropped)
+                if cleanup is not None:
+                    cleanup()
+
+            results.append(result(BENCHMARK, tracer, name, min(timings) / number * 1e6, number))
+            results.append(result(BENCHMARK, tracer, name + ', dropped', dropped * 100.0 / number, number, unit='%'))
+    finally:
+        stop_aggregator()
+        shutil.rmtree(directory)
+
+    return results
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,47 @@
+"""
+Cold import time of ``opentracing_utils``, each import in a fresh interpreter.
+
+The baseline is the interpreter startup itself (``python -c pass``), included in every other case.
+
+Usage::
+
+    python benchmarks/bench_import.py [number]
+"""
+from __future__ import print_function
+
+import subprocess
+import sys
+import timeit
+
+from _utils import print_results, result
+
+
+BENCHMARK = 'import'
+
+CASES = (
+    ('interpreter startup', 'pass'),
+    ('import opentracing', 'import opentracing'),
+    ('import opentracing_utils', 'import opentracing_utils'),
+    ('from opentracing_utils import trace', 'from opentracing_utils import trace'),
+    ('from opentracing_utils import trace_requests', 'from opentracing_utils import trace_requests'),
+    ('opentracing_utils.__version__', 'import opentracing_utils; opentracing_utils.__version__'),
+)
+
+
+def cold_import_us(statement):
+    # ``-S`` is not used: site packages are part of the real startup cost.
+    return timeit.timeit(lambda: subprocess.check_call([sys.executable, '-c', statement]), number=1) * 1e6
+
+
+def run(number):
+    results = []
+
+    for name, statement in CASES:
+        best = min(cold_import_us(statement) for _ in range(number))
+        results.append(result(BENCHMARK, None, name, best, number, unit='us/import'))
+
+    return results
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
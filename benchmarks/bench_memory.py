@@ -0,0 +1,75 @@
+"""
+Memory retained per finished span: full ``BasicSpan`` objects vs ``SpanStore`` compact records.
+
+Spans are traced ``@trace`` calls with static tags, a per call tag and a log, as recorded by a ``basictracer`` tracer.
+
+Usage::
+
+    python benchmarks/bench_memory.py [number]
+"""
+from __future__ import print_function
+
+import gc
+import sys
+import tracemalloc
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import trace, extract_span_from_kwargs, SpanStore
+
+from _utils import print_results, result
+
+
+BENCHMARK = 'memory'
+
+
+class ListRecorder(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def record_span(self, span):
+        self.spans.append(span)
+
+
+@trace(component='bench', tags={'static': 'tag', 'flag': True}, pass_span=True)
+def traced(i, **kwargs):
+    span = extract_span_from_kwargs(**kwargs)
+    span.set_tag('i', i)
+    span.log_kv({'event': 'done'})
+
+
+def retained_bytes_per_span(recorder, number):
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    for i in range(number):
+        with opentracing.tracer.start_span(operation_name='parent') as parent:
+            traced(i, span=parent)
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return retained / float(number * 2)
+
+
+def run(number):
+    tracer = BasicTracer()
+
+    return [
+        result(BENCHMARK, tracer, 'BasicSpan list', retained_bytes_per_span(ListRecorder(), number), number,
+               unit='bytes/span'),
+        result(BENCHMARK, tracer, 'SpanStore', retained_bytes_per_span(SpanStore(), number), number,
+               unit='bytes/span'),
+    ]
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
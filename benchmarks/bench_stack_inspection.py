@@ -0,0 +1,71 @@
+"""
+Call stack frames inspection cost: frames locals scanning vs ``@trace`` frame markers.
+
+The traced parent span is ``depth`` frames above the traced call inspecting the stack.
+
+Usage::
+
+    python benchmarks/bench_stack_inspection.py [number]
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+import opentracing
+
+from opentracing_utils import trace, INSPECT_FRAME_MARKERS
+
+from _utils import REPEAT, print_results, result, tracers
+
+
+BENCHMARK = 'stack_inspection'
+
+DEPTHS = (10, 50, 100)
+
+
+@trace(inspect_stack=True)
+def leaf_locals():
+    pass
+
+
+@trace(inspect_stack=INSPECT_FRAME_MARKERS)
+def leaf_markers():
+    pass
+
+
+def descend(depth, leaf, number, results):
+    # Some locals per frame, as in real call stacks.
+    a, b, c = depth, leaf, results  # noqa
+
+    if depth > 1:
+        return descend(depth - 1, leaf, number, results)
+
+    results.append(min(timeit.repeat(leaf, number=number, repeat=REPEAT)) / number * 1e6)
+
+
+@trace()
+def root(depth, leaf, number, results):
+    descend(depth, leaf, number, results)
+
+
+def run(number):
+    results = []
+
+    for tracer in tracers():
+        # No active span: parent span detection falls back to call stack frames inspection.
+        opentracing.tracer = tracer
+
+        for depth in DEPTHS:
+            for name, leaf in (('f_locals', leaf_locals), ('frame markers', leaf_markers)):
+                timings = []
+                # Account for the benchmark own frames (timeit, root wrapper, leaf wrapper ...)
+                root(depth - 6, leaf, number, timings)
+                results.append(result(BENCHMARK, tracer, 'depth {} {}'.format(depth, name), timings[0], number))
+
+    return results
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(1000)
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
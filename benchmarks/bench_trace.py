@@ -0,0 +1,90 @@
+"""
+Per-call overhead of the ``@trace`` decorator, for each parent span discovery path and option.
+
+Usage::
+
+    python benchmarks/bench_trace.py [number]
+"""
+from __future__ import print_function
+
+import sys
+
+import opentracing
+
+from opentracing_utils import trace
+
+from _utils import per_call_us, print_results, result, tracers
+
+
+BENCHMARK = 'trace'
+
+
+def plain(a, b=None, **kwargs):
+    pass
+
+
+def extract_parent(*args, **kwargs):
+    return PARENT[0]
+
+
+# Parent span returned by ``extract_parent``, set per tracer.
+PARENT = [None]
+
+traced = trace()(plain)
+traced_pass_span = trace(pass_span=True)(plain)
+traced_tags = trace(component='bench', tags={'bench': True})(plain)
+traced_extractor = trace(span_extractor=extract_parent)(plain)
+traced_extractor_none = trace(span_extractor=lambda *args, **kwargs: None)(plain)
+traced_skip = trace(skip_span=lambda *args, **kwargs: True)(plain)
+traced_no_skip = trace(skip_span=lambda *args, **kwargs: False)(plain)
+traced_follows_from = trace(use_follows_from=True)(plain)
+traced_ignore_parent = trace(ignore_parent_span=True)(plain)
+traced_no_stack = trace(inspect_stack=False)(plain)
+
+
+def run(number):
+    results = []
+
+    for tracer in tracers():
+        opentracing.tracer = tracer
+        parent = tracer.start_span(operation_name='parent')
+        PARENT[0] = parent
+
+        cases = (
+            ('undecorated', lambda: plain(1, b=2)),
+            ('span_extractor', lambda: traced_extractor(1, b=2)),
+            ('span_extractor returning None + span kwarg', lambda: traced_extractor_none(1, b=2, span=parent)),
+            ('span kwarg', lambda: traced(1, b=2, span=parent)),
+            ('span kwarg + pass_span', lambda: traced_pass_span(1, b=2, span=parent)),
+            ('span kwarg + tags', lambda: traced_tags(1, b=2, span=parent)),
+            ('span kwarg + use_follows_from', lambda: traced_follows_from(1, b=2, span=parent)),
+            ('span kwarg + skip_span (skipped)', lambda: traced_skip(1, b=2, span=parent)),
+            ('span kwarg + skip_span (not skipped)', lambda: traced_no_skip(1, b=2, span=parent)),
+            ('ignore_parent_span', lambda: traced_ignore_parent(1, b=2)),
+            # ``parent`` is found a few frames up, in this function locals (deeper stacks in bench_stack_inspection).
+            ('stack inspection', lambda: traced(1, b=2)),
+            ('no parent span (inspect_stack=False)', lambda: traced_no_stack(1, b=2)),
+        )
+
+        for name, case in cases:
+            results.append(result(BENCHMARK, tracer, name, per_call_us(case, number), number))
+
+        # Tracer bound at decoration time, instead of ``opentracing.tracer`` lookups.
+        traced_bound = trace(tracer=tracer)(plain)
+        bound_us = per_call_us(lambda: traced_bound(1, b=2, span=parent), number)
+        results.append(result(BENCHMARK, tracer, 'span kwarg + bound tracer', bound_us, number))
+
+        with tracer.scope_manager.activate(parent, finish_on_close=False):
+            cases = (
+                ('scope manager active span', lambda: traced(1, b=2)),
+                ('scope manager active span, no kwargs', lambda: traced(1)),
+            )
+
+            for name, case in cases:
+                results.append(result(BENCHMARK, tracer, name, per_call_us(case, number), number))
+
+    return results
+
+
+if __name__ == '__main__':
+    print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,99 @@
+"""
+Run the benchmark suite.
+
+Usage::
+
+    python benchmarks/run.py [--number N] [--json results.json] [benchmark ...]
+
+Benchmarks are the ``bench_*.py`` modules of this directory (e.g. ``trace``, ``stack_inspection``), all of them by
+default. Results are printed, and optionally written as JSON (with the environment details) for comparing runs.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import glob
+import importlib
+import json
+import os
+import platform
+
+from _utils import print_results
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def available_benchmarks():
+    return sorted(
+        os.path.basename(p)[len('bench_'):-len('.py')] for p in glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py')))
+
+
+def distribution_version(name):
+    try:
+        try:
+            from importlib.metadata import version
+        except ImportError:
+            from pkg_resources import get_distribution
+            return get_distribution(name).version
+
+        return version(name)
+    except Exception:
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'opentracing': distribution_version('opentracing'),
+        'basictracer': distribution_version('basictracer'),
+        'opentracing_utils': distribution_version('opentracing-utils'),
+        'date': datetime.datetime.utcnow().isoformat() + 'Z',
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run opentracing-utils benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', help='Benchmarks to run: {}'.format(
+        ', '.join(available_benchmarks())))
+    parser.add_argument('--number', type=int, default=None, help='Calls per timing (default: benchmark specific).')
+    parser.add_argument('--json', dest='json_path', help='Write the results as JSON to this file ("-" for stdout).')
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks or available_benchmarks()
+    unknown = set(names) - set(available_benchmarks())
+    if unknown:
+        parser.error('Unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+    results = []
+    for name in names:
+        module = importlib.import_module('bench_{}'.format(name))
+        results.extend(module.run(args.number or DEFAULT_NUMBERS.get(name, 10000)))
+
+    if args.json_path != '-':
+        print_results(results)
+
+    if args.json_path:
+        output = json.dumps({'environment': environment(), 'results': results}, indent=2, sort_keys=True)
+        if args.json_path == '-':
+            print(output)
+        else:
+            with open(args.json_path, 'w') as f:
+                f.write(output)
+
+
+DEFAULT_NUMBERS = {
+    'carriers': 20000,
+    'codec': 20000,
+    'forwarding': 20000,
+    'import': 20,
+    'memory': 20000,
+    'stack_inspection': 5000,
+    'trace': 20000,
+}
+
+
+if __name__ == '__main__':
+    main()
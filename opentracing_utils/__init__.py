@@ -1,34 +1,126 @@
-from pkg_resources import get_distribution
+import sys
 
 from opentracing_utils.decorators import trace
 
 from opentracing_utils.tracers import init_opentracing_tracer
 from opentracing_utils.tracers import OPENTRACING_BASIC, OPENTRACING_INSTANA, OPENTRACING_LIGHTSTEP, OPENTRACING_JAEGER
 
-from opentracing_utils.span import extract_span_from_kwargs, remove_span_from_kwargs
+from opentracing_utils.span import extract_span_from_kwargs, remove_span_from_kwargs, INSPECT_FRAME_MARKERS
 
-from opentracing_utils.libs._requests import trace_requests, sanitize_url
-from opentracing_utils.libs._flask import trace_flask, extract_span_from_flask_request
-from opentracing_utils.libs._sqlalchemy import trace_sqlalchemy
-from opentracing_utils.libs._django import OpenTracingHttpMiddleware, extract_span_from_django_request
+from opentracing_utils.scope_manager import ContextVarsScopeManager
 
+from opentracing_utils.sampling import OverloadSampler, RateLimitingSampler
 
-__version__ = get_distribution('opentracing-utils').version
+from opentracing_utils.common import sanitize_url
+
+
+# Integrations, recorders and span formats are only imported on first access, so importing ``opentracing_utils`` does
+# not import them (nor the libraries they patch or depend on, e.g. ``socket``, ``mmap``, ``signal``).
+LAZY_ATTRIBUTES = {
+    'AsyncBatchRecorder': 'opentracing_utils.recorders',
+    'TailSamplingRecorder': 'opentracing_utils.recorders',
+    'MetricsRecorder': 'opentracing_utils.metrics',
+    'SpanRecord': 'opentracing_utils.span_store',
+    'SpanStore': 'opentracing_utils.span_store',
+    'MmapSpanRecorder': 'opentracing_utils.codec',
+    'SpanFileRecorder': 'opentracing_utils.codec',
+    'read_mapped_spans': 'opentracing_utils.codec',
+    'read_spans': 'opentracing_utils.codec',
+    'ForwardingRecorder': 'opentracing_utils.forwarding',
+    'SpanAggregator': 'opentracing_utils.forwarding',
+    'TracerLifecycle': 'opentracing_utils.lifecycle',
+    'shutdown_tracer': 'opentracing_utils.lifecycle',
+    'flush_tracer': 'opentracing_utils.lifecycle',
+
+    'trace_requests': 'opentracing_utils.libs._requests',
+    'trace_flask': 'opentracing_utils.libs._flask',
+    'extract_span_from_flask_request': 'opentracing_utils.libs._flask',
+    'trace_sqlalchemy': 'opentracing_utils.libs._sqlalchemy',
+    'OpenTracingHttpMiddleware': 'opentracing_utils.libs._django',
+    'extract_span_from_django_request': 'opentracing_utils.libs._django',
+    'TracedThreadPoolExecutor': 'opentracing_utils.libs._futures',
+    'TracedProcessPoolExecutor': 'opentracing_utils.libs._futures',
+}
+
+
+def _get_version():
+    try:
+        from importlib.metadata import version
+    except ImportError:  # pragma: no cover
+        # Python < 3.8
+        from pkg_resources import get_distribution
+        return get_distribution('opentracing-utils').version
+
+    return version('opentracing-utils')
+
+
+if sys.version_info >= (3, 7):
+    import importlib
+
+    def __getattr__(name):
+        if name == '__version__':
+            value = _get_version()
+        elif name in LAZY_ATTRIBUTES:
+            value = getattr(importlib.import_module(LAZY_ATTRIBUTES[name]), name)
+        else:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(LAZY_ATTRIBUTES) | {'__version__'})
+else:  # pragma: no cover
+    # No module ``__getattr__``, import everything.
+    from opentracing_utils.lifecycle import TracerLifecycle, flush_tracer, shutdown_tracer
+    from opentracing_utils.metrics import MetricsRecorder
+    from opentracing_utils.recorders import AsyncBatchRecorder, TailSamplingRecorder
+    from opentracing_utils.span_store import SpanRecord, SpanStore
+    from opentracing_utils.codec import MmapSpanRecorder, SpanFileRecorder, read_mapped_spans, read_spans
+    from opentracing_utils.forwarding import ForwardingRecorder, SpanAggregator
+
+    from opentracing_utils.libs._requests import trace_requests
+    from opentracing_utils.libs._flask import trace_flask, extract_span_from_flask_request
+    from opentracing_utils.libs._sqlalchemy import trace_sqlalchemy
+    from opentracing_utils.libs._django import OpenTracingHttpMiddleware, extract_span_from_django_request
+    from opentracing_utils.libs._futures import TracedThreadPoolExecutor, TracedProcessPoolExecutor
+
+    __version__ = _get_version()
 
 
 __all__ = (
+    'AsyncBatchRecorder',
+    'ContextVarsScopeManager',
     'extract_span_from_django_request',
     'extract_span_from_flask_request',
     'extract_span_from_kwargs',
+    'flush_tracer',
+    'ForwardingRecorder',
     'init_opentracing_tracer',
+    'MetricsRecorder',
+    'MmapSpanRecorder',
     'OpenTracingHttpMiddleware',
+    'OverloadSampler',
+    'read_mapped_spans',
+    'read_spans',
+    'RateLimitingSampler',
     'remove_span_from_kwargs',
     'sanitize_url',
+    'SpanAggregator',
+    'SpanFileRecorder',
+    'SpanRecord',
+    'shutdown_tracer',
+    'SpanStore',
+    'TailSamplingRecorder',
     'trace',
     'trace_flask',
     'trace_requests',
     'trace_sqlalchemy',
+    'TracedProcessPoolExecutor',
+    'TracedThreadPoolExecutor',
+    'TracerLifecycle',
 
+    'INSPECT_FRAME_MARKERS',
     'OPENTRACING_BASIC',
     'OPENTRACING_INSTANA',
     'OPENTRACING_JAEGER',
@@ -0,0 +1,181 @@
+"""
+asyncio support for the ``@trace`` decorator (Python 3.5+).
+
+Coroutine and async generator spans are kept open until the coroutine completes or the async generator is exhausted
+or closed. The parent span is detected from the running task context and never via call stack frames inspection.
+
+Spans are only activated via the tracer scope manager if it is context aware (e.g. ``ContextVarsScopeManager``). A
+thread local scope manager (the default one) would share the active span between all the tasks of the event loop
+thread, so the span of the running traced coroutine is then kept in a task local ``ContextVar`` instead (Python
+3.7+), and marks the coroutine frame for the sync traced calls.
+"""
+import functools
+import inspect
+import sys
+
+import opentracing
+
+from opentracing_utils.sampling import UNSAMPLED_SPAN
+from opentracing_utils.scope_manager import is_context_scope_manager
+from opentracing_utils.span import FRAME_SPANS
+from opentracing_utils.tracers import get_tracer
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # pragma: no cover
+    ContextVar = None
+
+
+# Span of the running traced coroutine or async generator, if not activated via the scope manager.
+_TASK_SPAN = ContextVar('opentracing_utils_task_span', default=None) if ContextVar else None
+
+
+def is_async_function(f):
+    return inspect.iscoroutinefunction(f) or _isasyncgenfunction(f)
+
+
+def _isasyncgenfunction(f):
+    # Python 3.5 has no async generators.
+    isasyncgenfunction = getattr(inspect, 'isasyncgenfunction', None)
+    return isasyncgenfunction(f) if isasyncgenfunction else False
+
+
+def trace_async_function(f, start_span, tracer=None):
+    """
+    Return a traced version of the coroutine function or async generator function ``f``.
+
+    ``start_span`` is the ``@trace`` span starter, called once per call of ``f`` from within the running task.
+    ``tracer`` is the tracer bound by ``@trace``, default is ``opentracing.tracer``.
+    """
+    if _isasyncgenfunction(f):
+        @functools.wraps(f)
+        def asyncgen_wrapper(*args, **kwargs):
+            return TracedAsyncGenerator(f, start_span, args, kwargs, tracer=tracer)
+
+        return asyncgen_wrapper
+
+    @functools.wraps(f)
+    async def wrapper(*args, **kwargs):
+        scope_manager = get_tracer(tracer).scope_manager
+
+        if is_context_scope_manager(scope_manager):
+            current_span, _ = start_span(args, kwargs, inspect_stack=False)
+
+            if current_span is None or current_span is UNSAMPLED_SPAN:
+                return await f(*args, **kwargs)
+
+            with scope_manager.activate(current_span, finish_on_close=True):
+                return await f(*args, **kwargs)
+
+        current_span, _ = start_span(args, kwargs, inspect_stack=False, context_span=get_task_span())
+
+        if current_span is None or current_span is UNSAMPLED_SPAN:
+            return await f(*args, **kwargs)
+
+        token = _TASK_SPAN.set(current_span) if _TASK_SPAN is not None else None
+        frame_id = id(sys._getframe())
+        FRAME_SPANS[frame_id] = current_span
+        try:
+            with current_span:
+                return await f(*args, **kwargs)
+        finally:
+            del FRAME_SPANS[frame_id]
+            if token is not None:
+                _TASK_SPAN.reset(token)
+
+    return wrapper
+
+
+def get_task_span():
+    """Return the span of the running traced coroutine or async generator in this task, if not activated."""
+    return _TASK_SPAN.get() if _TASK_SPAN is not None else None
+
+
+class TracedAsyncGenerator(object):
+    """
+    Async generator proxy keeping its span open across the whole iteration.
+
+    The span is started on the first iteration step, and finished when the async generator is exhausted, closed or
+    raises. The span is only active (via the scope manager) while the async generator body is running, so that the
+    consumer spans do not get it as their parent.
+    """
+
+    def __init__(self, f, start_span, args, kwargs, tracer=None):
+        self._f = f
+        self._start_span = start_span
+        self._args = args
+        self._kwargs = kwargs
+        self._tracer = tracer
+
+        self._agen = None
+        self._span = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._step('__anext__')
+
+    def asend(self, value):
+        return self._step('asend', value)
+
+    def athrow(self, *args):
+        return self._step('athrow', *args)
+
+    async def aclose(self):
+        if self._agen is None:
+            return
+
+        try:
+            await self._agen.aclose()
+        finally:
+            self._finish()
+
+    async def _step(self, method, *args):
+        scope_manager = get_tracer(self._tracer).scope_manager
+        use_scope_manager = is_context_scope_manager(scope_manager)
+
+        if self._agen is None:
+            self._span, _ = self._start_span(
+                self._args, self._kwargs, inspect_stack=False,
+                context_span=None if use_scope_manager else get_task_span())
+            self._agen = self._f(*self._args, **self._kwargs)
+
+        if self._span is None or self._span is UNSAMPLED_SPAN:
+            return await getattr(self._agen, method)(*args)
+
+        if use_scope_manager:
+            scope = scope_manager.activate(self._span, finish_on_close=False)
+        else:
+            scope = _TaskSpanScope(self._span, id(sys._getframe()))
+
+        try:
+            return await getattr(self._agen, method)(*args)
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        except BaseException as e:
+            opentracing.Span._on_error(self._span, type(e), e, e.__traceback__)
+            self._finish()
+            raise
+        finally:
+            scope.close()
+
+    def _finish(self):
+        span, self._span = self._span, None
+        if span is not None:
+            span.finish()
+
+
+class _TaskSpanScope(object):
+    """Make ``span`` the task span (and the span of the frame ``frame_id``) until closed, in the running task."""
+
+    def __init__(self, span, frame_id):
+        self._frame_id = frame_id
+        self._token = _TASK_SPAN.set(span) if _TASK_SPAN is not None else None
+        FRAME_SPANS[frame_id] = span
+
+    def close(self):
+        FRAME_SPANS.pop(self._frame_id, None)
+        if self._token is not None:
+            _TASK_SPAN.reset(self._token)
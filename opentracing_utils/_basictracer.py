@@ -0,0 +1,42 @@
+"""
+``basictracer`` BasicTracer with per operation sampling (requires ``basictracer``).
+"""
+from basictracer import BasicTracer
+
+
+class OperationSamplingTracer(BasicTracer):
+    """
+    BasicTracer making root spans sampling decisions per operation name, via ``sampler.sampled_operation()``.
+
+    Unlike BasicTracer, unsampled spans are not passed to the recorder.
+    """
+
+    def __init__(self, recorder=None, sampler=None, scope_manager=None):
+        super(OperationSamplingTracer, self).__init__(
+            recorder=recorder, sampler=_ALWAYS_SAMPLE, scope_manager=scope_manager)
+
+        self.operation_sampler = sampler
+
+    def start_span(self, operation_name=None, child_of=None, references=None, tags=None, start_time=None,
+                   ignore_active_span=False):
+        span = super(OperationSamplingTracer, self).start_span(
+            operation_name=operation_name, child_of=child_of, references=references, tags=tags,
+            start_time=start_time, ignore_active_span=ignore_active_span)
+
+        if span.parent_id is None:
+            span.context.sampled = self.operation_sampler.sampled_operation(span.context.trace_id, operation_name)
+
+        return span
+
+    def record(self, span):
+        if span.context.sampled:
+            self.recorder.record_span(span)
+
+
+class _AlwaysSample(object):
+
+    def sampled(self, trace_id):
+        return True
+
+
+_ALWAYS_SAMPLE = _AlwaysSample()
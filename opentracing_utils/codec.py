@@ -0,0 +1,528 @@
+"""
+Compact binary wire format of finished spans (stdlib only).
+
+A stream starts with ``MAGIC`` and the format version, followed by length-prefixed records (``<u32 length><u8 kind>``
+then the payload). Operation names, tag keys and log keys are dictionary encoded: a ``STRING`` record defines the next
+string id before its first use in a ``SPAN`` record, so a stream is self-contained and can be decoded while it is
+being written.
+
+``SPAN`` records hold the ids, timestamps and operation name id as fixed size fields, followed by the typed tag values
+and logs. Spans not fitting these fields (ids over 64 bits, e.g. 128 bits trace ids, or more than 65535 tags, logs or
+log items) are ``WIDE_SPAN`` records instead, with the ids as typed values and 32 bits counts.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from opentracing_utils.span_store import EMPTY, SpanRecord
+
+
+MAGIC = b'OTUS'
+VERSION = 1
+
+HEADER = MAGIC + struct.pack('<B', VERSION)
+
+RECORD_STRING = 1
+RECORD_SPAN = 2
+RECORD_WIDE_SPAN = 3
+
+VALUE_NONE = 0
+VALUE_FALSE = 1
+VALUE_TRUE = 2
+VALUE_INT = 3
+VALUE_FLOAT = 4
+VALUE_STR = 5
+# Integers not fitting in 64 bits, and any other types (as their ``str``).
+VALUE_BIG_INT = 6
+VALUE_OTHER = 7
+
+NO_PARENT_ID = 0
+
+ID_KEYS = ('trace_id', 'span_id', 'parent_id')
+
+_record_header = struct.Struct('<IB')
+_span_header = struct.Struct('<QQQddIHH')
+_log_header = struct.Struct('<dH')
+# Followed by the ids as tag items (``ID_KEYS``).
+_wide_span_header = struct.Struct('<ddIII')
+_wide_log_header = struct.Struct('<dI')
+_u32 = struct.Struct('<I')
+# Tag and log items: key string id and value kind, followed by the value.
+_item_header = struct.Struct('<IB')
+_str_item = struct.Struct('<IBI')
+_int_item = struct.Struct('<IBq')
+_float_item = struct.Struct('<IBd')
+_i64 = struct.Struct('<q')
+_f64 = struct.Struct('<d')
+
+
+class CodecError(ValueError):
+    pass
+
+
+class SpanEncoder(object):
+    """
+    Encode finished spans (``basictracer`` spans or ``SpanRecord``) as records of a single stream.
+
+    The encoder keeps the strings dictionary of the stream: a new stream (e.g. a new file) needs a new encoder.
+    """
+
+    def __init__(self):
+        self._strings = {}
+
+    def encode(self, span):
+        """Return the records (bytes) of ``span``, preceded by the definitions of its new strings."""
+        chunks = []
+        string_id = self._string_id
+
+        if isinstance(span, SpanRecord):
+            trace_id, span_id, parent_id = span.trace_id, span.span_id, span.parent_id
+            tags = span._tags
+            logs = span._logs
+        else:
+            context = span.context
+            trace_id, span_id, parent_id = context.trace_id, context.span_id, span.parent_id
+            tags = [item for pair in span.tags.items() for item in pair] if span.tags else EMPTY
+            logs = [(log.timestamp, [item for pair in log.key_values.items() for item in pair])
+                    for log in span.logs] if span.logs else EMPTY
+
+        operation_id = string_id(span.operation_name or '', chunks)
+        try:
+            payload = _encode_span(
+                trace_id, span_id, parent_id, span.start_time, span.duration, operation_id, tags, logs, string_id,
+                chunks, wide=False)
+            kind = RECORD_SPAN
+        except struct.error:
+            payload = _encode_span(
+                trace_id, span_id, parent_id, span.start_time, span.duration, operation_id, tags, logs, string_id,
+                chunks, wide=True)
+            kind = RECORD_WIDE_SPAN
+
+        chunks.append(_record_header.pack(len(payload) + 1, kind))
+        chunks.append(payload)
+
+        return b''.join(chunks)
+
+    def _string_id(self, value, chunks):
+        string_id = self._strings.get(value)
+        if string_id is None:
+            string_id = self._strings[value] = len(self._strings)
+
+            data = value.encode('utf-8')
+            chunks.append(_record_header.pack(len(data) + 1, RECORD_STRING))
+            chunks.append(data)
+
+        return string_id
+
+
+def _encode_span(trace_id, span_id, parent_id, start_time, duration, operation_id, tags, logs, string_id, chunks, wide):
+    if wide:
+        payload = [_wide_span_header.pack(start_time, duration, operation_id, len(tags) // 2, len(logs))]
+        _encode_items((ID_KEYS[0], trace_id, ID_KEYS[1], span_id, ID_KEYS[2], parent_id), payload, string_id, chunks)
+        log_header = _wide_log_header
+    else:
+        payload = [_span_header.pack(
+            trace_id, span_id, parent_id if parent_id is not None else NO_PARENT_ID, start_time, duration,
+            operation_id, len(tags) // 2, len(logs))]
+        log_header = _log_header
+
+    _encode_items(tags, payload, string_id, chunks)
+
+    for timestamp, key_values in logs:
+        payload.append(log_header.pack(timestamp, len(key_values) // 2))
+        _encode_items(key_values, payload, string_id, chunks)
+
+    return b''.join(payload)
+
+
+def _encode_items(items, payload, string_id, chunks):
+    append = payload.append
+
+    for index in range(0, len(items), 2):
+        key_id = string_id(str(items[index]), chunks)
+
+        value = items[index + 1]
+        kind = type(value)
+        if kind is str:
+            data = value.encode('utf-8')
+            append(_str_item.pack(key_id, VALUE_STR, len(data)))
+            append(data)
+        elif kind is bool:
+            append(_item_header.pack(key_id, VALUE_TRUE if value else VALUE_FALSE))
+        elif kind is int and -2 ** 63 <= value < 2 ** 63:
+            append(_int_item.pack(key_id, VALUE_INT, value))
+        elif kind is float:
+            append(_float_item.pack(key_id, VALUE_FLOAT, value))
+        elif value is None:
+            append(_item_header.pack(key_id, VALUE_NONE))
+        else:
+            data = str(value).encode('utf-8')
+            append(_str_item.pack(key_id, VALUE_BIG_INT if kind is int else VALUE_OTHER, len(data)))
+            append(data)
+
+
+class SpanDecoder(object):
+    """Decode the records of a single stream, keeping its strings dictionary."""
+
+    def __init__(self):
+        self._strings = []
+
+    def decode_record(self, kind, payload, offset=0, end=None):
+        """
+        Return the ``SpanRecord`` of a record, or None for a string definition.
+
+        The record may be decoded in place from a bigger buffer (e.g. a ``mmap``), from ``offset`` to ``end``.
+        """
+        if kind == RECORD_STRING:
+            self._strings.append(payload[offset:end].decode('utf-8'))
+            return None
+
+        strings = self._strings
+
+        if kind == RECORD_SPAN:
+            trace_id, span_id, parent_id, start_time, duration, operation_id, tags_count, logs_count = \
+                _span_header.unpack_from(payload, offset)
+            offset += _span_header.size
+            if parent_id == NO_PARENT_ID:
+                parent_id = None
+            log_header = _log_header
+        elif kind == RECORD_WIDE_SPAN:
+            start_time, duration, operation_id, tags_count, logs_count = _wide_span_header.unpack_from(payload, offset)
+            ids, offset = _decode_items(payload, offset + _wide_span_header.size, len(ID_KEYS), strings)
+            trace_id, span_id, parent_id = ids[1::2]
+            log_header = _wide_log_header
+        else:
+            raise CodecError('Unknown record kind {}'.format(kind))
+
+        tags, offset = _decode_items(payload, offset, tags_count, strings)
+
+        logs = EMPTY
+        if logs_count:
+            logs = []
+            for _ in range(logs_count):
+                timestamp, count = log_header.unpack_from(payload, offset)
+                key_values, offset = _decode_items(payload, offset + log_header.size, count, strings)
+                logs.append((timestamp, key_values))
+            logs = tuple(logs)
+
+        return SpanRecord(trace_id, span_id, parent_id, strings[operation_id], start_time, duration, tags, logs)
+
+    def decode(self, data):
+        """Generate the ``SpanRecord`` of ``data`` (bytes of whole records, without the stream header)."""
+        offset = 0
+        size = len(data)
+
+        while offset < size:
+            length, kind = _record_header.unpack_from(data, offset)
+            start = offset + _record_header.size
+            offset = start + length - 1
+            if offset > size:
+                raise CodecError('Truncated record')
+
+            record = self.decode_record(kind, data, start, offset)
+            if record is not None:
+                yield record
+
+
+def _decode_items(payload, offset, count, strings):
+    if not count:
+        return EMPTY, offset
+
+    items = []
+    append = items.append
+    u32_unpack = _u32.unpack_from
+    item_unpack = _item_header.unpack_from
+
+    for _ in range(count):
+        key_id, kind = item_unpack(payload, offset)
+        append(strings[key_id])
+        offset += 5
+
+        if kind == VALUE_STR or kind == VALUE_BIG_INT or kind == VALUE_OTHER:
+            length = u32_unpack(payload, offset)[0]
+            offset += 4
+            value = payload[offset:offset + length].decode('utf-8')
+            offset += length
+            if kind == VALUE_BIG_INT:
+                value = int(value)
+        elif kind == VALUE_INT:
+            value = _i64.unpack_from(payload, offset)[0]
+            offset += 8
+        elif kind == VALUE_FLOAT:
+            value = _f64.unpack_from(payload, offset)[0]
+            offset += 8
+        elif kind == VALUE_TRUE:
+            value = True
+        elif kind == VALUE_FALSE:
+            value = False
+        elif kind == VALUE_NONE:
+            value = None
+        else:
+            raise CodecError('Unknown value kind {}'.format(kind))
+
+        append(value)
+
+    return tuple(items), offset
+
+
+def encode_spans(spans):
+    """Encode ``spans`` as a self-contained stream (e.g. a datagram)."""
+    encoder = SpanEncoder()
+    return HEADER + b''.join(encoder.encode(span) for span in spans)
+
+
+def decode_spans(data):
+    """Decode a self-contained stream (see ``encode_spans``) as a list of ``SpanRecord``."""
+    _check_header(data[:len(HEADER)])
+    return list(SpanDecoder().decode(data[len(HEADER):]))
+
+
+def _check_header(header):
+    header = bytearray(header)
+    if header[:len(MAGIC)] != MAGIC:
+        raise CodecError('Not a span stream')
+
+    if len(header) < len(HEADER) or header[len(MAGIC)] != VERSION:
+        raise CodecError('Unsupported span stream version')
+
+
+def iter_spans(fileobj):
+    """Lazily decode the ``SpanRecord`` of a binary stream file object (e.g. written by ``SpanFileRecorder``)."""
+    header = fileobj.read(len(HEADER))
+    if not header:
+        return
+
+    _check_header(header)
+
+    decoder = SpanDecoder()
+    read = fileobj.read
+
+    while True:
+        record_header = read(_record_header.size)
+        if len(record_header) < _record_header.size:
+            # End of stream (or a record being written).
+            return
+
+        length, kind = _record_header.unpack(record_header)
+        if not length:
+            # Zero filled end of a preallocated file (see ``MmapSpanRecorder``).
+            return
+
+        payload = read(length - 1)
+        if len(payload) < length - 1:
+            return
+
+        record = decoder.decode_record(kind, payload)
+        if record is not None:
+            yield record
+
+
+def read_spans(path):
+    """Lazily decode the ``SpanRecord`` of a span file (see ``iter_spans``)."""
+    with open(path, 'rb') as f:
+        for record in iter_spans(f):
+            yield record
+
+
+class SpanFileRecorder(object):
+    """
+    Recorder streaming finished spans to a binary span file, with size based rotation.
+
+    When the file exceeds ``max_bytes``, it is rotated as ``path.1`` (``path.1`` as ``path.2`` ... up to
+    ``backup_count`` files), like ``logging.handlers.RotatingFileHandler``. Every file is a self-contained stream,
+    readable with ``read_spans``.
+
+    :param path: Span file path.
+    :type path: str
+
+    :param max_bytes: Rotate the file when it reaches this size. Default is 0 (no rotation).
+    :type max_bytes: int
+
+    :param backup_count: Rotated files to keep. Default is 5.
+    :type backup_count: int
+
+    :param buffering: Write buffer size in bytes. Default is 64KB.
+    :type buffering: int
+    """
+
+    def __init__(self, path, max_bytes=0, backup_count=5, buffering=65536):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffering = buffering
+
+        self.written = 0
+        self.rotations = 0
+
+        self._lock = threading.Lock()
+        self._open()
+
+    def record_span(self, span):
+        with self._lock:
+            data = self._encoder.encode(span)
+            self._file.write(data)
+            self._size += len(data)
+            self.written += 1
+
+            if self.max_bytes and self._size >= self.max_bytes:
+                self._rotate()
+
+    def extend(self, spans):
+        for span in spans:
+            self.record_span(span)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _open(self):
+        self._file = open(self.path, 'wb', self.buffering)
+        self._file.write(HEADER)
+        self._size = len(HEADER)
+        self._encoder = SpanEncoder()
+
+    def _rotate(self):
+        self._file.close()
+
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = '{}.{}'.format(self.path, index)
+                if os.path.exists(source):
+                    os.rename(source, '{}.{}'.format(self.path, index + 1))
+
+            os.rename(self.path, '{}.1'.format(self.path))
+
+        self.rotations += 1
+        self._open()
+
+
+def read_mapped_spans(path):
+    """
+    Lazily decode the ``SpanRecord`` of a span file mapped in memory, e.g. written by ``MmapSpanRecorder``.
+
+    Records are decoded in place from the mapping, without reading the file in intermediate buffers.
+    """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        _check_header(mapping[:len(HEADER)])
+
+        decoder = SpanDecoder()
+        unpack_header = _record_header.unpack_from
+        offset = len(HEADER)
+        size = len(mapping)
+
+        while offset + _record_header.size <= size:
+            length, kind = unpack_header(mapping, offset)
+            start = offset + _record_header.size
+            offset = start + length - 1
+            if not length or offset > size:
+                # End of the written records.
+                return
+
+            record = decoder.decode_record(kind, mapping, start, offset)
+            if record is not None:
+                yield record
+    finally:
+        mapping.close()
+
+
+class MmapSpanRecorder(object):
+    """
+    Recorder appending finished spans to a preallocated memory-mapped span file.
+
+    Recording a span is a memory copy into the mapping, without any write syscall; the kernel writes the pages back
+    to the file. The file has a fixed ``size``: when it is full, following spans are dropped (and counted), so it
+    should be sized for the expected spans (e.g. of a load test).
+
+    On ``close``, the file is truncated to the written records and is a regular span file (see ``read_spans``).
+    While being written, it can be read with ``read_mapped_spans``.
+
+    :param path: Span file path, replaced if existing.
+    :type path: str
+
+    :param size: Preallocated file size in bytes. Default is 64MB.
+    :type size: int
+    """
+
+    def __init__(self, path, size=64 * 1024 * 1024):
+        if size <= len(HEADER):
+            raise ValueError('size must be greater than {}'.format(len(HEADER)))
+
+        self.path = path
+        self.size = size
+
+        self.written = 0
+        self.dropped = 0
+        self.full = False
+
+        self._lock = threading.Lock()
+        self._encoder = SpanEncoder()
+
+        self._file = open(path, 'w+b')
+        # Sparse preallocation: unwritten pages are zeros, i.e. the end of the records.
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        self._mmap[:len(HEADER)] = HEADER
+        self._position = len(HEADER)
+
+    @property
+    def position(self):
+        """Size of the written records."""
+        return self._position
+
+    def record_span(self, span):
+        with self._lock:
+            if self.full or self._mmap is None:
+                self.dropped += 1
+                return
+
+            data = self._encoder.encode(span)
+            start = self._position
+            end = start + len(data)
+
+            if end > self.size:
+                # The strings of ``span`` are now defined in the encoder only: the file is closed for any later span.
+                self.full = True
+                self.dropped += 1
+                return
+
+            # The first record length is written last, so concurrent readers never see a partial record.
+            view = memoryview(data)
+            self._mmap[start + 4:end] = view[4:]
+            self._mmap[start:start + 4] = view[:4]
+
+            self._position = end
+            self.written += 1
+
+    def extend(self, spans):
+        for span in spans:
+            self.record_span(span)
+
+    def flush(self):
+        """Write the mapping back to the file (``msync``)."""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+
+    def close(self):
+        with self._lock:
+            if self._mmap is None:
+                return
+
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+
+            self._file.truncate(self._position)
+            self._file.close()
@@ -1,8 +1,12 @@
 from __future__ import absolute_import
-from future import standard_library
-standard_library.install_aliases()  # noqa
 
-import urllib.parse as parse
+try:
+    import urllib.parse as parse
+except ImportError:  # pragma: no cover
+    # Python 2
+    from future import standard_library
+    standard_library.install_aliases()
+    import urllib.parse as parse
 
 
 def sanitize_url(url, mask_url_query=True, mask_url_path=False):
@@ -17,3 +21,60 @@ def sanitize_url(url, mask_url_query=True, mask_url_path=False):
     components = parse.SplitResult(parsed.scheme, host, path, query, parsed.fragment)
 
     return parse.urlunsplit(components)
+
+
+# WSGI environ keys of the request headers sent without the ``HTTP_`` prefix.
+WSGI_UNPREFIXED_HEADERS = ('CONTENT_TYPE', 'CONTENT_LENGTH')
+
+# Selected (propagation) header name -> WSGI environ key, and prefixes -> WSGI environ key prefixes.
+_wsgi_keys = {}
+
+
+def wsgi_key(name):
+    """Return the WSGI environ key of the request header ``name`` (e.g. ``HTTP_OT_TRACER_TRACEID``)."""
+    key = name.upper().replace('-', '_')
+    return key if key in WSGI_UNPREFIXED_HEADERS else 'HTTP_' + key
+
+
+def get_wsgi_headers(environ):
+    """
+    Return a dict of all the request headers of a WSGI environ (``request.META`` in Django, ``request.environ`` in
+    Flask), with lower case header names (e.g. ``ot-tracer-traceid`` for ``HTTP_OT_TRACER_TRACEID``).
+    """
+    headers = {}
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            headers[key[5:].lower().replace('_', '-')] = value
+        elif key in WSGI_UNPREFIXED_HEADERS:
+            headers[key.lower().replace('_', '-')] = value
+
+    return headers
+
+
+def select_wsgi_headers(environ, names, prefixes=()):
+    """
+    Return a dict of the request headers of a WSGI environ named ``names`` or starting with ``prefixes`` (lower case
+    header names).
+
+    Names are looked up directly, only prefixes need to go through the environ keys.
+    """
+    headers = {}
+
+    for name in names:
+        key = _wsgi_keys.get(name)
+        if key is None:
+            key = _wsgi_keys[name] = wsgi_key(name)
+
+        if key in environ:
+            headers[name] = environ[key]
+
+    if prefixes:
+        keys = _wsgi_keys.get(prefixes)
+        if keys is None:
+            keys = _wsgi_keys[prefixes] = tuple('HTTP_' + prefix.upper().replace('-', '_') for prefix in prefixes)
+
+        for key in environ:
+            if key.startswith(keys):
+                headers[key[5:].lower().replace('_', '-')] = environ[key]
+
+    return headers
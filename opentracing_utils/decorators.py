@@ -1,12 +1,29 @@
 import functools
+import inspect
+import sys
+import time
 
 import opentracing
 
-from opentracing_utils.span import get_new_span, adjust_span, get_span_from_kwargs, remove_span_from_kwargs
+from opentracing_utils.sampling import UNSAMPLED_SPAN, get_sampler
+from opentracing_utils.span import get_new_span, find_span_in_kwargs, freeze_tags, DEFAULT_SPAN_ARG_NAME, FRAME_SPANS
+from opentracing_utils.tracers import get_tracer, is_noop_tracer
 
+if sys.version_info >= (3, 5):
+    from opentracing_utils._async import is_async_function, trace_async_function
+else:  # pragma: no cover
+    def is_async_function(f):
+        return False
 
-def trace(component=None, operation_name=None, tags=None, use_follows_from=False, pass_span=False, inspect_stack=True,
-          ignore_parent_span=False, span_extractor=None, skip_span=None, use_scope_manager=False):
+    trace_async_function = None
+
+
+NO_SPAN_IN_KWARGS = (None, None)
+
+
+def trace(component=None, operation_name=None, tags=None, use_follows_from=False, pass_span=False, inspect_stack=None,
+          ignore_parent_span=False, span_extractor=None, skip_span=None, use_scope_manager=False,
+          sampler=None, tracer=None):
     """
     Opentracing tracer decorator. Attempts to extract parent span and create a new span for the decorated function.
 
@@ -16,7 +33,19 @@ def trace(component=None, operation_name=None, tags=None, use_follows_from=False
     2. Detecting span in kwargs.
     3. Using ``opentracing.tracer.active_span`` managed by the tracer context manager. The new span will be using the
     scope manager.
-    4. Using call stack frames inspection.
+    4. Using call stack frames inspection. Skipped by default if the tracer scope manager is context aware (e.g.
+    ``ContextVarsScopeManager``), the new span is then always activated using the scope manager.
+
+    Generator functions are traced until the generator is exhausted, closed or raises. The span is started lazily on
+    the first iteration, and gets the ``generator.items`` and ``generator.first_item_ms`` tags.
+
+    If ``opentracing.tracer`` is the no-op ``opentracing.Tracer`` (tracing is off), the decorated function is called
+    straight away, without any parent span discovery. ``pass_span`` then passes the no-op ``UNSAMPLED_SPAN``.
+
+    Coroutine functions and async generators (Python 3.5+) are traced until the coroutine completes or the async
+    generator is exhausted or closed. Their parent span is never detected via call stack frames inspection. Their span
+    is activated using the scope manager if it is context aware (e.g. ``ContextVarsScopeManager``), otherwise it is
+    kept in the running task context (Python 3.7+), so concurrent tasks never share their active span.
 
     :param commponent: commponent name.
     :type commponent: str
@@ -36,7 +65,11 @@ def trace(component=None, operation_name=None, tags=None, use_follows_from=False
                       the traced function even if the caller passed the parent span explicitly.
     :type pass_span: bool
 
-    :param inspect_stack: Whether to inspect call stack frames to retrieve the parent span. Default is True.
+    :param inspect_stack: Whether to inspect call stack frames to retrieve the parent span. Default is None, which
+                          inspects call stack frames unless the tracer scope manager is context aware (e.g.
+                          ``ContextVarsScopeManager``), in which case stack inspection is only used if explicitly
+                          set to True. ``INSPECT_FRAME_MARKERS`` restricts the inspection to the frames of ``@trace``
+                          traced calls (much cheaper, but spans that are not started by ``@trace`` are not detected).
     :type inspect_stack: bool
 
     :param ignore_parent_span: Always start a fresh span for this decorated function. Default is False.
@@ -53,41 +86,253 @@ def trace(component=None, operation_name=None, tags=None, use_follows_from=False
 
     :param use_scope_manager: Always use the scope manager when starting the span.
     :type use_scope_manager: bool
+
+    :param sampler: Head sampling, either a sample rate (0.0 to 1.0) or a sampler with ``is_sampled(trace_id)``.
+                    The decision is made from the trace id, so nested traced calls and services using the same rate
+                    agree on it. Unsampled calls (and nested traced calls) get a ``NonRecordingSpan``, without any
+                    tagging, which is activated and propagated (e.g. by ``trace_requests``) with the sampling flag
+                    off. Default is None (all calls are traced).
+    :type sampler: float | TraceIdRatioSampler
+
+    :param tracer: Tracer of the spans, bound at decoration time (e.g. to use several tracers side by side). Default
+                   is None, using ``opentracing.tracer`` at call time.
+    :type tracer: opentracing.Tracer
     """
 
     def trace_decorator(f):
-        @functools.wraps(f)
-        def wrapper(*args, **kwargs):
+        # Call plan: everything that does not depend on the call arguments is resolved once, here.
+        #
+        # Any ``opentracing.Span`` passed in kwargs is a parent span candidate (whatever the argument name is), so the
+        # kwargs are scanned at most once per call, and not at all if none of the discovery strategies needs them.
+        scan_kwargs = not ignore_parent_span or bool(span_extractor) or skip_span is not None
+        drop_kwarg_span = bool(span_extractor)
+        # Static tags are passed at span creation, instead of being set on every call.
+        static_tags = freeze_tags(tags, component)
+        span_sampler = get_sampler(sampler)
+        # With tracing off, only a kwargs span which would have been consumed as the parent span is dropped.
+        noop_scan_kwargs = not ignore_parent_span or drop_kwarg_span
+        # Without ``**kwargs``, calls passing only ``f`` keyword parameters need no kwargs scan with tracing off: ``f``
+        # gets them as is. Other kwargs (e.g. a parent span for ``f`` without such parameter) are still dropped.
+        noop_keywords = None if pass_span or drop_kwarg_span else get_keyword_names(f)
+
+        if tracer is not None:
+            bound_noop = is_noop_tracer(tracer)
+
+            def tracing_off():
+                return bound_noop
+        else:
+            tracing_off = is_noop_tracer
+
+        def noop_call_kwargs(kwargs):
+            """Adjust ``kwargs`` for a call to ``f`` with the no-op tracer, without any span discovery."""
+            span_arg_name = find_span_in_kwargs(kwargs)[0] if kwargs and noop_scan_kwargs else None
+
+            if pass_span:
+                kwargs[span_arg_name or DEFAULT_SPAN_ARG_NAME] = UNSAMPLED_SPAN
+            elif kwargs:
+                kwargs.pop(span_arg_name, None)
+                kwargs.pop(DEFAULT_SPAN_ARG_NAME, None)
+
+        def start_span(args, kwargs, inspect_stack=inspect_stack, context_span=None):
+            """
+            Start the span of a call to ``f``, and adjust ``kwargs`` accordingly.
+
+            ``context_span`` is the parent span candidate of the running task (see ``get_new_span``).
+
+            Return the new span and whether it should be activated using the scope manager. The span is ``None`` if
+            skipped.
+            """
+            if tracing_off():
+                noop_call_kwargs(kwargs)
+                return None, False
+
+            kwargs_span = find_span_in_kwargs(kwargs) if kwargs and scan_kwargs else NO_SPAN_IN_KWARGS
+
             if skip_span is not None and skip_span(*args, **kwargs):
-                return f(*args, **remove_span_from_kwargs(**kwargs))
+                kwargs.pop(kwargs_span[0], None)
+                return None, False
 
             # Get a new current span wrapping this traced function.
             # ``get_new_span`` should retrieve parent_span if any!
             span_arg_name, using_scope_manager, current_span = get_new_span(
                 f, args, kwargs, inspect_stack=inspect_stack, ignore_parent_span=ignore_parent_span,
-                span_extractor=span_extractor, use_follows_from=use_follows_from)
+                span_extractor=span_extractor, use_follows_from=use_follows_from, kwargs_span=kwargs_span,
+                sampler=span_sampler, operation_name=operation_name, tags=static_tags, tracer=tracer,
+                context_span=context_span)
 
-            if pass_span and span_arg_name:
+            if pass_span:
                 kwargs[span_arg_name] = current_span
             else:
-                if span_extractor:
-                    kwarg_span, _ = get_span_from_kwargs(**kwargs)
-                    kwargs.pop(kwarg_span, None)
+                if drop_kwarg_span:
+                    kwargs.pop(kwargs_span[0], None)
 
                 kwargs.pop(span_arg_name, None)
 
-            current_span = adjust_span(current_span, operation_name, component, tags)
+            if current_span is UNSAMPLED_SPAN:
+                # No span context, never activated via the scope manager.
+                return current_span, False
+
+            return current_span, using_scope_manager or use_scope_manager
+
+        if is_async_function(f):
+            return trace_async_function(f, start_span, tracer=tracer)
+
+        if inspect.isgeneratorfunction(f):
+            @functools.wraps(f)
+            def generator_wrapper(*args, **kwargs):
+                if tracing_off():
+                    if noop_keywords is None or not noop_keywords.issuperset(kwargs):
+                        noop_call_kwargs(kwargs)
+                    return f(*args, **kwargs)
+
+                return TracedGenerator(f, start_span, args, kwargs, tracer=tracer)
+
+            return generator_wrapper
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if tracing_off():
+                # Tracing is off, straight to the call.
+                if kwargs or pass_span:
+                    if noop_keywords is None or not noop_keywords.issuperset(kwargs):
+                        noop_call_kwargs(kwargs)
+                return f(*args, **kwargs)
+
+            current_span, using_scope_manager = start_span(args, kwargs)
 
-            with _activate_span(current_span, using_scope_manager or use_scope_manager):
+            if current_span is None:
                 return f(*args, **kwargs)
 
+            if using_scope_manager:
+                with get_tracer(tracer).scope_manager.activate(current_span, finish_on_close=True):
+                    return f(*args, **kwargs)
+
+            # Mark this frame, for cheap call stack frames inspection in nested calls.
+            frame_id = id(sys._getframe())
+            FRAME_SPANS[frame_id] = current_span
+            try:
+                with current_span:
+                    return f(*args, **kwargs)
+            finally:
+                del FRAME_SPANS[frame_id]
+
         return wrapper
 
     return trace_decorator
 
 
-def _activate_span(current_span, using_scope_manager):
-    if using_scope_manager:
-        return opentracing.tracer.scope_manager.activate(current_span, finish_on_close=True)
+def get_keyword_names(f):
+    """
+    Return the names of the parameters ``f`` accepts as keyword arguments, or None if it accepts arbitrary keyword
+    arguments (``**kwargs``) or its signature is unknown.
+    """
+    try:
+        parameters = inspect.signature(f).parameters.values()
+    except (AttributeError, TypeError, ValueError):  # pragma: no cover
+        # Python 2 (no ``inspect.signature``), or builtins without signature.
+        return None
+
+    names = []
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_KEYWORD:
+            return None
+        if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+            names.append(parameter.name)
+
+    return frozenset(names)
+
+
+class TracedGenerator(object):
+    """
+    Generator proxy keeping its span open across the whole iteration.
+
+    The span is started on the first iteration step, and finished when the generator is exhausted, closed or raises.
+    The span is only active (via the scope manager or a frame marker) while the generator body is running, so that the
+    consumer spans do not get it as their parent.
+    """
+
+    def __init__(self, f, start_span, args, kwargs, tracer=None):
+        self._f = f
+        self._start_span = start_span
+        self._args = args
+        self._kwargs = kwargs
+        self._tracer = tracer
+
+        self._gen = None
+        self._span = None
+        self._using_scope_manager = False
+        self._started_at = None
+        self._items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._step('send', None)
+
+    next = __next__
+
+    def send(self, value):
+        return self._step('send', value)
+
+    def throw(self, *args):
+        return self._step('throw', *args)
+
+    def close(self):
+        if self._gen is None:
+            return
+
+        try:
+            self._gen.close()
+        finally:
+            self._finish()
+
+    def __del__(self):
+        # Iteration abandoned without closing the generator (e.g. ``break`` in a for loop).
+        self._finish()
+
+    def _step(self, method, *args):
+        if self._gen is None:
+            self._span, self._using_scope_manager = self._start_span(self._args, self._kwargs)
+            self._started_at = time.time()
+            self._gen = self._f(*self._args, **self._kwargs)
+
+        current_span = self._span
+        if current_span is None:
+            return getattr(self._gen, method)(*args)
+
+        scope = None
+        frame_id = None
+        if self._using_scope_manager:
+            scope = get_tracer(self._tracer).scope_manager.activate(current_span, finish_on_close=False)
+        else:
+            frame_id = id(sys._getframe())
+            FRAME_SPANS[frame_id] = current_span
+
+        try:
+            item = getattr(self._gen, method)(*args)
+        except StopIteration:
+            self._finish()
+            raise
+        except BaseException:
+            opentracing.Span._on_error(current_span, *sys.exc_info())
+            self._finish()
+            raise
+        finally:
+            if scope is not None:
+                scope.close()
+            else:
+                FRAME_SPANS.pop(frame_id, None)
+
+        if not self._items:
+            current_span.set_tag('generator.first_item_ms', (time.time() - self._started_at) * 1000)
+
+        self._items += 1
+
+        return item
 
-    return current_span
+    def _finish(self):
+        span, self._span = self._span, None
+        if span is not None:
+            span.set_tag('generator.items', self._items)
+            span.finish()
@@ -0,0 +1,222 @@
+"""
+Span forwarding from pre-forked workers (gunicorn, uwsgi ...) to a single aggregator.
+
+Workers record finished spans with a ``ForwardingRecorder``, which sends them as datagrams (binary span streams, see
+``opentracing_utils.codec``) over a local unix socket, without any background thread nor buffering in the worker.
+A single ``SpanAggregator`` (e.g. in the master process, or a side process) receives them, batches them and passes
+them to a sink (exporter).
+"""
+import errno
+import logging
+import os
+import socket
+import threading
+
+from opentracing_utils.codec import decode_spans, encode_spans
+from opentracing_utils.recorders import AsyncBatchRecorder
+
+
+# Max datagram size sent by workers (and received by the aggregator). The actual limit is platform dependent: unix
+# datagrams are limited to the socket send buffer size (``SO_SNDBUF``), ~200KB on Linux but only 2048 bytes by default
+# on macOS and BSDs (``net.local.dgram.maxdgram``). Batches bigger than the limit are split, bigger spans are dropped.
+MAX_DATAGRAM_SIZE = 65000
+
+# Send errors meaning the aggregator is not there or not keeping up: the span is dropped.
+DROP_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS, errno.ECONNREFUSED, errno.ENOENT)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ForwardingRecorder(object):
+    """
+    Recorder sending finished spans to a ``SpanAggregator`` unix socket, from any number of (forked) processes.
+
+    Sends are non blocking: if the aggregator is not running or not keeping up, spans are dropped (and counted), so
+    the traced code never waits. The socket is created lazily per process, so a recorder created before forking is
+    safe to use in the forked workers.
+
+    Also usable as an ``AsyncBatchRecorder`` sink (``extend``), to send several spans per datagram. Batches are split
+    into datagrams of at most ``max_datagram_size`` bytes, and lowered on ``EMSGSIZE`` send errors.
+
+    :param socket_path: The aggregator unix socket path.
+    :type socket_path: str
+
+    :param max_datagram_size: Max datagram size. Default is ``MAX_DATAGRAM_SIZE``, or the socket ``SO_SNDBUF`` if
+                              lower (e.g. 2048 bytes on macOS).
+    :type max_datagram_size: int
+    """
+
+    def __init__(self, socket_path, max_datagram_size=None):
+        self.socket_path = socket_path
+        self.max_datagram_size = max_datagram_size
+
+        self.sent = 0
+        self.dropped = 0
+
+        self._socket = None
+        self._pid = None
+
+    def record_span(self, span):
+        self._send((span,))
+
+    def extend(self, spans):
+        self._send(list(spans))
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _get_socket(self):
+        pid = os.getpid()
+        if self._socket is None or self._pid != pid:
+            # Never share the parent process socket after a fork.
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self._socket, self._pid = sock, pid
+
+            if self.max_datagram_size is None:
+                self.max_datagram_size = get_max_datagram_size(sock)
+
+        return self._socket
+
+    def _send(self, spans):
+        data = encode_spans(spans)
+        sock = self._get_socket()
+
+        if len(data) > self.max_datagram_size:
+            self._split(spans)
+            return
+
+        try:
+            sock.sendto(data, self.socket_path)
+        except socket.error as e:
+            if e.errno == errno.EMSGSIZE:
+                # Lower limit than the reported one: retry with smaller datagrams.
+                self.max_datagram_size = len(data) - 1
+                self._split(spans)
+                return
+
+            if e.errno not in DROP_ERRNOS:
+                logger.exception('Failed to forward spans to {}'.format(self.socket_path))
+            self.dropped += len(spans)
+        else:
+            self.sent += len(spans)
+
+    def _split(self, spans):
+        if len(spans) == 1:
+            # A single span too big for a datagram.
+            self.dropped += 1
+            return
+
+        middle = len(spans) // 2
+        self._send(spans[:middle])
+        self._send(spans[middle:])
+
+
+def get_max_datagram_size(sock):
+    """Return the max datagram size of unix datagram socket ``sock``, bounded by ``MAX_DATAGRAM_SIZE``."""
+    try:
+        size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    except socket.error:  # pragma: no cover
+        return MAX_DATAGRAM_SIZE
+
+    return min(size, MAX_DATAGRAM_SIZE) if size > 0 else MAX_DATAGRAM_SIZE
+
+
+class SpanAggregator(object):
+    """
+    Receive the spans of ``ForwardingRecorder`` workers on a unix socket, and pass them in batches to ``sink``.
+
+    Received spans are ``SpanRecord`` objects, batched via an ``AsyncBatchRecorder`` (``sink``, ``max_queue_size``,
+    ``batch_size`` and ``flush_interval`` are passed to it).
+
+    :param socket_path: The unix socket path to bind. An existing socket file is replaced.
+    :type socket_path: str
+
+    :param sink: Callable receiving batches (lists) of ``SpanRecord``.
+    :type sink: Callable[list]
+    """
+
+    def __init__(self, socket_path, sink, **kwargs):
+        self.socket_path = socket_path
+        self.received = 0
+        self.decode_errors = 0
+
+        self.recorder = AsyncBatchRecorder(sink, **kwargs)
+
+        self._socket = None
+        self._thread = None
+        self._closed = False
+
+    def bind(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.socket_path)
+        # Allows ``close`` to stop the receiving loop.
+        self._socket.settimeout(0.2)
+
+    def start(self):
+        """Bind the socket and receive spans in a background thread."""
+        self.bind()
+
+        self._thread = threading.Thread(target=self.serve_forever, name='opentracing-utils-aggregator')
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def serve_forever(self):
+        """Receive spans until closed (blocking)."""
+        if self._socket is None:
+            self.bind()
+
+        while not self._closed:
+            try:
+                data = self._socket.recv(MAX_DATAGRAM_SIZE)
+            except socket.timeout:
+                continue
+            except socket.error:
+                if self._closed:
+                    break
+                raise
+
+            self.handle(data)
+
+    def handle(self, data):
+        try:
+            records = decode_spans(data)
+        except Exception:
+            self.decode_errors += 1
+            logger.exception('Failed to decode forwarded spans')
+            return
+
+        self.received += len(records)
+        for record in records:
+            self.recorder.record_span(record)
+
+    def stats(self):
+        stats = self.recorder.stats()
+        stats.update(received=self.received, decode_errors=self.decode_errors)
+        return stats
+
+    def close(self, timeout=None):
+        """Stop receiving, and flush the received spans to the sink."""
+        self._closed = True
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+            try:
+                os.unlink(self.socket_path)
+            except OSError:  # pragma: no cover
+                pass
+
+        self.recorder.close(timeout)
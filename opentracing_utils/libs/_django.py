@@ -5,7 +5,6 @@ This is a slightly modified version of the middleware implemented in:
 https://github.com/opentracing-contrib/python-django [BSD 3-Clause]
 """
 import traceback
-import opentracing
 
 
 settings = None  # noqa
@@ -27,6 +26,8 @@ except ImportError:  # pragma: no cover
 from opentracing.ext import tags as ot_tags
 
 from opentracing_utils.common import sanitize_url
+from opentracing_utils.sampling import UNSAMPLED_SPAN, get_sampler, is_unsampled, sample_entry_span
+from opentracing_utils.tracers import extract_wsgi_span_context, get_tracer, is_noop_tracer
 
 
 class OpenTracingHttpMiddleware(MiddlewareMixin):
@@ -38,6 +39,13 @@ class OpenTracingHttpMiddleware(MiddlewareMixin):
         if type(self._default_tags) is not dict:
             self._default_tags = {}
 
+        # Static tags, passed at span creation along with the request tags.
+        self._static_tags = {
+            ot_tags.COMPONENT: 'django',
+            ot_tags.SPAN_KIND: ot_tags.SPAN_KIND_RPC_SERVER,
+        }
+        self._static_tags.update(self._default_tags)
+
         error_4xx = bool(getattr(settings, 'OPENTRACING_UTILS_ERROR_4XX', True))
         self._min_error_code = 400 if error_4xx else 500
 
@@ -55,36 +63,47 @@ class OpenTracingHttpMiddleware(MiddlewareMixin):
         else:
             self._skip_span_callable = import_string(skip_span_str) if skip_span_str else None
 
+        sampler = getattr(settings, 'OPENTRACING_UTILS_SAMPLER', None)
+        self._sampler = get_sampler(import_string(sampler) if isinstance(sampler, str) else sampler)
+
+        tracer = getattr(settings, 'OPENTRACING_UTILS_TRACER', None)
+        self._tracer = import_string(tracer) if isinstance(tracer, str) else tracer
+
     def process_view(self, request, view_func, view_args, view_kwargs):
         if self._skip_span_callable and self._skip_span_callable(request, view_func, view_args, view_kwargs):
             return
 
-        headers_carrier = self._get_headers(request)
+        if is_noop_tracer(self._tracer):
+            # Tracing is off, no request tags nor context extraction.
+            request.current_span = UNSAMPLED_SPAN
+            return
+
+        span_tracer = get_tracer(self._tracer)
+
+        span_ctx, unsampled, no_propagation = extract_wsgi_span_context(request.META, span_tracer, self._sampler)
+        if unsampled is not None:
+            self._set_current_span(request, unsampled, span_tracer)
+            return
 
         op_name = (self._op_name_callable(request, view_func, view_args, view_kwargs) if self._op_name_callable
                    else view_func.__name__)
 
-        span = None
-        try:
-            span_ctx = opentracing.tracer.extract(opentracing.Format.HTTP_HEADERS, headers_carrier)
-            span = opentracing.tracer.start_span(operation_name=op_name, child_of=span_ctx)
-        except (opentracing.InvalidCarrierException, opentracing.SpanContextCorruptedException):
-            span = opentracing.tracer.start_span(operation_name=op_name, tags={'django-no-propagation': True})
-
-        span.set_tag(ot_tags.COMPONENT, 'django')
-        span.set_tag(ot_tags.SPAN_KIND, ot_tags.SPAN_KIND_RPC_SERVER)
-        span.set_tag(ot_tags.HTTP_METHOD, request.method)
-        span.set_tag(ot_tags.HTTP_URL, sanitize_url(request.get_full_path()))
-
-        # Default tags
-        for k, v in self._default_tags.items():
-            try:
-                span.set_tag(k, v)
-            except Exception:  # pragma: no cover
-                pass
+        tags = {
+            ot_tags.HTTP_METHOD: request.method,
+            ot_tags.HTTP_URL: sanitize_url(request.get_full_path()),
+        }
+        tags.update(self._static_tags)
+
+        if no_propagation:
+            tags['django-no-propagation'] = True
 
+        span = span_tracer.start_span(operation_name=op_name, child_of=span_ctx, tags=tags)
+
+        self._set_current_span(request, sample_entry_span(self._sampler, span_tracer, span), span_tracer)
+
+    def _set_current_span(self, request, span, span_tracer):
         if self.use_scope_manager:
-            scope = opentracing.tracer.scope_manager.activate(span, finish_on_close=True)
+            scope = span_tracer.scope_manager.activate(span, finish_on_close=True)
             request.current_scope = scope
 
         request.current_span = span
@@ -96,21 +115,16 @@ class OpenTracingHttpMiddleware(MiddlewareMixin):
         self._finish_tracing(request, response=response)
         return response
 
-    def _get_headers(self, request):
-        headers = {}
-
-        for k, v in request.META.items():
-            k = k.lower().replace('_', '-')
-            k = k.replace('http-', '') if k.startswith('http-') else k  # remove Django magic prefix!
-            headers[k] = v
-
-        return headers
-
     def _finish_tracing(self, request, response=None, exception=None):
         current_span = getattr(request, 'current_span', None)
         if not current_span:
             return
 
+        if is_unsampled(current_span):
+            if response and hasattr(request, 'current_scope'):
+                request.current_scope.close()
+            return
+
         if response:
             current_span.set_tag(ot_tags.HTTP_STATUS_CODE, response.status_code)
 
@@ -1,6 +1,5 @@
 import logging
 
-import opentracing
 from opentracing.ext import tags as ot_tags
 
 try:
@@ -9,6 +8,8 @@ except Exception:  # pragma: no cover
     pass
 
 from opentracing_utils.common import sanitize_url
+from opentracing_utils.sampling import UNSAMPLED_SPAN, get_sampler, is_unsampled, sample_entry_span
+from opentracing_utils.tracers import extract_wsgi_span_context, get_tracer, is_noop_tracer
 
 
 logger = logging.getLogger(__name__)
@@ -20,7 +21,7 @@ DEFUALT_RESPONSE_ATTRIBUTES = ('status_code',)
 
 def trace_flask(app, request_attr=DEFUALT_REQUEST_ATTRIBUTES, response_attr=DEFUALT_RESPONSE_ATTRIBUTES,
                 default_tags=None, error_on_4xx=True, mask_url_query=False, mask_url_path=False, operation_name=None,
-                skip_span=None, use_scope_manager=False):
+                skip_span=None, use_scope_manager=False, sampler=None, tracer=None):
     """
     Add OpenTracing to Flask applications using ``before_request`` & ``after_request``.
 
@@ -59,32 +60,47 @@ def trace_flask(app, request_attr=DEFUALT_REQUEST_ATTRIBUTES, response_attr=DEFU
 
     :param use_scope_manager: Always use the scope manager when starting the span. Default is ``False``.
     :type use_scope_manager: bool
+
+    :param sampler: Head sampling, either a sample rate (0.0 to 1.0) or a sampler with ``is_sampled(trace_id)``.
+                    Unsampled requests, and requests not sampled upstream, get a ``NonRecordingSpan`` of the trace
+                    context as ``current_span``. Default is None.
+    :type sampler: float | TraceIdRatioSampler
+
+    :param tracer: Tracer of the request spans. Default is None, using ``opentracing.tracer``.
+    :type tracer: opentracing.Tracer
     """
 
     min_error_code = 400 if error_on_4xx else 500
+    span_sampler = get_sampler(sampler)
+
+    # Static tags, passed at span creation along with the request tags.
+    static_tags = dict(default_tags) if type(default_tags) is dict else {}
+    static_tags[ot_tags.COMPONENT] = 'flask'
+    static_tags[ot_tags.SPAN_KIND] = ot_tags.SPAN_KIND_RPC_SERVER
 
     @app.before_request
     def trace_request():
         if callable(skip_span) and skip_span(request):
             return
 
-        op_name = request.endpoint if request.endpoint else request.path.strip('/').replace('/', '_')
+        if is_noop_tracer(tracer):
+            # Tracing is off, no request tags nor context extraction.
+            request.current_span = UNSAMPLED_SPAN
+            return
 
-        if callable(operation_name):
-            op_name = operation_name() or op_name
+        span_tracer = get_tracer(tracer)
 
-        span = None
-        headers_carrier = dict(request.headers.items())
+        span_ctx, unsampled, no_propagation = extract_wsgi_span_context(request.environ, span_tracer, span_sampler)
+        if unsampled is not None:
+            set_current_span(unsampled, span_tracer)
+            return
 
-        try:
-            span_ctx = opentracing.tracer.extract(opentracing.Format.HTTP_HEADERS, headers_carrier)
-            span = opentracing.tracer.start_span(operation_name=op_name, child_of=span_ctx)
-        except (opentracing.InvalidCarrierException, opentracing.SpanContextCorruptedException):
-            span = opentracing.tracer.start_span(operation_name=op_name, tags={'flask-no-propagation': True})
+        op_name = request.endpoint if request.endpoint else request.path.strip('/').replace('/', '_')
 
-        if span is None:
-            span = opentracing.tracer.start_span(op_name)
+        if callable(operation_name):
+            op_name = operation_name() or op_name
 
+        tags = {}
         if request_attr:
             for attr in request_attr:
                 if hasattr(request, attr):
@@ -101,22 +117,25 @@ def trace_flask(app, request_attr=DEFUALT_REQUEST_ATTRIBUTES, response_attr=DEFU
                             tag_key = ot_tags.HTTP_METHOD
 
                         if tag_value:
-                            span.set_tag(tag_key, tag_value)
+                            tags[tag_key] = tag_value
                     except Exception:
                         pass
 
-        if type(default_tags) is dict:
-            for k, v in default_tags.items():
-                try:
-                    span.set_tag(k, v)
-                except Exception:
-                    pass
+        tags.update(static_tags)
+
+        if no_propagation:
+            tags['flask-no-propagation'] = True
 
-        span.set_tag(ot_tags.COMPONENT, 'flask')
-        span.set_tag(ot_tags.SPAN_KIND, ot_tags.SPAN_KIND_RPC_SERVER)
+        span = span_tracer.start_span(operation_name=op_name, child_of=span_ctx, tags=tags)
 
+        if span is None:
+            span = span_tracer.start_span(op_name, tags=tags)
+
+        set_current_span(sample_entry_span(span_sampler, span_tracer, span), span_tracer)
+
+    def set_current_span(span, span_tracer):
         if use_scope_manager:
-            scope = opentracing.tracer.scope_manager.activate(span, finish_on_close=True)
+            scope = span_tracer.scope_manager.activate(span, finish_on_close=True)
             request.current_scope = scope
 
         # Use ``flask.request`` as in process context.
@@ -125,7 +144,10 @@ def trace_flask(app, request_attr=DEFUALT_REQUEST_ATTRIBUTES, response_attr=DEFU
     @app.after_request
     def trace_response(response):
         try:
-            if hasattr(request, 'current_span'):
+            if hasattr(request, 'current_span') and is_unsampled(request.current_span):
+                if hasattr(request, 'current_scope'):
+                    request.current_scope.close()
+            elif hasattr(request, 'current_span'):
                 if response_attr:
                     for attr in response_attr:
                         if hasattr(response, attr):
@@ -0,0 +1,206 @@
+"""
+``concurrent.futures`` executors propagating the caller span to the workers.
+
+The parent span is captured in the calling thread at ``submit``/``map`` time (from the scope manager, or via call stack
+frames inspection), and activated in the worker while the task runs, so ``@trace`` calls in the worker get it as their
+parent. Process pool tasks get the serialized span context instead (``Format.TEXT_MAP``).
+"""
+import functools
+import sys
+import threading
+import time
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+except ImportError:  # pragma: no cover
+    ThreadPoolExecutor = ProcessPoolExecutor = object
+
+import opentracing
+from opentracing import Format
+
+from opentracing_utils.sampling import UNSAMPLED_SPAN, NonRecordingSpan, is_context_unsampled, is_unsampled
+from opentracing_utils.span import get_parent_span, FRAME_SPANS
+from opentracing_utils.tracers import is_noop_tracer
+
+
+class _TracedExecutorMixin(object):
+
+    def _init_tracing(self, kwargs):
+        self._task_spans = kwargs.pop('task_spans', False)
+        self._task_operation_name = kwargs.pop('task_operation_name', None)
+        self._inspect_stack = kwargs.pop('inspect_stack', None)
+
+        # Parent captured once by ``map``, for all the tasks it submits.
+        self._mapping = threading.local()
+
+    def submit(self, fn, *args, **kwargs):
+        captured = getattr(self._mapping, 'captured', None)
+
+        if captured is None:
+            if is_noop_tracer():
+                return super(_TracedExecutorMixin, self).submit(fn, *args, **kwargs)
+
+            captured = self._capture(self._operation_name(fn))
+
+        return super(_TracedExecutorMixin, self).submit(self._traced_task(captured, fn), *args, **kwargs)
+
+    def map(self, fn, *iterables, **kwargs):
+        if is_noop_tracer():
+            return super(_TracedExecutorMixin, self).map(fn, *iterables, **kwargs)
+
+        # ``Executor.map`` submits all the tasks before returning.
+        self._mapping.captured = self._capture(self._operation_name(fn))
+        try:
+            return super(_TracedExecutorMixin, self).map(fn, *iterables, **kwargs)
+        finally:
+            self._mapping.captured = None
+
+    def _operation_name(self, fn):
+        return self._task_operation_name or getattr(fn, '__name__', None) or 'executor_task'
+
+    def _parent_span(self):
+        parent_span = None
+        try:
+            parent_span = opentracing.tracer.active_span
+        except AttributeError:
+            # Old opentracing lib!
+            pass
+
+        if parent_span is None:
+            _, parent_span = get_parent_span(inspect_stack=self._inspect_stack, inspect_kwargs=False)
+
+        return parent_span
+
+    def _capture(self, operation_name):
+        """Return what the tasks need from the caller, at ``submit``/``map`` time."""
+        raise NotImplementedError
+
+    def _traced_task(self, captured, fn):
+        """Return the callable submitted instead of ``fn``."""
+        raise NotImplementedError
+
+
+class TracedThreadPoolExecutor(_TracedExecutorMixin, ThreadPoolExecutor):
+    """
+    ``ThreadPoolExecutor`` running every task with the span of its caller (at ``submit``/``map`` time) as the active
+    span.
+
+    Takes the ``ThreadPoolExecutor`` arguments, plus:
+
+    :param task_spans: Start a child span per task, covering the task run. The time spent waiting in the executor
+                       queue is set as the ``executor.queue_wait_ms`` tag. Default is False.
+    :type task_spans: bool
+
+    :param task_operation_name: Operation name of the task spans. Default is the task function name.
+    :type task_operation_name: str
+
+    :param inspect_stack: Whether to inspect call stack frames to retrieve the caller span, if there is no active
+                          span. Same as ``@trace(inspect_stack=...)``.
+    :type inspect_stack: bool
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._init_tracing(kwargs)
+        super(TracedThreadPoolExecutor, self).__init__(*args, **kwargs)
+
+    def _capture(self, operation_name):
+        return self._parent_span(), operation_name, time.time()
+
+    def _traced_task(self, captured, fn):
+        parent_span, operation_name, submitted_at = captured
+        if self._task_spans:
+            return functools.partial(_run_task_span, parent_span, operation_name, submitted_at, fn)
+
+        return functools.partial(_run_with_parent, parent_span, fn)
+
+
+class TracedProcessPoolExecutor(_TracedExecutorMixin, ProcessPoolExecutor):
+    """
+    ``ProcessPoolExecutor`` running every task with the span context of its caller (at ``submit``/``map`` time) as the
+    active span context.
+
+    The span context is injected as ``Format.TEXT_MAP``, and extracted in the worker process by its own
+    ``opentracing.tracer``, which should be initialized there too (e.g. inherited via ``fork``, or via the executor
+    ``initializer``). Takes the ``ProcessPoolExecutor`` arguments, plus ``task_spans``, ``task_operation_name`` and
+    ``inspect_stack`` (see ``TracedThreadPoolExecutor``).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._init_tracing(kwargs)
+        super(TracedProcessPoolExecutor, self).__init__(*args, **kwargs)
+
+    def _capture(self, operation_name):
+        parent_span = self._parent_span()
+
+        carrier = None
+        # Spans of unsampled traces are injected too (with the sampling flag off), except the context-less one.
+        no_context = parent_span is UNSAMPLED_SPAN
+        if parent_span is not None and not no_context:
+            carrier = {}
+            try:
+                opentracing.tracer.inject(parent_span.context, Format.TEXT_MAP, carrier)
+            except opentracing.UnsupportedFormatException:
+                carrier = None
+
+        return carrier, no_context, operation_name, time.time()
+
+    def _traced_task(self, captured, fn):
+        carrier, no_context, operation_name, submitted_at = captured
+
+        return functools.partial(
+            _run_in_process, carrier, no_context, operation_name if self._task_spans else None, submitted_at, fn)
+
+
+def _run_with_parent(parent_span, fn, *args, **kwargs):
+    if parent_span is None:
+        return fn(*args, **kwargs)
+
+    scope_manager = getattr(opentracing.tracer, 'scope_manager', None)
+
+    if parent_span is UNSAMPLED_SPAN or scope_manager is None:
+        # No span context (or old opentracing lib), only detectable via call stack frames inspection.
+        frame_id = id(sys._getframe())
+        FRAME_SPANS[frame_id] = parent_span
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            del FRAME_SPANS[frame_id]
+
+    with scope_manager.activate(parent_span, finish_on_close=False):
+        return fn(*args, **kwargs)
+
+
+def _run_task_span(parent_span, operation_name, submitted_at, fn, *args, **kwargs):
+    if is_unsampled(parent_span):
+        return _run_with_parent(parent_span, fn, *args, **kwargs)
+
+    started_at = time.time()
+    span = opentracing.tracer.start_span(
+        operation_name=operation_name, child_of=parent_span, start_time=started_at,
+        tags={'executor.queue_wait_ms': round((started_at - submitted_at) * 1000, 3)})
+
+    with span:
+        return _run_with_parent(span, fn, *args, **kwargs)
+
+
+def _run_in_process(carrier, no_context, task_operation_name, submitted_at, fn, *args, **kwargs):
+    parent_span = None
+
+    if no_context:
+        parent_span = UNSAMPLED_SPAN
+    elif carrier is not None:
+        try:
+            span_ctx = opentracing.tracer.extract(Format.TEXT_MAP, carrier)
+        except (opentracing.UnsupportedFormatException, opentracing.InvalidCarrierException,
+                opentracing.SpanContextCorruptedException):
+            span_ctx = None
+
+        if span_ctx is not None:
+            # Only used as a parent, never finished.
+            span_class = NonRecordingSpan if is_context_unsampled(span_ctx) else opentracing.Span
+            parent_span = span_class(opentracing.tracer, span_ctx)
+
+    if task_operation_name:
+        return _run_task_span(parent_span, task_operation_name, submitted_at, fn, *args, **kwargs)
+
+    return _run_with_parent(parent_span, fn, *args, **kwargs)
@@ -1,10 +1,15 @@
 from __future__ import absolute_import
-from future import standard_library
-standard_library.install_aliases()  # noqa
 
 import logging
 import re
-import urllib.parse as parse
+
+try:
+    import urllib.parse as parse
+except ImportError:  # pragma: no cover
+    # Python 2
+    from future import standard_library
+    standard_library.install_aliases()
+    import urllib.parse as parse
 
 try:
     import requests
@@ -20,6 +25,8 @@ from opentracing.ext import tags as ot_tags
 from opentracing_utils.decorators import trace
 from opentracing_utils.span import get_span_from_kwargs
 from opentracing_utils.common import sanitize_url
+from opentracing_utils.sampling import UNSAMPLED_SPAN, is_unsampled
+from opentracing_utils.tracers import get_tracer, is_noop_tracer
 
 
 OPERATION_NAME_PREFIX = 'http_send'
@@ -28,7 +35,8 @@ logger = logging.getLogger(__name__)
 
 
 def trace_requests(default_tags=None, set_error_tag=True, mask_url_query=True,
-                   mask_url_path=False, ignore_url_patterns=None, span_extractor=None, use_scope_manager=False):
+                   mask_url_path=False, ignore_url_patterns=None, span_extractor=None, use_scope_manager=False,
+                   sampler=None, tracer=None):
     """Patch requests library with OpenTracing support.
 
     :param default_tags: Default span tags to included with every outgoing request.
@@ -51,6 +59,13 @@ def trace_requests(default_tags=None, set_error_tag=True, mask_url_query=True,
 
     :param use_scope_manager: Always use the scope manager when starting the span.
     :type use_scope_manager: bool
+
+    :param sampler: Head sampling, either a sample rate (0.0 to 1.0) or a sampler with ``is_sampled(trace_id)``.
+                    Unsampled requests are sent as is. Default is None.
+    :type sampler: float | TraceIdRatioSampler
+
+    :param tracer: Tracer of the request spans. Default is None, using ``opentracing.tracer``.
+    :type tracer: opentracing.Tracer
     """
     def skip_span_matcher(http_adapter_obj, request, **kwargs):
         if ignore_url_patterns is None:
@@ -61,12 +76,19 @@ def trace_requests(default_tags=None, set_error_tag=True, mask_url_query=True,
 
         return False
 
+    # Static tags, passed at span creation.
+    static_tags = dict(default_tags) if type(default_tags) is dict else {}
+    static_tags[ot_tags.SPAN_KIND] = ot_tags.SPAN_KIND_RPC_CLIENT
+
     @trace(
+        component='requests',
         pass_span=True,
-        tags=default_tags,
+        tags=static_tags,
         skip_span=skip_span_matcher,
         span_extractor=span_extractor,
-        use_scope_manager=use_scope_manager
+        use_scope_manager=use_scope_manager,
+        sampler=sampler,
+        tracer=tracer,
     )
     def requests_send_wrapper(self, request, **kwargs):
         if ignore_url_patterns is not None:
@@ -78,27 +100,26 @@ def trace_requests(default_tags=None, set_error_tag=True, mask_url_query=True,
         k, request_span = get_span_from_kwargs(inspect_stack=False, **kwargs)
         kwargs.pop(k, None)
 
+        if is_unsampled(request_span):
+            if request_span is not UNSAMPLED_SPAN:
+                # Not sampled upstream: no span tags, but the decision is propagated downstream.
+                inject_span_context(request_span, request)
+            return __requests_http_send(self, request, **kwargs)
+
         components = parse.urlsplit(request.url)
 
         if request_span:
             (request_span
                 .set_operation_name(op_name)
-                .set_tag(ot_tags.COMPONENT, 'requests')
                 .set_tag(ot_tags.PEER_HOSTNAME, components.hostname)
                 .set_tag(
                     ot_tags.HTTP_URL,
                     sanitize_url(request.url, mask_url_query=mask_url_query, mask_url_path=mask_url_path))
                 .set_tag(ot_tags.HTTP_METHOD, request.method)
-                .set_tag(ot_tags.SPAN_KIND, ot_tags.SPAN_KIND_RPC_CLIENT)
                 .set_tag('timeout', kwargs.get('timeout')))
 
             # Inject our current span context to outbound request
-            try:
-                carrier = {}
-                opentracing.tracer.inject(request_span.context, Format.HTTP_HEADERS, carrier)
-                request.headers.update(carrier)
-            except opentracing.UnsupportedFormatException:
-                logger.error('Failed to inject span context in request!')
+            inject_span_context(request_span, request)
 
             resp = __requests_http_send(self, request, **kwargs)
             request_span.set_tag(ot_tags.HTTP_STATUS_CODE, resp.status_code)
@@ -111,5 +132,20 @@ def trace_requests(default_tags=None, set_error_tag=True, mask_url_query=True,
             logger.warn('Failed to extract span during initiating request!')
             return __requests_http_send(self, request, **kwargs)
 
+    def inject_span_context(span, request):
+        try:
+            carrier = {}
+            get_tracer(tracer).inject(span.context, Format.HTTP_HEADERS, carrier)
+            request.headers.update(carrier)
+        except opentracing.UnsupportedFormatException:
+            logger.error('Failed to inject span context in request!')
+
+    def requests_send(self, request, **kwargs):
+        if is_noop_tracer(tracer):
+            # Tracing is off, no span and no headers injection.
+            return __requests_http_send(self, request, **kwargs)
+
+        return requests_send_wrapper(self, request, **kwargs)
+
     # The Patch!
-    requests.adapters.HTTPAdapter.send = requests_send_wrapper
+    requests.adapters.HTTPAdapter.send = requests_send
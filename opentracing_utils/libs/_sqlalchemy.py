@@ -1,5 +1,3 @@
-import opentracing
-
 try:
     from sqlalchemy.engine import Engine
     from sqlalchemy.event import listens_for
@@ -7,7 +5,10 @@ except ImportError:  # pragma: no cover
     pass
 
 from opentracing.ext import tags as ot_tags
+from opentracing_utils.sampling import (
+    get_sampler, is_context_sampled, is_context_unsampled, is_entry_sampled, is_unsampled)
 from opentracing_utils.span import get_parent_span
+from opentracing_utils.tracers import get_tracer, is_noop_tracer
 
 
 def trace_sqlalchemy(
@@ -16,7 +17,9 @@ def trace_sqlalchemy(
     set_error_tag=False,
     skip_span=None,
     enrich_span=None,
-    use_scope_manager=False
+    use_scope_manager=False,
+    sampler=None,
+    tracer=None
 ):
     """
     Trace Sqlalchemy database queries.
@@ -41,17 +44,35 @@ def trace_sqlalchemy(
 
     :param use_scope_manager: Always use the scope manager when starting the span.
     :type use_scope_manager: bool
+
+    :param sampler: Head sampling, either a sample rate (0.0 to 1.0) or a sampler with ``is_sampled(trace_id)``.
+                    No span is started for unsampled queries. Default is None.
+    :type sampler: float | TraceIdRatioSampler
+
+    :param tracer: Tracer of the query spans. Default is None, using ``opentracing.tracer``.
+    :type tracer: opentracing.Tracer
     """
+    span_sampler = get_sampler(sampler)
+
+    # Static tags, passed at span creation along with the query tags.
+    static_tags = {
+        ot_tags.COMPONENT: 'sqlalchemy',
+        'db.type': 'sql',
+    }
 
     @listens_for(Engine, 'before_cursor_execute')
     def trace_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if is_noop_tracer(tracer):
+            return
+
         if callable(skip_span) and skip_span(conn, cursor, statement, parameters, context, executemany):
             return
 
+        span_tracer = get_tracer(tracer)
         parent_span = None
         using_scope_manager = False
         try:
-            parent_span = opentracing.tracer.active_span
+            parent_span = span_tracer.active_span
             using_scope_manager = True if parent_span else False
         except AttributeError:
             pass
@@ -61,28 +82,36 @@ def trace_sqlalchemy(
         elif not parent_span:
             _, parent_span = get_parent_span()
 
+        if parent_span:
+            unsampled = is_unsampled(parent_span) or is_context_unsampled(parent_span.context)
+            if unsampled or not is_context_sampled(span_sampler, parent_span.context):
+                # No statement capture for unsampled traces.
+                return
+
         if context:
             op_name = statement.split(' ')[0].lower() or 'query'
             if callable(operation_name):
                 op_name = operation_name(conn, cursor, statement, parameters, context, executemany)
 
-            query_span = opentracing.tracer.start_span(operation_name=op_name, child_of=parent_span)
+            tags = dict(static_tags)
+            tags['db.engine'] = context.dialect.name
+            tags['db.statement'] = statement
 
-            if context:
-                (query_span
-                    .set_tag(ot_tags.COMPONENT, 'sqlalchemy')
-                    .set_tag('db.type', 'sql')
-                    .set_tag('db.engine', context.dialect.name)
-                    .set_tag('db.statement', statement))
+            query_span = span_tracer.start_span(operation_name=op_name, child_of=parent_span, tags=tags)
 
-                if callable(enrich_span):
-                    enrich_span(query_span, conn, cursor, statement, parameters, context, executemany)
+            if not parent_span:
+                sampled = is_entry_sampled(span_sampler, query_span.context)
+                if not sampled or is_context_unsampled(query_span.context):
+                    return
 
-                if use_scope_manager or using_scope_manager:
-                    scope = opentracing.tracer.scope_manager.activate(query_span, finish_on_close=True)
-                    context._query_scope = scope
+            if callable(enrich_span):
+                enrich_span(query_span, conn, cursor, statement, parameters, context, executemany)
 
-                context._query_span = query_span
+            if use_scope_manager or using_scope_manager:
+                scope = span_tracer.scope_manager.activate(query_span, finish_on_close=True)
+                context._query_scope = scope
+
+            context._query_span = query_span
 
     @listens_for(Engine, 'after_cursor_execute')
     def tarce_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
@@ -102,5 +131,6 @@ def trace_sqlalchemy(
 
         if hasattr(context, '_query_scope'):
             context._query_scope.close()
-        else:
+        elif hasattr(context, '_query_span'):
+            # No span for skipped or unsampled queries.
             context._query_span.finish()
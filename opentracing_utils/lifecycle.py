@@ -0,0 +1,226 @@
+"""
+Flush on shutdown of the tracers created by ``init_opentracing_tracer``, bounded by a deadline.
+
+Hooks (``atexit`` and ``SIGTERM``) are registered once per process, and act on the last installed
+``TracerLifecycle``: ``SIGTERM`` flushes it (the process may keep running, e.g. draining requests), and the tracer is
+closed for good at exit.
+"""
+import atexit
+import logging
+import os
+import signal
+import threading
+import time
+
+
+DEFAULT_SHUTDOWN_TIMEOUT = 5.0
+
+# Max ``.recorder`` wrappers followed (e.g. ``MetricsRecorder`` -> ``TailSamplingRecorder`` -> ``AsyncBatchRecorder``)
+# looking for the recorder counters.
+MAX_WRAPPED_RECORDERS = 5
+
+
+logger = logging.getLogger(__name__)
+
+_lifecycle = None
+_hooks_lock = threading.Lock()
+_atexit_registered = False
+_sigterm_registered = False
+_previous_sigterm_handler = None
+
+
+class TracerLifecycle(object):
+    """
+    Flush and close a tracer (and its recorder) once, on shutdown, within ``timeout`` seconds.
+
+    Closing runs in a daemon thread, so a blocking backend (e.g. an unreachable collector) never delays the process
+    exit by more than ``timeout``.
+
+    :param tracer: The tracer (``basictracer``, Jaeger, LightStep ...).
+    :type tracer: opentracing.Tracer
+
+    :param timeout: Shutdown deadline in seconds. Default is 5.0.
+    :type timeout: float
+    """
+
+    def __init__(self, tracer, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        self.tracer = tracer
+        self.timeout = timeout
+
+        self.report = None
+        self._lock = threading.Lock()
+
+    def shutdown(self, timeout=None):
+        """
+        Flush and close the tracer, waiting at most ``timeout`` seconds (default is the lifecycle ``timeout``).
+
+        Return the shutdown report: the spans ``flushed`` during shutdown and ``dropped`` overall (None if unknown
+        for the recorder), the ``duration`` and whether it ``timed_out``. Later calls return the same report.
+        """
+        with self._lock:
+            if self.report is not None:
+                return self.report
+
+            self.report = self._run(self._close, timeout, 'shutdown')
+            return self.report
+
+    def flush(self, timeout=None):
+        """
+        Flush the buffered spans, waiting at most ``timeout`` seconds, leaving the tracer usable.
+
+        Return a report like ``shutdown``, or the shutdown report if the tracer is already closed.
+        """
+        with self._lock:
+            if self.report is not None:
+                return self.report
+
+            return self._run(self._flush, timeout, 'flush')
+
+    def _run(self, target, timeout, action):
+        timeout = self.timeout if timeout is None else timeout
+        counters = _get_counters(getattr(self.tracer, 'recorder', None))
+        flushed_before = counters.flushed if counters is not None else 0
+
+        started = time.time()
+        worker = threading.Thread(target=target, args=(timeout,), name='opentracing-utils-{}'.format(action))
+        worker.daemon = True
+        worker.start()
+        worker.join(timeout)
+
+        timed_out = worker.is_alive()
+
+        flushed = dropped = None
+        if counters is not None:
+            flushed = counters.flushed - flushed_before
+            # Spans still buffered at the deadline are lost.
+            dropped = counters.dropped + counters.queue_depth
+
+        report = {
+            'flushed': flushed,
+            'dropped': dropped,
+            'duration': time.time() - started,
+            'timed_out': timed_out,
+        }
+
+        log = logger.warning if timed_out or dropped else logger.info
+        log('Tracer {}: {}'.format(action, report))
+
+        return report
+
+    def _flush(self, timeout):
+        tracer = self.tracer
+        try:
+            recorder = getattr(tracer, 'recorder', None)
+            if recorder is not None:
+                # basictracer, the batching recorder (buffered traces of wrapping recorders are decided on close).
+                recorder = _get_counters(recorder) or recorder
+                if callable(getattr(recorder, 'flush', None)):
+                    recorder.flush()
+            elif callable(getattr(tracer, 'flush', None)):
+                # LightStep
+                tracer.flush()
+        except Exception:
+            logger.exception('Failed to flush tracer')
+
+    def _close(self, timeout):
+        tracer = self.tracer
+        try:
+            recorder = getattr(tracer, 'recorder', None)
+            if recorder is not None:
+                # basictracer
+                if callable(getattr(recorder, 'close', None)):
+                    recorder.close()
+            elif callable(getattr(tracer, 'flush', None)):
+                # LightStep
+                tracer.flush()
+
+            if callable(getattr(tracer, 'close', None)):
+                # Jaeger, returning a (tornado) future resolved once the reporter is flushed.
+                closed = tracer.close()
+                if callable(getattr(closed, 'add_done_callback', None)):
+                    done = threading.Event()
+                    closed.add_done_callback(lambda _: done.set())
+                    done.wait(timeout)
+        except Exception:
+            logger.exception('Failed to close tracer')
+
+
+def _get_counters(recorder):
+    # Recorders wrapping another one (tail sampling, metrics) are followed up to the batching recorder.
+    for _ in range(MAX_WRAPPED_RECORDERS):
+        if recorder is None or hasattr(recorder, 'flushed'):
+            break
+        recorder = getattr(recorder, 'recorder', None)
+
+    if recorder is not None and all(hasattr(recorder, name) for name in ('flushed', 'dropped', 'queue_depth')):
+        return recorder
+
+    return None
+
+
+def get_tracer_lifecycle():
+    """Return the installed ``TracerLifecycle``, or None."""
+    return _lifecycle
+
+
+def install_tracer_lifecycle(lifecycle, register_atexit=True, register_sigterm=True):
+    """
+    Install ``lifecycle`` to be shut down on process exit (``atexit``) and ``SIGTERM``, replacing any installed one.
+
+    The ``SIGTERM`` handler can only be registered from the main thread. It flushes the tracer and calls the previous
+    handler, the tracer being closed at exit; when the previous action is the default one, the tracer is shut down,
+    then the default action is restored and the signal re-raised (terminating the process as before, without running
+    the ``atexit`` hooks).
+    """
+    global _lifecycle, _atexit_registered, _sigterm_registered, _previous_sigterm_handler
+
+    with _hooks_lock:
+        _lifecycle = lifecycle
+
+        if register_atexit and not _atexit_registered:
+            atexit.register(shutdown_tracer)
+            _atexit_registered = True
+
+        if register_sigterm and not _sigterm_registered:
+            try:
+                _previous_sigterm_handler = signal.signal(signal.SIGTERM, _handle_sigterm)
+                _sigterm_registered = True
+            except ValueError:
+                logger.warning('Cannot register the SIGTERM tracer shutdown handler outside the main thread')
+
+    return lifecycle
+
+
+def shutdown_tracer(timeout=None):
+    """Shut down the installed ``TracerLifecycle``, if any, and return its report."""
+    lifecycle = _lifecycle
+    if lifecycle is None:
+        return None
+
+    return lifecycle.shutdown(timeout)
+
+
+def flush_tracer(timeout=None):
+    """Flush the installed ``TracerLifecycle``, if any, leaving the tracer usable, and return its report."""
+    lifecycle = _lifecycle
+    if lifecycle is None:
+        return None
+
+    return lifecycle.flush(timeout)
+
+
+def _handle_sigterm(signum, frame):
+    previous = _previous_sigterm_handler
+    try:
+        if callable(previous) or previous == signal.SIG_IGN:
+            # The process may keep running, closed at exit.
+            flush_tracer()
+        else:
+            shutdown_tracer()
+    finally:
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # Default action: terminate.
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
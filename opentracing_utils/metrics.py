@@ -0,0 +1,269 @@
+"""
+RED metrics (rate, errors, duration) aggregated from finished spans, in process.
+
+Spans are aggregated per ``(operation name, component, status)`` series, ``status`` being ``error`` for spans with an
+``error`` tag and ``ok`` otherwise. Each series has a fixed memory log-linear latency histogram, with a few trace id
+exemplars per bucket, so traces can be sampled aggressively while metrics still see every span.
+"""
+import array
+import collections
+import threading
+
+from opentracing.ext import tags as ot_tags
+
+from opentracing_utils.span_store import SpanRecord
+
+
+# Histogram values are in microseconds; ``2 ** PRECISION_BITS`` linear buckets per power of two (~3% relative error).
+PRECISION_BITS = 5
+MAX_VALUE_BITS = 40
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+DEFAULT_MAX_SERIES = 1000
+# Fixed ``le`` bounds (seconds) of the exposed histograms, the fine buckets are merged into them.
+DEFAULT_EXPOSITION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_EXEMPLARS_PER_BUCKET = 2
+
+# Operation name of the series beyond ``max_series``.
+OVERFLOW_OPERATION = '_overflow'
+
+_HALF = 2 ** (PRECISION_BITS - 1)
+_LINEAR = 2 ** PRECISION_BITS
+BUCKETS_COUNT = (MAX_VALUE_BITS - PRECISION_BITS + 2) * _HALF
+
+
+def bucket_index(duration):
+    """Return the histogram bucket index of ``duration`` (seconds)."""
+    value = int(duration * 1e6)
+    if value < _LINEAR:
+        return max(value, 0)
+
+    exponent = value.bit_length() - PRECISION_BITS
+    return min(exponent * _HALF + (value >> exponent), BUCKETS_COUNT - 1)
+
+
+def bucket_bounds(index):
+    """Return the ``(lower, upper)`` bounds (seconds) of the histogram bucket ``index``."""
+    if index < _LINEAR:
+        return index / 1e6, (index + 1) / 1e6
+
+    exponent = index // _HALF - 1
+    mantissa = index - exponent * _HALF
+    return (mantissa << exponent) / 1e6, ((mantissa + 1) << exponent) / 1e6
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear latency histogram with fixed memory, and the last trace id exemplars of each bucket.
+
+    Bucket bounds are powers of two subdivided linearly, in microseconds: quantiles have a bounded relative error
+    (~3%), from microseconds to days.
+    """
+
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max', 'exemplars', 'exemplars_per_bucket')
+
+    def __init__(self, exemplars_per_bucket=DEFAULT_EXEMPLARS_PER_BUCKET):
+        self.counts = array.array('L', [0]) * BUCKETS_COUNT
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        # Bucket index -> (trace id, duration, timestamp) of the last spans.
+        self.exemplars = {}
+        self.exemplars_per_bucket = exemplars_per_bucket
+
+    def record(self, duration, trace_id=None, timestamp=None):
+        index = bucket_index(duration)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += duration
+
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+
+        if trace_id is not None and self.exemplars_per_bucket:
+            exemplars = self.exemplars.get(index)
+            if exemplars is None:
+                exemplars = self.exemplars[index] = collections.deque(maxlen=self.exemplars_per_bucket)
+            exemplars.append((trace_id, duration, timestamp))
+
+    def copy(self):
+        histogram = LatencyHistogram(self.exemplars_per_bucket)
+        histogram.counts = array.array('L', self.counts)
+        histogram.count, histogram.sum, histogram.min, histogram.max = self.count, self.sum, self.min, self.max
+        histogram.exemplars = dict((index, collections.deque(exemplars, exemplars.maxlen))
+                                   for index, exemplars in self.exemplars.items())
+        return histogram
+
+    def buckets(self):
+        """Return the ``(upper bound, count)`` of the non empty buckets."""
+        return [(bucket_bounds(index)[1], count) for index, count in enumerate(self.counts) if count]
+
+    def quantile(self, q):
+        """Return the ``q`` (0.0 to 1.0) quantile of the durations, or None if empty."""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                lower, upper = bucket_bounds(index)
+                # Bucket middle, within the observed range.
+                return min(max((lower + upper) / 2.0, self.min), self.max)
+
+        return self.max  # pragma: no cover
+
+
+class MetricsRecorder(object):
+    """
+    Recorder aggregating finished spans into RED metrics per ``(operation name, component, status)`` series.
+
+    Spans are then passed to ``recorder`` if any (e.g. a ``TailSamplingRecorder``), so metrics are computed from all
+    the spans whatever is exported.
+
+    :param recorder: Recorder of the spans, after aggregation. Default is None.
+    :type recorder: object
+
+    :param max_series: Max series, spans of new series beyond it are aggregated in a single ``_overflow`` operation
+                       series. Default is 1000.
+    :type max_series: int
+
+    :param exemplars_per_bucket: Last trace ids kept per histogram bucket. Default is 2.
+    :type exemplars_per_bucket: int
+    """
+
+    def __init__(self, recorder=None, max_series=DEFAULT_MAX_SERIES,
+                 exemplars_per_bucket=DEFAULT_EXEMPLARS_PER_BUCKET):
+        self.recorder = recorder
+        self.max_series = max_series
+        self.exemplars_per_bucket = exemplars_per_bucket
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record_span(self, span):
+        if isinstance(span, SpanRecord):
+            trace_id = span.trace_id
+        else:
+            trace_id = span.context.trace_id
+
+        tags = span.tags or {}
+        key = (span.operation_name or '', tags.get(ot_tags.COMPONENT) or '',
+               STATUS_ERROR if tags.get(ot_tags.ERROR) else STATUS_OK)
+
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                if len(self._series) >= self.max_series:
+                    key = (OVERFLOW_OPERATION, '', key[2])
+                    histogram = self._series.get(key)
+
+                if histogram is None:
+                    histogram = self._series[key] = LatencyHistogram(self.exemplars_per_bucket)
+
+            histogram.record(span.duration, trace_id, span.start_time + span.duration)
+
+        if self.recorder is not None:
+            self.recorder.record_span(span)
+
+    def snapshot(self, reset=False):
+        """
+        Return a copy of the series histograms, keyed by ``(operation name, component, status)``.
+
+        :param reset: Start new histograms (e.g. to compute metrics per interval). Default is False.
+        :type reset: bool
+        """
+        with self._lock:
+            if reset:
+                series, self._series = self._series, {}
+                return series
+
+            return dict((key, histogram.copy()) for key, histogram in self._series.items())
+
+    def prometheus_text(self, name='span_duration_seconds', openmetrics=False, buckets=DEFAULT_EXPOSITION_BUCKETS):
+        """
+        Return the metrics in Prometheus text exposition format, as a ``name`` histogram.
+
+        The fine histogram buckets are merged into the fixed ``buckets`` upper bounds (seconds), so every scrape
+        exposes the same buckets. A fine bucket is counted in the first bound not below its upper bound (at most one
+        fine bucket width, ~3%, off). With ``openmetrics``, the OpenMetrics format is used instead, with the bucket
+        exemplars (``trace_id`` label).
+        """
+        return format_prometheus(self.snapshot(), name=name, openmetrics=openmetrics, buckets=buckets)
+
+    def close(self, *args, **kwargs):
+        close = getattr(self.recorder, 'close', None)
+        if callable(close):
+            close(*args, **kwargs)
+
+
+def format_prometheus(series, name='span_duration_seconds', openmetrics=False, buckets=DEFAULT_EXPOSITION_BUCKETS):
+    """Format ``series`` (see ``MetricsRecorder.snapshot``) in Prometheus (or OpenMetrics) text format."""
+    lines = [
+        '# HELP {} Duration of finished spans.'.format(name),
+        '# TYPE {} histogram'.format(name),
+    ]
+
+    def bucket_line(bound, cumulative, exemplar):
+        line = '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+
+        if openmetrics and exemplar is not None:
+            trace_id, duration, timestamp = exemplar
+            line = '{} # {{trace_id="{}"}} {!r}'.format(line, _format_trace_id(trace_id), duration)
+            if timestamp is not None:
+                line = '{} {!r}'.format(line, timestamp)
+
+        return line
+
+    bounds = sorted(buckets)
+
+    for (operation_name, component, status), histogram in sorted(series.items()):
+        labels = 'operation="{}",component="{}",status="{}"'.format(
+            _escape(operation_name), _escape(component), status)
+
+        cumulative = 0
+        position = 0
+        # Last exemplar of the fine buckets merged into the current bound.
+        exemplar = None
+        for index, count in enumerate(histogram.counts):
+            if not count:
+                continue
+
+            upper = bucket_bounds(index)[1]
+            while position < len(bounds) and upper > bounds[position]:
+                lines.append(bucket_line(repr(float(bounds[position])), cumulative, exemplar))
+                exemplar = None
+                position += 1
+
+            cumulative += count
+
+            exemplars = histogram.exemplars.get(index)
+            if exemplars:
+                exemplar = exemplars[-1]
+
+        for bound in bounds[position:]:
+            lines.append(bucket_line(repr(float(bound)), cumulative, exemplar))
+            exemplar = None
+
+        lines.append(bucket_line('+Inf', histogram.count, exemplar))
+        lines.append('{}_sum{{{}}} {!r}'.format(name, labels, histogram.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+
+    if openmetrics:
+        lines.append('# EOF')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _format_trace_id(trace_id):
+    return '{:x}'.format(trace_id) if isinstance(trace_id, int) else _escape(trace_id)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,393 @@
+"""
+Span recorders for ``basictracer`` tracers (e.g. ``init_opentracing_tracer(OPENTRACING_BASIC, recorder=...)``).
+"""
+import collections
+import logging
+import threading
+import time
+
+from opentracing.ext import tags as ot_tags
+
+from opentracing_utils.sampling import _now, get_sampler
+from opentracing_utils.span_store import SpanRecord
+
+
+DEFAULT_MAX_QUEUE_SIZE = 2048
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+DEFAULT_MAX_TRACES = 10000
+DEFAULT_MAX_SPANS_PER_TRACE = 1000
+DEFAULT_DECISION_WAIT = 30.0
+DEFAULT_EXPIRE_INTERVAL = 1.0
+
+# ``span.kind`` of the local entry spans of traces started in another service.
+ENTRY_SPAN_KINDS = (ot_tags.SPAN_KIND_RPC_SERVER, ot_tags.SPAN_KIND_CONSUMER)
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatchRecorder(object):
+    """
+    Recorder pushing finished spans into a bounded ring buffer, drained in batches by a background thread.
+
+    ``record_span`` never blocks: it is a single ``deque`` append, and when the buffer is full the oldest span is
+    dropped (and counted). The background thread passes batches of spans to ``sink``, a callable taking a list of
+    spans, so a slow or failing sink never adds latency to the traced code.
+
+    :param sink: Callable receiving batches (lists) of finished spans.
+    :type sink: Callable[list]
+
+    :param max_queue_size: Ring buffer size. Default is 2048.
+    :type max_queue_size: int
+
+    :param batch_size: Max spans per ``sink`` call, the background thread is woken up when a batch is ready. Default
+                       is 256.
+    :type batch_size: int
+
+    :param flush_interval: Max seconds a span waits in the buffer. Default is 1.0.
+    :type flush_interval: float
+
+    :param compact: Buffer compact ``SpanRecord`` objects instead of the spans, releasing the spans (and their tracer
+                    internals) on ``record_span``. Default is False.
+    :type compact: bool
+    """
+
+    def __init__(self, sink, max_queue_size=DEFAULT_MAX_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, compact=False):
+        self.sink = sink
+        self.compact = compact
+        self.max_queue_size = max_queue_size
+        self.batch_size = min(batch_size, max_queue_size)
+        self.flush_interval = flush_interval
+
+        self._queue = collections.deque(maxlen=max_queue_size)
+        self._wakeup = threading.Event()
+        # Only serializes the draining threads (background thread and explicit flushes), never ``record_span``.
+        self._drain_lock = threading.Lock()
+        self._closed = False
+
+        # Counters.
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='opentracing-utils-recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    @property
+    def pressure(self):
+        """Ring buffer fill ratio (0.0 to 1.0), e.g. for ``OverloadSampler``."""
+        return len(self._queue) / float(self.max_queue_size)
+
+    def stats(self):
+        """Return the recorder counters (latencies in seconds)."""
+        return {
+            'queue_depth': self.queue_depth,
+            'pressure': self.pressure,
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'flush_errors': self.flush_errors,
+            'last_flush_latency': self.last_flush_latency,
+            'max_flush_latency': self.max_flush_latency,
+        }
+
+    def record_span(self, span):
+        if self._closed:
+            # Never flushed anymore.
+            self.dropped += 1
+            return
+
+        if self.compact:
+            span = SpanRecord.from_span(span)
+
+        queue = self._queue
+        depth = len(queue)
+
+        if depth >= self.max_queue_size:
+            # The append overwrites the oldest span. Approximate under contention, but lock free.
+            self.dropped += 1
+
+        queue.append(span)
+
+        if depth + 1 == self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Synchronously pass all the buffered spans to the sink."""
+        with self._drain_lock:
+            while self._queue:
+                self._flush_batch()
+
+    def close(self, timeout=None):
+        """Stop the background thread, after flushing the buffered spans. Spans recorded later are dropped."""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover
+                logger.exception('Failed to flush spans')
+
+        self.flush()
+
+    def _flush_batch(self):
+        queue = self._queue
+        batch = []
+        try:
+            for _ in range(self.batch_size):
+                batch.append(queue.popleft())
+        except IndexError:
+            pass
+
+        if not batch:
+            return
+
+        started = time.time()
+        try:
+            self.sink(batch)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception('Span recorder sink failed, dropped {} spans'.format(len(batch)))
+        else:
+            self.flushed += len(batch)
+        finally:
+            latency = time.time() - started
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+
+class TailSamplingRecorder(object):
+    """
+    Recorder buffering finished spans by trace id, and passing only the interesting traces to ``recorder``.
+
+    A trace is decided when its local entry span finishes: its root span, or a span with a ``span.kind`` tag of
+    ``server`` or ``consumer`` (e.g. set by the Flask and Django integrations on requests with an upstream context).
+    Other traces are decided when no span of the trace finished for ``decision_wait`` seconds, checked by a
+    background thread every ``expire_interval`` seconds. It is kept if any of its spans has an ``error``
+    tag, or lasted at least ``latency_threshold`` seconds; other traces are kept at the ``baseline_rate`` (decided
+    from the trace id, like head sampling). Spans of already decided traces follow the decision, except that an
+    interesting span finishing after its trace was dropped (e.g. an error in work outliving the request) upgrades the
+    trace to kept: its later spans are kept, but its spans finished before the upgrade are lost (such traces are
+    counted in ``upgraded_traces``).
+    The decisions are remembered for the last ``max_traces`` decided traces.
+
+    The buffer is bounded: beyond ``max_traces`` traces, the least recently updated trace is decided as is (and
+    counted as evicted).
+
+    :param recorder: Recorder of the kept spans (e.g. ``AsyncBatchRecorder``).
+    :type recorder: object
+
+    :param latency_threshold: Keep traces having a span lasting at least this many seconds. Default is None.
+    :type latency_threshold: float
+
+    :param baseline_rate: Sample rate (or sampler) of the other traces, None to keep only the interesting traces.
+                          Default is 0.01.
+    :type baseline_rate: float | TraceIdRatioSampler
+
+    :param max_traces: Max buffered traces. Default is 10000.
+    :type max_traces: int
+
+    :param max_spans_per_trace: Max buffered spans per trace, the next ones are dropped. Default is 1000.
+    :type max_spans_per_trace: int
+
+    :param decision_wait: Seconds after the last finished span of a trace without entry span, before deciding it.
+                          Default is 30.0.
+    :type decision_wait: float
+
+    :param expire_interval: Seconds between checks of the traces waiting for ``decision_wait``. Default is 1.0.
+    :type expire_interval: float
+    """
+
+    def __init__(self, recorder, latency_threshold=None, baseline_rate=0.01, max_traces=DEFAULT_MAX_TRACES,
+                 max_spans_per_trace=DEFAULT_MAX_SPANS_PER_TRACE, decision_wait=DEFAULT_DECISION_WAIT,
+                 expire_interval=DEFAULT_EXPIRE_INTERVAL):
+        self.recorder = recorder
+        self.latency_threshold = latency_threshold
+        self.baseline_sampler = get_sampler(baseline_rate)
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.decision_wait = decision_wait
+        self.expire_interval = expire_interval
+
+        # trace id -> [last update time, interesting, spans], least recently updated first.
+        self._traces = collections.OrderedDict()
+        # trace id -> kept, of the recently decided traces.
+        self._decisions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters.
+        self.kept_traces = 0
+        self.dropped_traces = 0
+        self.evicted_traces = 0
+        self.upgraded_traces = 0
+        self.dropped_spans = 0
+
+        # Decides the traces waiting for ``decision_wait`` in idle processes too. Started with the first span.
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def buffered_traces(self):
+        return len(self._traces)
+
+    def stats(self):
+        return {
+            'buffered_traces': self.buffered_traces,
+            'kept_traces': self.kept_traces,
+            'dropped_traces': self.dropped_traces,
+            'evicted_traces': self.evicted_traces,
+            'upgraded_traces': self.upgraded_traces,
+            'dropped_spans': self.dropped_spans,
+        }
+
+    def record_span(self, span):
+        if isinstance(span, SpanRecord):
+            trace_id = span.trace_id
+        else:
+            trace_id = span.context.trace_id
+
+        now = _now()
+        decided = []
+
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._start()
+
+            kept = self._decisions.get(trace_id)
+            if kept is not None:
+                if not kept and self.is_interesting(span):
+                    self._decisions[trace_id] = kept = True
+                    self.upgraded_traces += 1
+                    self.kept_traces += 1
+                    self.dropped_traces -= 1
+
+                if kept:
+                    decided.append([span])
+            else:
+                entry = self._traces.pop(trace_id, None)
+                if entry is None:
+                    entry = [now, False, []]
+                else:
+                    entry[0] = now
+
+                if not entry[1]:
+                    entry[1] = self.is_interesting(span)
+
+                if len(entry[2]) < self.max_spans_per_trace:
+                    entry[2].append(span)
+                else:
+                    self.dropped_spans += 1
+
+                if self.is_entry(span):
+                    decided.append(self._decide(trace_id, entry))
+                else:
+                    # Re-inserted as most recently updated.
+                    self._traces[trace_id] = entry
+
+                    if len(self._traces) > self.max_traces:
+                        self.evicted_traces += 1
+                        decided.append(self._decide(*self._traces.popitem(last=False)))
+
+                self._expire(now, decided)
+
+        self._record(decided)
+
+    def is_entry(self, span):
+        """Whether ``span`` is the local entry span of its trace (root span, or RPC server / consumer span)."""
+        if span.parent_id is None:
+            return True
+
+        return bool(span.tags) and span.tags.get(ot_tags.SPAN_KIND) in ENTRY_SPAN_KINDS
+
+    def is_interesting(self, span):
+        """Whether ``span`` makes its trace kept (error tag, or latency)."""
+        if span.tags and span.tags.get(ot_tags.ERROR):
+            return True
+
+        return self.latency_threshold is not None and span.duration >= self.latency_threshold
+
+    def flush(self):
+        """Decide all the buffered traces now."""
+        decided = []
+        with self._lock:
+            while self._traces:
+                decided.append(self._decide(*self._traces.popitem(last=False)))
+
+        self._record(decided)
+
+    def expire(self):
+        """Decide the traces without finished span for ``decision_wait`` seconds."""
+        decided = []
+        with self._lock:
+            self._expire(_now(), decided)
+
+        self._record(decided)
+
+    def close(self, *args, **kwargs):
+        """Flush the buffered traces, and close ``recorder`` (passing it the arguments, e.g. ``timeout``)."""
+        self._stopped.set()
+        self.flush()
+
+        close = getattr(self.recorder, 'close', None)
+        if callable(close):
+            close(*args, **kwargs)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='opentracing-utils-tail-sampling')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.expire_interval):
+            try:
+                self.expire()
+            except Exception:  # pragma: no cover
+                logger.exception('Failed to expire traces')
+
+    def _decide(self, trace_id, entry):
+        _, interesting, spans = entry
+
+        kept = interesting or (self.baseline_sampler is not None and self.baseline_sampler.is_sampled(trace_id))
+        if kept:
+            self.kept_traces += 1
+        else:
+            self.dropped_traces += 1
+
+        self._decisions[trace_id] = kept
+        if len(self._decisions) > self.max_traces:
+            self._decisions.popitem(last=False)
+
+        return spans if kept else None
+
+    def _expire(self, now, decided):
+        traces = self._traces
+        deadline = now - self.decision_wait
+
+        while traces:
+            trace_id = next(iter(traces))
+            if traces[trace_id][0] > deadline:
+                break
+
+            decided.append(self._decide(trace_id, traces.pop(trace_id)))
+
+    def _record(self, decided):
+        # Outside the lock, ``recorder`` may be slow.
+        for spans in decided:
+            if spans:
+                for span in spans:
+                    self.recorder.record_span(span)
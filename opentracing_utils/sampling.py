@@ -0,0 +1,327 @@
+"""
+Head sampling utilities.
+
+Sampling decisions are made deterministically from the trace id, so all services (and all traced calls) using the same
+sample rate agree on which traces are sampled. Unsampled calls get a ``NonRecordingSpan`` keeping the span context of
+the trace, with its sampling flag off (so the decision is propagated downstream). The shared ``UNSAMPLED_SPAN``
+no-op span, without span context, is only used when tracing is off.
+"""
+import math
+import numbers
+import time
+import zlib
+
+import opentracing
+
+
+# Same boundary as Jaeger probabilistic sampler, so decisions agree with Jaeger tracers using the same rate.
+MAX_TRACE_ID_BITS = 0x7FFFFFFFFFFFFFFF
+
+# Max distinct operations tracked by RateLimitingSampler, the rest share a single bucket.
+MAX_SAMPLED_OPERATIONS = 2000
+
+try:
+    _now = time.monotonic
+except AttributeError:  # pragma: no cover
+    _now = time.time
+
+# Default ``OverloadSampler`` settings.
+DEFAULT_HIGH_WATERMARK = 0.8
+DEFAULT_LOW_WATERMARK = 0.5
+DEFAULT_MIN_RATE = 1.0 / 64
+DEFAULT_ADJUST_INTERVAL = 1.0
+
+# Jaeger span context ``flags`` sampled bit.
+SAMPLED_FLAG = 0x01
+
+
+class NonRecordingSpan(opentracing.Span):
+    """
+    No-op span of an unsampled trace: tags, logs and ``finish`` are no-ops, and nested traced calls get the same span
+    instead of starting child spans.
+
+    It keeps the span context of the trace (e.g. extracted from an incoming request not sampled upstream), which is
+    still injected in outgoing requests, so downstream services get the sampling decision.
+    """
+
+
+# Shared no-op span, without span context (e.g. tracing is off). It is never activated via the scope manager, since
+# tracers cannot start children of its context.
+UNSAMPLED_SPAN = NonRecordingSpan(tracer=opentracing.Tracer(), context=opentracing.SpanContext())
+
+
+class TraceIdRatioSampler(object):
+    """Sample ``rate`` (0.0 to 1.0) of the traces, deterministically from the trace id."""
+
+    def __init__(self, rate):
+        rate = float(rate)
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError('Sample rate should be between 0.0 and 1.0, got {}'.format(rate))
+
+        self.rate = rate
+        self._boundary = int(rate * (MAX_TRACE_ID_BITS + 1))
+
+    def is_sampled(self, trace_id):
+        if trace_id is None:
+            # Unknown trace id (e.g. noop tracer), no reason to drop it.
+            return True
+
+        return (trace_id_to_int(trace_id) & MAX_TRACE_ID_BITS) < self._boundary
+
+
+class RateLimitingSampler(object):
+    """
+    Sample up to ``traces_per_second`` root spans per operation name, plus ``rate`` of the remaining traces.
+
+    Each operation gets its own token bucket, so hot operations (health checks, high QPS reads) are capped while rare
+    operations stay fully visible. Buckets are updated without locking: under contention a bucket may admit a few
+    extra traces, but threads never wait on each other.
+
+    Supports the ``basictracer`` Sampler interface (``sampled(trace_id)``, using a single bucket), and per operation
+    sampling via ``sampled_operation(trace_id, operation_name)``, which ``init_opentracing_tracer(OPENTRACING_BASIC)``
+    uses.
+    """
+
+    def __init__(self, traces_per_second=1.0, rate=0.0, max_operations=MAX_SAMPLED_OPERATIONS):
+        if traces_per_second < 0:
+            raise ValueError('Traces per second should be positive, got {}'.format(traces_per_second))
+
+        self.traces_per_second = float(traces_per_second)
+        self.max_operations = max_operations
+        # Allow bursts of up to 1 second worth of traces (and at least 1 trace).
+        self.max_tokens = max(self.traces_per_second, 1.0)
+
+        self._ratio_sampler = TraceIdRatioSampler(rate)
+        self._buckets = {}
+
+    def sampled(self, trace_id):
+        return self.sampled_operation(trace_id, None)
+
+    def sampled_operation(self, trace_id, operation_name):
+        bucket = self._buckets.get(operation_name)
+        if bucket is None:
+            if len(self._buckets) >= self.max_operations:
+                # Avoid unbounded growth with high cardinality operation names.
+                operation_name = None
+            # setdefault is atomic, concurrent threads end up sharing the same bucket.
+            bucket = self._buckets.setdefault(operation_name, [self.max_tokens, _now()])
+
+        now = _now()
+        tokens = min(self.max_tokens, bucket[0] + (now - bucket[1]) * self.traces_per_second)
+        bucket[1] = now
+
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True
+
+        bucket[0] = tokens
+        return self._ratio_sampler.is_sampled(trace_id)
+
+
+class OverloadSampler(object):
+    """
+    Shed traces when the span recorder is under pressure, degrading the sample rate with hysteresis.
+
+    ``source`` pressure (0.0 to 1.0, e.g. ``AsyncBatchRecorder.pressure``, the queue fill ratio) is checked at most
+    every ``adjust_interval`` seconds, when sampling. While it is at least ``high_watermark``, the degradation
+    ``level`` rises by one step, halving the sample rate down to ``min_rate``. Once it is back to ``low_watermark``
+    or less, the level goes down by one step per interval, until traces are all sampled again.
+
+    Decisions are made from the trace id, so a lower rate keeps a subset of the traces sampled at a higher rate.
+
+    Installed via ``init_opentracing_tracer(..., overload_sampler=...)``, it applies to the traces entering the
+    process in ``@trace``, ``trace_flask``, ``trace_requests``, ``trace_sqlalchemy`` and the Django middleware (new
+    root spans, and extracted span contexts), on top of their own ``sampler``. It can also be used as any sampler.
+
+    :param source: Object having a ``pressure`` attribute (e.g. ``AsyncBatchRecorder``), or callable returning it.
+    :type source: AsyncBatchRecorder | Callable
+
+    :param high_watermark: Pressure raising the degradation level. Default is 0.8.
+    :type high_watermark: float
+
+    :param low_watermark: Pressure lowering the degradation level. Default is 0.5.
+    :type low_watermark: float
+
+    :param min_rate: Sample rate of the max degradation level. Default is 1/64.
+    :type min_rate: float
+
+    :param adjust_interval: Min seconds between degradation level changes. Default is 1.0.
+    :type adjust_interval: float
+    """
+
+    def __init__(self, source, high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=DEFAULT_LOW_WATERMARK,
+                 min_rate=DEFAULT_MIN_RATE, adjust_interval=DEFAULT_ADJUST_INTERVAL):
+        if not 0.0 <= low_watermark < high_watermark:
+            raise ValueError('low_watermark should be positive and lower than high_watermark')
+
+        self.source = source
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.adjust_interval = adjust_interval
+
+        max_level = max(int(math.ceil(math.log(1.0 / min_rate, 2))), 1) if min_rate > 0 else 64
+        self._samplers = [None] + [TraceIdRatioSampler(max(0.5 ** level, min_rate))
+                                   for level in range(1, max_level + 1)]
+
+        self.level = 0
+        self.degradations = 0
+        self._checked = _now()
+
+    @property
+    def max_level(self):
+        return len(self._samplers) - 1
+
+    @property
+    def rate(self):
+        """Current sample rate."""
+        return self._samplers[self.level].rate if self.level else 1.0
+
+    @property
+    def pressure(self):
+        return self.source.pressure if hasattr(self.source, 'pressure') else self.source()
+
+    def is_sampled(self, trace_id):
+        now = _now()
+        if now - self._checked >= self.adjust_interval:
+            # Not locked: concurrent threads may rarely adjust twice in an interval.
+            self._checked = now
+            self.adjust()
+
+        level = self.level
+        return not level or self._samplers[level].is_sampled(trace_id)
+
+    def sampled(self, trace_id):
+        """``basictracer`` Sampler interface."""
+        return self.is_sampled(trace_id)
+
+    def adjust(self):
+        """Update the degradation level from the current pressure."""
+        pressure = self.pressure
+
+        if pressure >= self.high_watermark and self.level < self.max_level:
+            self.level += 1
+            self.degradations += 1
+        elif pressure <= self.low_watermark and self.level > 0:
+            self.level -= 1
+
+        return self.level
+
+    def stats(self):
+        return {'level': self.level, 'rate': self.rate, 'degradations': self.degradations}
+
+    def prometheus_text(self, prefix='tracing'):
+        """Return the degradation level and sample rate gauges in Prometheus text format."""
+        return (
+            '# HELP {0}_degradation_level Tracing degradation level under recorder pressure.\n'
+            '# TYPE {0}_degradation_level gauge\n'
+            '{0}_degradation_level {1}\n'
+            '# HELP {0}_overload_sample_rate Sample rate applied under recorder pressure.\n'
+            '# TYPE {0}_overload_sample_rate gauge\n'
+            '{0}_overload_sample_rate {2!r}\n'
+        ).format(prefix, self.level, self.rate)
+
+
+# Installed ``OverloadSampler``, see ``install_overload_sampler``.
+_overload_sampler = None
+
+
+def install_overload_sampler(sampler):
+    """Install ``sampler`` (e.g. ``OverloadSampler``) for the traces entering the process, None to uninstall."""
+    global _overload_sampler
+    _overload_sampler = sampler
+
+
+def get_overload_sampler():
+    return _overload_sampler
+
+
+def trace_id_to_int(trace_id):
+    """Return an integer for the ``trace_id`` of any tracer (ints, hex strings ...)."""
+    if isinstance(trace_id, numbers.Integral):
+        return trace_id
+
+    try:
+        return int(trace_id, 16)
+    except (TypeError, ValueError):
+        return zlib.crc32(str(trace_id).encode('utf-8'))
+
+
+def get_sampler(sampler):
+    """Return a sampler from a sample rate or sampler object (having ``is_sampled(trace_id)``), or None."""
+    if sampler is None or hasattr(sampler, 'is_sampled'):
+        return sampler
+
+    if isinstance(sampler, numbers.Real) and not isinstance(sampler, bool):
+        return TraceIdRatioSampler(sampler)
+
+    raise TypeError('Invalid sampler {!r}, expected a sample rate or a sampler'.format(sampler))
+
+
+def get_trace_id(span_context):
+    return getattr(span_context, 'trace_id', None)
+
+
+def is_unsampled(span):
+    """Whether ``span`` is a no-op span of an unsampled trace (``UNSAMPLED_SPAN`` or any ``NonRecordingSpan``)."""
+    return isinstance(span, NonRecordingSpan)
+
+
+def is_context_unsampled(span_context):
+    """
+    Whether ``span_context`` carries a "not sampled" decision, made by the tracer or upstream (``basictracer``
+    ``sampled`` attribute, or Jaeger ``flags``). Contexts without sampling flag are considered sampled.
+    """
+    sampled = getattr(span_context, 'sampled', None)
+    if type(sampled) is bool:
+        return not sampled
+
+    flags = getattr(span_context, 'flags', None)
+    return type(flags) is int and not flags & SAMPLED_FLAG
+
+
+def unsampled_span(tracer, span_context):
+    """
+    Return a ``NonRecordingSpan`` of ``span_context`` dropped by a sampler, turning its sampling flag off
+    (``basictracer`` ``sampled`` attribute, or Jaeger ``flags``) so the decision is propagated downstream.
+    """
+    try:
+        if type(getattr(span_context, 'sampled', None)) is bool:
+            span_context.sampled = False
+        elif type(getattr(span_context, 'flags', None)) is int:
+            span_context.flags &= ~SAMPLED_FLAG
+    except AttributeError:  # pragma: no cover
+        # Read only span context.
+        pass
+
+    return NonRecordingSpan(tracer, span_context)
+
+
+def is_context_sampled(sampler, span_context):
+    """Whether the trace of ``span_context`` is sampled by ``sampler``."""
+    return sampler is None or sampler.is_sampled(get_trace_id(span_context))
+
+
+def is_entry_sampled(sampler, span_context):
+    """
+    Whether a trace entering the process (new root span, or extracted span context) is sampled by ``sampler``, and
+    not shed by the installed overload sampler.
+    """
+    if _overload_sampler is not None and not _overload_sampler.is_sampled(get_trace_id(span_context)):
+        return False
+
+    return sampler is None or sampler.is_sampled(get_trace_id(span_context))
+
+
+def sample_entry_span(sampler, tracer, span):
+    """
+    Return ``span`` started for a trace entering the process (e.g. a request span), or the ``NonRecordingSpan`` of
+    its context, dropped without being finished, if the trace is not sampled by ``sampler`` (see
+    ``is_entry_sampled``) or by the tracer. The context is still propagated downstream.
+    """
+    if not is_entry_sampled(sampler, span.context):
+        return unsampled_span(tracer, span.context)
+
+    if is_context_unsampled(span.context):
+        return NonRecordingSpan(tracer, span.context)
+
+    return span
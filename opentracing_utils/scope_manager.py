@@ -0,0 +1,28 @@
+"""
+``contextvars`` based ScopeManager (Python 3.7+).
+
+The active scope is stored in a ``ContextVar``, so it is local to the current thread, asyncio task or greenlet (gevent
+>= 20.9), and reading the active span is a single context lookup.
+
+``ContextVarsScopeManager`` is the ``opentracing`` one (``opentracing.scope_managers.contextvars``), re-exported here.
+"""
+try:
+    from opentracing.scope_managers.contextvars import ContextVarsScopeManager
+except ImportError:  # pragma: no cover
+    # Python < 3.7, no contextvars.
+    from opentracing import ScopeManager
+
+    class ContextVarsScopeManager(ScopeManager):
+        """ScopeManager storing the active scope in a ``contextvars.ContextVar`` (requires python 3.7+)."""
+
+        def __init__(self):
+            raise RuntimeError('ContextVarsScopeManager requires python 3.7+ (contextvars)')
+
+
+# Scope managers tracking the active span per context (thread, task, greenlet), including subclasses.
+CONTEXT_SCOPE_MANAGERS = (ContextVarsScopeManager,)
+
+
+def is_context_scope_manager(scope_manager):
+    """Whether ``scope_manager`` tracks the active span per context (thread, task, greenlet)."""
+    return isinstance(scope_manager, CONTEXT_SCOPE_MANAGERS)
@@ -6,20 +6,58 @@ import opentracing
 from opentracing import child_of, follows_from
 from opentracing.ext import tags as opentracing_tags
 
+from opentracing_utils.sampling import (
+    NonRecordingSpan, is_context_sampled, is_context_unsampled, is_entry_sampled, is_unsampled, unsampled_span)
+from opentracing_utils.scope_manager import is_context_scope_manager
+from opentracing_utils.tracers import get_tracer
+
 
 DEFAULT_SPAN_ARG_NAME = '__OPENTRACINGUTILS_SPAN'  # hmmm!
 
+# ``inspect_stack`` value restricting call stack frames inspection to the frames of ``@trace`` wrappers.
+INSPECT_FRAME_MARKERS = 'frame_markers'
+
+# Frame markers: the spans of the live ``@trace`` wrapper frames, keyed by frame id. Frame ids are unique among live
+# frames (whatever the thread), and wrappers remove their marker before their frame is released.
+FRAME_SPANS = {}
+
 
 logger = logging.getLogger(__name__)
 
 
 def get_new_span(
-        f, func_args, func_kwargs, operation_name=None, inspect_stack=True, ignore_parent_span=False,
-        span_extractor=None, use_follows_from=False):
+        f, func_args, func_kwargs, operation_name=None, inspect_stack=None, ignore_parent_span=False,
+        span_extractor=None, use_follows_from=False, kwargs_span=None, sampler=None, tags=None, tracer=None,
+        context_span=None):
+    """
+    Start a new span for ``f``, detecting its parent span if any.
+
+    ``tags`` are the span initial tags (e.g. from ``freeze_tags``), passed to ``start_span`` as a copy.
+
+    The new span is a ``NonRecordingSpan`` (see ``unsampled_span``) if the trace is not sampled by ``sampler``, or by
+    the tracer (see ``is_context_unsampled``). Nested calls of an unsampled trace get the parent ``NonRecordingSpan``
+    itself.
+
+    If the tracer scope manager is context aware (e.g. ``ContextVarsScopeManager``), call stack frames are only
+    inspected if ``inspect_stack`` is explicitly ``True``, and the new span should always be activated via the scope
+    manager (``using_scope_manager`` is ``True``). Otherwise ``inspect_stack=None`` means inspecting the stack.
+
+    ``kwargs_span`` is an optional ``(name, span)`` result of a previous span lookup in ``func_kwargs``. Callers that
+    already scanned the kwargs (e.g. ``@trace``) pass it to avoid scanning them again.
+
+    ``tracer`` is the tracer bound by the caller, default is ``opentracing.tracer``.
+
+    ``context_span`` is the span of the running task if not activated via the scope manager (traced coroutines with a
+    thread local scope manager), used as parent before the scope manager active span.
+    """
     parent_span = None
-    using_scope_manager = False
     span_arg_name = None
 
+    tracer = get_tracer(tracer)
+    using_scope_manager = is_context_scope_manager(getattr(tracer, 'scope_manager', None))
+    if inspect_stack is None:
+        inspect_stack = not using_scope_manager
+
     if not ignore_parent_span:
         if callable(span_extractor):
             try:
@@ -28,35 +66,72 @@ def get_new_span(
                 logger.exception('Failed to extract span from: {}'.format(span_extractor.__name__))
 
         if not parent_span:
-            span_arg_name, parent_span = get_span_from_kwargs(**func_kwargs)
+            span_arg_name, parent_span = (
+                kwargs_span if kwargs_span is not None else find_span_in_kwargs(func_kwargs))
+
+        if not parent_span and context_span is not None:
+            parent_span = context_span
 
         if not parent_span:
             try:
                 # We try inspecting ``active_span`` managed by ``tracer.scope_manager``.
-                parent_span = opentracing.tracer.active_span
-                using_scope_manager = True if parent_span else False
+                parent_span = tracer.active_span
+                using_scope_manager = using_scope_manager or (True if parent_span else False)
             except AttributeError:
                 # Old opentracing lib!
                 pass
 
         # Finally, try to inspect call stack frames.
-        if not parent_span:
+        if not parent_span and inspect_stack:
             span_arg_name, parent_span = get_parent_span(
                 inspect_stack=inspect_stack, inspect_kwargs=False, **func_kwargs)
 
+    span_arg_name = span_arg_name or DEFAULT_SPAN_ARG_NAME
+
+    sampled = True
+    if parent_span:
+        if is_unsampled(parent_span):
+            return span_arg_name, using_scope_manager, parent_span
+
+        if is_context_unsampled(parent_span.context):
+            return span_arg_name, using_scope_manager, NonRecordingSpan(tracer, parent_span.context)
+
+        sampled = is_context_sampled(sampler, parent_span.context)
+
     op_name = f.__name__ if not operation_name else operation_name
 
     references = None
     if parent_span:
         references = [follows_from(parent_span.context)] if use_follows_from else [child_of(parent_span.context)]
 
-    span_arg_name = span_arg_name or DEFAULT_SPAN_ARG_NAME
+    span = tracer.start_span(operation_name=op_name, references=references, tags=dict(tags) if tags else None)
+
+    if not parent_span:
+        # Root span, the trace id is only known now.
+        sampled = is_entry_sampled(sampler, span.context)
+
+    # Unsampled spans are dropped without being finished, their context is still activated and propagated.
+    if not sampled:
+        return span_arg_name, using_scope_manager, unsampled_span(tracer, span.context)
+
+    if is_context_unsampled(span.context):
+        return span_arg_name, using_scope_manager, NonRecordingSpan(tracer, span.context)
+
+    return span_arg_name, using_scope_manager, span
+
+
+def freeze_tags(tags, component=None):
+    """
+    Return the static span tags (``tags`` and ``component``) resolved once, to be passed to ``start_span``.
 
-    return (
-        span_arg_name,
-        using_scope_manager,
-        opentracing.tracer.start_span(operation_name=op_name, references=references)
-    )
+    ``tags`` is ignored if not a dict, and copied so later changes do not affect spans. Return None if no tags.
+    """
+    frozen = dict(tags) if type(tags) is dict else {}
+
+    if component:
+        frozen[opentracing_tags.COMPONENT] = component
+
+    return frozen or None
 
 
 def adjust_span(span, operation_name, component, tags):
@@ -77,6 +152,11 @@ def adjust_span(span, operation_name, component, tags):
 
 
 def get_span_from_kwargs(**kwargs):
+    return find_span_in_kwargs(kwargs)
+
+
+def find_span_in_kwargs(kwargs):
+    """Same as ``get_span_from_kwargs`` but takes the kwargs dict as is, without copying it."""
     for k, v in kwargs.items():
         if isinstance(v, opentracing.Span):
             return k, v
@@ -84,7 +164,13 @@ def get_span_from_kwargs(**kwargs):
     return None, None
 
 
-def inspect_span_from_stack(depth=100):
+def inspect_span_from_stack(depth=100, frame_markers_only=False):
+    """
+    Return the nearest span found in the call stack frames.
+
+    Frames marked by ``@trace`` wrappers are resolved from ``FRAME_SPANS``. Other frames locals are inspected, unless
+    ``frame_markers_only`` is True; only comparing frame ids is much cheaper than materializing frames locals.
+    """
     cframe = inspect.currentframe()
     frame = cframe.f_back
 
@@ -93,9 +179,12 @@ def inspect_span_from_stack(depth=100):
         if span or not frame:
             break
 
-        for k, v in frame.f_locals.items():
-            if isinstance(v, opentracing.Span):
-                span = v
+        span = FRAME_SPANS.get(id(frame))
+
+        if span is None and not frame_markers_only:
+            for k, v in frame.f_locals.items():
+                if isinstance(v, opentracing.Span):
+                    span = v
 
         frame = frame.f_back
 
@@ -107,23 +196,26 @@ def inspect_span_from_stack(depth=100):
     return span
 
 
-def get_parent_span(inspect_stack=True, inspect_kwargs=True, **kwargs):
+def get_parent_span(inspect_stack=None, inspect_kwargs=True, **kwargs):
     span_arg_name = DEFAULT_SPAN_ARG_NAME
     parent_span = None
 
+    if inspect_stack is None:
+        inspect_stack = not is_context_scope_manager(getattr(opentracing.tracer, 'scope_manager', None))
+
     if inspect_kwargs:
-        span_arg_name, parent_span = get_span_from_kwargs(**kwargs)
+        span_arg_name, parent_span = find_span_in_kwargs(kwargs)
 
     if not parent_span and inspect_stack:
         span_arg_name = DEFAULT_SPAN_ARG_NAME
-        parent_span = inspect_span_from_stack()
+        parent_span = inspect_span_from_stack(frame_markers_only=inspect_stack == INSPECT_FRAME_MARKERS)
 
     return span_arg_name, parent_span
 
 
 def extract_span_from_kwargs(**kwargs):
     """Return current span from kwargs"""
-    _, span = get_span_from_kwargs(**kwargs)
+    _, span = find_span_in_kwargs(kwargs)
 
     if not span:
         span = opentracing.tracer.start_span()
@@ -133,6 +225,7 @@ def extract_span_from_kwargs(**kwargs):
 
 
 def remove_span_from_kwargs(**kwargs):
-    span_key, _ = get_span_from_kwargs(**kwargs)
+    """Return kwargs without the span (the ``**kwargs`` dict itself, not copied again)."""
+    span_key, _ = find_span_in_kwargs(kwargs)
     kwargs.pop(span_key, None)
     return kwargs
@@ -0,0 +1,205 @@
+"""
+Compact storage of finished spans, for retaining many spans in process (e.g. for analysis).
+
+``SpanStore`` keeps ids and timestamps in columnar arrays, and operation names, tag keys, short tag values and whole
+tag sets interned, so spans sharing the same static tags share the same objects. ``SpanRecord`` is the ``__slots__``
+representation of a single stored span.
+"""
+import threading
+
+from array import array
+
+
+# Max interned tag keys and values, and separately max interned tag sets, beyond which new ones are stored as is.
+MAX_INTERNED = 65536
+# Only tag values up to this length are interned (long values, e.g. SQL statements or URLs, are rarely shared).
+MAX_INTERNED_VALUE_LENGTH = 64
+
+NO_PARENT_ID = 0
+
+EMPTY = ()
+
+
+class SpanRecord(object):
+    """
+    Finished span, with the ``BasicSpan`` attributes read by recorders (``operation_name``, ``tags``, ``logs`` ...).
+
+    ``tags`` is a dict and ``logs`` a list of ``(timestamp, key_values)``, both built on access from their compact
+    representation.
+    """
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'operation_name', 'start_time', 'duration', '_tags', '_logs')
+
+    def __init__(self, trace_id, span_id, parent_id, operation_name, start_time, duration, tags=EMPTY, logs=EMPTY):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.operation_name = operation_name
+        self.start_time = start_time
+        self.duration = duration
+        # Flat (key, value, key, value ...) tuple.
+        self._tags = tags
+        # (timestamp, flat key values tuple) tuples.
+        self._logs = logs
+
+    @classmethod
+    def from_span(cls, span):
+        """Return the record of a finished ``basictracer`` span."""
+        return cls(
+            span.context.trace_id, span.context.span_id, span.parent_id, span.operation_name, span.start_time,
+            span.duration, flatten(span.tags),
+            tuple((log.timestamp, flatten(log.key_values)) for log in span.logs) if span.logs else EMPTY)
+
+    @property
+    def tags(self):
+        return unflatten(self._tags)
+
+    @property
+    def logs(self):
+        return [(timestamp, unflatten(key_values)) for timestamp, key_values in self._logs]
+
+    def __repr__(self):
+        return '<SpanRecord {} trace_id={} span_id={}>'.format(self.operation_name, self.trace_id, self.span_id)
+
+
+def flatten(mapping, intern=None):
+    if not mapping:
+        return EMPTY
+
+    if intern is None:
+        return tuple(item for pair in mapping.items() for item in pair)
+
+    return tuple(intern(item, index) for pair in mapping.items() for index, item in enumerate(pair))
+
+
+def unflatten(items):
+    return dict(zip(items[::2], items[1::2]))
+
+
+class SpanStore(object):
+    """
+    Columnar store of finished spans, usable as a ``basictracer`` recorder (``record_span``) or as the sink of
+    ``AsyncBatchRecorder`` (``extend``).
+
+    Span and trace ids should be integers of up to 64 bits (e.g. ``basictracer`` ids). Indexing and iterating return
+    ``SpanRecord`` objects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.trace_ids = array('Q')
+        self.span_ids = array('Q')
+        self.parent_ids = array('Q')
+        self.start_times = array('d')
+        self.durations = array('d')
+        self.operations = array('I')
+
+        self._tags = []
+        self._logs = []
+
+        self._operation_names = []
+        self._operation_indexes = {}
+        self._interned_items = {}
+        self._interned_tags = {}
+
+    def __len__(self):
+        return len(self.trace_ids)
+
+    def __getitem__(self, index):
+        parent_id = self.parent_ids[index]
+
+        return SpanRecord(
+            self.trace_ids[index], self.span_ids[index], parent_id if parent_id != NO_PARENT_ID else None,
+            self._operation_names[self.operations[index]], self.start_times[index], self.durations[index],
+            self._tags[index], self._logs[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def operation_names(self):
+        return list(self._operation_names)
+
+    def record_span(self, span):
+        with self._lock:
+            self._append(span)
+
+    def extend(self, spans):
+        with self._lock:
+            for span in spans:
+                self._append(span)
+
+    def trace(self, trace_id):
+        """Return the records of ``trace_id``."""
+        return [self[index] for index, span_trace_id in enumerate(self.trace_ids) if span_trace_id == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _append(self, span):
+        if isinstance(span, SpanRecord):
+            trace_id, span_id, parent_id = span.trace_id, span.span_id, span.parent_id
+            tags = self._intern_tags(unflatten(span._tags))
+            logs = span._logs
+        else:
+            context = span.context
+            trace_id, span_id, parent_id = context.trace_id, context.span_id, span.parent_id
+            tags = self._intern_tags(span.tags)
+            logs = tuple((log.timestamp, flatten(log.key_values, self._intern)) for log in span.logs) if span.logs \
+                else EMPTY
+
+        self.trace_ids.append(trace_id)
+        self.span_ids.append(span_id)
+        self.parent_ids.append(parent_id if parent_id is not None else NO_PARENT_ID)
+        self.start_times.append(span.start_time)
+        self.durations.append(span.duration)
+        self.operations.append(self._operation_index(span.operation_name))
+        self._tags.append(tags)
+        self._logs.append(logs)
+
+    def _operation_index(self, operation_name):
+        index = self._operation_indexes.get(operation_name)
+        if index is None:
+            index = self._operation_indexes[operation_name] = len(self._operation_names)
+            self._operation_names.append(operation_name)
+
+        return index
+
+    def _intern(self, item, index=0):
+        # Keys (even index) are interned, values only if short strings.
+        if index % 2 and not (isinstance(item, str) and len(item) <= MAX_INTERNED_VALUE_LENGTH):
+            return item
+
+        interned = self._interned_items.get(item)
+        if interned is None:
+            if len(self._interned_items) >= MAX_INTERNED:
+                return item
+            interned = self._interned_items[item] = item
+
+        return interned
+
+    def _intern_tags(self, tags):
+        tags = flatten(tags, self._intern)
+        if not tags:
+            return tags
+
+        try:
+            # Spans with the same tags (e.g. static tags only) share the same tuple. Keyed with the values types too,
+            # since ``('error', 1) == ('error', True)``.
+            key = (tags, tuple(type(value) for value in tags[1::2]))
+            interned = self._interned_tags.get(key)
+        except TypeError:
+            # Unhashable tag value.
+            return tags
+
+        if interned is None:
+            if len(self._interned_tags) >= MAX_INTERNED:
+                return tags
+            interned = self._interned_tags[key] = tags
+
+        return interned
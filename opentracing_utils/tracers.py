@@ -1,8 +1,14 @@
 import os
+import sys
 import logging
+import weakref
 
 import opentracing
 
+from opentracing_utils.common import get_wsgi_headers, select_wsgi_headers
+from opentracing_utils.sampling import (
+    SAMPLED_FLAG, NonRecordingSpan, install_overload_sampler, is_context_unsampled, is_entry_sampled, unsampled_span)
+
 OPENTRACING_INSTANA = 'instana'
 OPENTRACING_LIGHTSTEP = 'lightstep'
 OPENTRACING_JAEGER = 'jaeger'
@@ -11,16 +17,270 @@ OPENTRACING_BASIC = 'basic'
 
 logger = logging.getLogger(__name__)
 
+# Propagation headers read by tracers without injecting them (W3C trace context, B3 single header), always kept.
+STANDARD_PROPAGATION_HEADERS = ('traceparent', 'tracestate', 'b3')
+
+# Baggage item injected to learn the baggage headers prefix of a tracer.
+PROBE_BAGGAGE_KEY = 'opentracing-utils-probe'
+
+# Probe span context ids, never sampled by the tracer nor sent.
+PROBE_ID = 1
+
+# (tracer, is noop) of the last checked ``opentracing.tracer``, replaced as a whole so it is thread safe.
+_noop_tracer_check = (None, False)
+
+# Tracer -> learned (names, prefixes) propagation headers, or None if unknown.
+_propagation_keys = weakref.WeakKeyDictionary()
+# Tracer -> (names, prefixes) set with ``set_propagation_keys``, or None to pass all the headers.
+_explicit_propagation_keys = weakref.WeakKeyDictionary()
+# Extra (names, prefixes) of every tracer, see ``register_propagation_headers``.
+_extra_propagation_keys = (frozenset(), ())
+
+
+def get_tracer(tracer=None):
+    """Return ``tracer`` if bound explicitly, else the global ``opentracing.tracer``."""
+    return opentracing.tracer if tracer is None else tracer
+
+
+def is_noop_tracer(tracer=None):
+    """
+    Whether ``tracer`` (default is ``opentracing.tracer``) is the no-op ``opentracing.Tracer`` (i.e. tracing is off).
+
+    For ``opentracing.tracer``, the result is cached until it is swapped.
+    """
+    global _noop_tracer_check
+
+    if tracer is not None:
+        # Subclasses are actual tracers.
+        return type(tracer) is opentracing.Tracer
+
+    tracer, noop = _noop_tracer_check
+    if opentracing.tracer is not tracer:
+        tracer = opentracing.tracer
+        # Subclasses are actual tracers.
+        noop = type(tracer) is opentracing.Tracer
+        _noop_tracer_check = tracer, noop
+
+    return noop
+
+
+def get_propagation_keys(tracer=None):
+    """
+    Return the ``(names, prefixes)`` of the HTTP headers ``tracer`` (default is ``opentracing.tracer``) extracts span
+    contexts from, or None if unknown (e.g. the no-op tracer).
+
+    Keys are learned once per tracer, by injecting a hand built probe span context (with a baggage item) in
+    ``HTTP_HEADERS`` format, without starting any span: only for ``basictracer`` based tracers (e.g. LightStep) and
+    Jaeger. Headers sharing a prefix (e.g. ``ot-tracer-*``, ``x-b3-*``) and the baggage headers are kept as prefixes,
+    along with the header attributes of Jaeger codecs, the ``STANDARD_PROPAGATION_HEADERS`` and the headers registered
+    with ``register_propagation_headers``.
+
+    Tracers with an ``extract`` replaced on the instance (e.g. wrapped) may read any header: their keys are unknown,
+    unless set with ``set_propagation_keys``.
+    """
+    tracer = get_tracer(tracer)
+
+    if _explicit_propagation_keys:
+        try:
+            return _explicit_propagation_keys[tracer]
+        except (KeyError, TypeError):
+            pass
+
+    if 'extract' in getattr(tracer, '__dict__', ()):
+        return None
+
+    try:
+        return _propagation_keys[tracer]
+    except KeyError:
+        pass
+    except TypeError:
+        # Not weak referenceable, never prefiltered.
+        return None
+
+    keys = None
+    try:
+        keys = _learn_propagation_keys(tracer)
+    except opentracing.UnsupportedFormatException:
+        # No ``HTTP_HEADERS`` propagation (e.g. ``BasicTracer`` without registered propagators).
+        pass
+    except Exception:
+        logger.exception('Failed to learn the propagation headers of tracer {}'.format(tracer))
+
+    _propagation_keys[tracer] = keys
+
+    return keys
+
+
+def set_propagation_keys(tracer, keys):
+    """
+    Set the ``(names, prefixes)`` of the HTTP headers passed to ``tracer.extract()`` by the Flask and Django
+    integrations instead of the learned ones (see ``get_propagation_keys``). ``keys`` None passes all the request
+    headers (opt-out).
+    """
+    if keys is not None:
+        names, prefixes = keys
+        keys = frozenset(name.lower() for name in names), tuple(sorted(prefix.lower() for prefix in prefixes))
+
+    _explicit_propagation_keys[tracer] = keys
+
+
+def register_propagation_headers(names=(), prefixes=()):
+    """
+    Register extra HTTP headers passed to ``tracer.extract()`` by the Flask and Django integrations for every tracer,
+    e.g. headers read by a custom propagator without being injected. Learned keys are learned again with them.
+    """
+    global _extra_propagation_keys
+
+    extra_names, extra_prefixes = _extra_propagation_keys
+    _extra_propagation_keys = (
+        extra_names | frozenset(name.lower() for name in names),
+        tuple(sorted(set(extra_prefixes) | set(prefix.lower() for prefix in prefixes))))
+
+    _propagation_keys.clear()
+
+
+def _probe_span_context(tracer):
+    # Only tracers with known span contexts, whose modules are imported if ``tracer`` is one of them.
+    baggage = {PROBE_BAGGAGE_KEY: '1'}
+
+    basictracer = sys.modules.get('basictracer')
+    if basictracer is not None and isinstance(tracer, basictracer.BasicTracer):
+        from basictracer.context import SpanContext
+        return SpanContext(trace_id=PROBE_ID, span_id=PROBE_ID, sampled=True, baggage=baggage)
+
+    jaeger_client = sys.modules.get('jaeger_client')
+    if jaeger_client is not None and isinstance(tracer, jaeger_client.Tracer):
+        return jaeger_client.SpanContext(
+            trace_id=PROBE_ID, span_id=PROBE_ID, parent_id=None, flags=SAMPLED_FLAG, baggage=baggage)
+
+    return None
+
+
+def _learn_propagation_keys(tracer):
+    span_context = _probe_span_context(tracer)
+    if span_context is None:
+        return None
+
+    headers = {}
+    tracer.inject(span_context, opentracing.Format.HTTP_HEADERS, headers)
+
+    names = set()
+    prefixes = set()
+    for name in headers:
+        name = name.lower()
+        if name.endswith(PROBE_BAGGAGE_KEY):
+            prefixes.add(name[:-len(PROBE_BAGGAGE_KEY)])
+        else:
+            names.add(name)
+
+    if not names:
+        return None
+
+    # Families of headers (e.g. ``ot-tracer-traceid``, ``ot-tracer-spanid``) may have more members, only injected
+    # in some cases (e.g. ``x-b3-flags``).
+    families = {}
+    for name in names:
+        if '-' in name:
+            family = name[:name.rindex('-') + 1]
+            families[family] = families.get(family, 0) + 1
+
+    prefixes.update(family for family, count in families.items() if count > 1)
+
+    # Jaeger codecs also read debug and baggage headers.
+    codecs = getattr(tracer, 'codecs', None)
+    codec = codecs.get(opentracing.Format.HTTP_HEADERS) if isinstance(codecs, dict) else None
+    for attr, value in getattr(codec, '__dict__', {}).items():
+        if attr.endswith('_header') and isinstance(value, str):
+            names.add(value.lower())
+        elif attr.endswith('_prefix') and isinstance(value, str):
+            prefixes.add(value.lower())
+
+    extra_names, extra_prefixes = _extra_propagation_keys
+    names.update(STANDARD_PROPAGATION_HEADERS, extra_names)
+    prefixes.update(extra_prefixes)
+
+    prefixes = tuple(sorted(prefixes))
+    return frozenset(name for name in names if not name.startswith(prefixes)), prefixes
+
+
+def get_wsgi_carrier(environ, tracer=None):
+    """
+    Return the ``HTTP_HEADERS`` carrier of the request ``environ`` (WSGI environ, e.g. Django ``request.META``) to
+    extract a span context with ``tracer`` (default is ``opentracing.tracer``).
+
+    Only the headers the tracer extracts from are copied (see ``get_propagation_keys``): the other request headers
+    only cost a prefix check. If unknown, a dict of all the request headers is returned (propagators iterating the
+    carrier read every header, faster from a dict).
+    """
+    keys = get_propagation_keys(tracer)
+    if keys is None:
+        return get_wsgi_headers(environ)
+
+    return select_wsgi_headers(environ, *keys)
+
+
+def extract_wsgi_span_context(environ, tracer, sampler=None):
+    """
+    Extract the span context of the request ``environ`` (see ``get_wsgi_carrier``) with ``tracer``, and make the head
+    sampling decision of the extracted trace.
+
+    Return ``(span_context, unsampled, no_propagation)``: ``unsampled`` is the ``NonRecordingSpan`` to use instead of
+    a request span when the trace is not sampled upstream or by ``sampler`` (None otherwise), and ``no_propagation``
+    whether the request carries an invalid or corrupted span context.
+    """
+    try:
+        span_ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, get_wsgi_carrier(environ, tracer))
+    except (opentracing.InvalidCarrierException, opentracing.SpanContextCorruptedException):
+        return None, None, True
+
+    if span_ctx is not None:
+        if is_context_unsampled(span_ctx):
+            # Not sampled upstream: no request span nor tags, the context is still propagated downstream.
+            return span_ctx, NonRecordingSpan(tracer, span_ctx), False
+
+        if not is_entry_sampled(sampler, span_ctx):
+            return span_ctx, unsampled_span(tracer, span_ctx), False
+
+    return span_ctx, None, False
+
 
 def init_opentracing_tracer(tracer, **kwargs):
+    """
+    Initialize ``opentracing.tracer``.
+
+    ``scope_manager`` kwarg (e.g. ``ContextVarsScopeManager()``) is passed to the tracer constructor (basictracer,
+    LightStep, Jaeger ``Config`` and the no-op tracer). Instana tracer does not accept one: ``ValueError`` is raised.
+
+    ``overload_sampler`` kwarg (e.g. ``OverloadSampler(recorder)``) is installed to shed traces entering the process
+    under recorder pressure, whatever the backend is.
+
+    ``shutdown_timeout`` kwarg (seconds) installs a ``TracerLifecycle``: the tracer (and its recorder) is flushed and
+    closed on process exit and ``SIGTERM``, within ``shutdown_timeout``. See ``shutdown_tracer``.
+
+    For ``OPENTRACING_BASIC``, a ``sampler`` supporting ``sampled_operation()`` (e.g. ``RateLimitingSampler``) samples
+    root spans per operation name, and unsampled spans are not recorded.
+    """
+    scope_manager = kwargs.pop('scope_manager', None)
+    overload_sampler = kwargs.pop('overload_sampler', None)
+    shutdown_timeout = kwargs.pop('shutdown_timeout', None)
+
     if tracer == OPENTRACING_BASIC:
         from basictracer import BasicTracer  # noqa
 
         recorder = kwargs.get('recorder')
         sampler = kwargs.get('sampler')
 
-        opentracing.tracer = BasicTracer(recorder=recorder, sampler=sampler)
+        if hasattr(sampler, 'sampled_operation'):
+            from opentracing_utils._basictracer import OperationSamplingTracer
+
+            opentracing.tracer = OperationSamplingTracer(
+                recorder=recorder, sampler=sampler, scope_manager=scope_manager)
+        else:
+            opentracing.tracer = BasicTracer(recorder=recorder, sampler=sampler, scope_manager=scope_manager)
     elif tracer == OPENTRACING_INSTANA:
+        if scope_manager is not None:
+            raise ValueError('Instana tracer does not support a custom scope_manager')
+
         import instana  # noqa
     elif tracer == OPENTRACING_LIGHTSTEP:
         import lightstep
@@ -54,6 +314,9 @@ def init_opentracing_tracer(tracer, **kwargs):
         if 'collector_encryption' in kwargs:
             collector_encryption = kwargs.pop('collector_encryption', collector_encryption)
 
+        if scope_manager is not None:
+            kwargs['scope_manager'] = scope_manager
+
         opentracing.tracer = lightstep.Tracer(
             component_name=component_name, access_token=access_token, collector_host=collector_host,
             collector_port=collector_port, collector_encryption=collector_encryption, verbosity=verbosity,
@@ -64,9 +327,20 @@ def init_opentracing_tracer(tracer, **kwargs):
         service_name = kwargs.pop('service_name', os.environ.get('OPENTRACING_JAEGER_SERVICE_NAME'))
         config = kwargs.pop('config', {})
 
-        jaeger_config = Config(config=config, service_name=service_name)
+        if scope_manager is not None:
+            jaeger_config = Config(config=config, service_name=service_name, scope_manager=scope_manager)
+        else:
+            jaeger_config = Config(config=config, service_name=service_name)
         opentracing.tracer = jaeger_config.initialize_tracer()
     else:
-        opentracing.tracer = opentracing.Tracer()
+        opentracing.tracer = opentracing.Tracer(scope_manager=scope_manager)
+
+    if overload_sampler is not None:
+        install_overload_sampler(overload_sampler)
+
+    if shutdown_timeout is not None:
+        from opentracing_utils.lifecycle import TracerLifecycle, install_tracer_lifecycle
+
+        install_tracer_lifecycle(TracerLifecycle(opentracing.tracer, timeout=shutdown_timeout))
 
     return opentracing.tracer
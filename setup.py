@@ -35,7 +35,7 @@ if __name__ == '__main__':
         url='https://github.com/zalando-zmon/opentracing-utils',
         packages=find_packages(exclude=['tests']),
         install_requires=[
-            'future',
+            'future; python_version < "3"',
             'opentracing',
         ],
         setup_requires=[
@@ -1,3 +1,5 @@
+import sys
+
 from basictracer import SpanRecorder
 
 
@@ -12,3 +14,7 @@ class Recorder(SpanRecorder):
 
     def reset(self):
         self.spans = []
+
+
+# async/await tests syntax requires python 3.6+
+collect_ignore = ['test_trace_async.py'] if sys.version_info < (3, 6) else []
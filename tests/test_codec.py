@@ -0,0 +1,238 @@
+import io
+import os
+import struct
+import tempfile
+
+import pytest
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import MmapSpanRecorder, SpanFileRecorder, SpanRecord, read_mapped_spans, read_spans
+from opentracing_utils.codec import (
+    CodecError, HEADER, RECORD_SPAN, RECORD_STRING, RECORD_WIDE_SPAN, SpanEncoder, decode_spans, encode_spans,
+    iter_spans)
+
+
+TAGS = {
+    'str': 'value',
+    'unicode': u'été',
+    'true': True,
+    'false': False,
+    'int': -42,
+    'big_int': 2 ** 70,
+    'float': 0.5,
+    'none': None,
+    'other': [1, 2],
+}
+
+
+def finished_spans():
+    opentracing.tracer = BasicTracer()
+
+    with opentracing.tracer.start_span(operation_name='parent', tags=dict(TAGS)) as parent:
+        parent.log_kv({'event': 'start', 'count': 1})
+        child = opentracing.tracer.start_span(operation_name='child', child_of=parent)
+        child.finish()
+
+    return [child, parent]
+
+
+def test_encode_decode():
+    child, parent = finished_spans()
+
+    records = decode_spans(encode_spans([child, parent]))
+
+    assert [r.operation_name for r in records] == ['child', 'parent']
+
+    child_record, parent_record = records
+    assert child_record.trace_id == child.context.trace_id
+    assert child_record.span_id == child.context.span_id
+    assert child_record.parent_id == parent.context.span_id
+    assert child_record.start_time == child.start_time
+    assert child_record.duration == child.duration
+    assert child_record.tags == {}
+
+    expected_tags = dict(TAGS, other='[1, 2]')
+    assert parent_record.parent_id is None
+    assert parent_record.tags == expected_tags
+    assert type(parent_record.tags['true']) is bool
+    assert parent_record.logs == [(parent.logs[0].timestamp, {'event': 'start', 'count': 1})]
+
+    # Records are encoded as is.
+    assert decode_spans(encode_spans(records))[1].tags == expected_tags
+
+
+def wide_spans():
+    many_tags = tuple(item for i in range(70000) for item in ('t{}'.format(i), i))
+    return [
+        # 128 bits trace id (e.g. Jaeger).
+        SpanRecord(2 ** 100 + 1, 2 ** 64 - 1, None, 'wide_ids', 1.0, 0.5, ('k', 'v'), ((2.0, ('event', 'e')),)),
+        SpanRecord(3, 2, 1, 'many_tags', 1.0, 0.5, many_tags, ((2.0, many_tags),)),
+        SpanRecord(3, 4, 1, 'narrow', 1.0, 0.5, ('k', 'v'), ()),
+    ]
+
+
+def test_encode_decode_wide():
+    data = encode_spans(wide_spans())
+
+    kinds = []
+    offset = len(HEADER)
+    while offset < len(data):
+        length, kind = struct.unpack_from('<IB', data, offset)
+        offset += 4 + length
+        if kind != RECORD_STRING:
+            kinds.append(kind)
+
+    # Only spans not fitting the fixed size fields are wide.
+    assert kinds == [RECORD_WIDE_SPAN, RECORD_WIDE_SPAN, RECORD_SPAN]
+
+    records = decode_spans(data)
+
+    assert [(r.trace_id, r.span_id, r.parent_id) for r in records] == [
+        (2 ** 100 + 1, 2 ** 64 - 1, None), (3, 2, 1), (3, 4, 1)]
+    assert records[0].logs == [(2.0, {'event': 'e'})]
+    assert len(records[1].tags) == 70000
+    assert records[1].tags['t69999'] == 69999
+    assert records[1].logs[0][1] == records[1].tags
+    assert records[2].tags == {'k': 'v'}
+
+
+def test_dictionary_encoding():
+    child, parent = finished_spans()
+
+    encoder = SpanEncoder()
+    first = encoder.encode(parent)
+    second = encoder.encode(parent)
+
+    # Strings are only defined once per stream.
+    assert len(second) < len(first)
+    assert b'parent' in first and b'parent' not in second
+
+
+def test_decode_errors():
+    with pytest.raises(CodecError):
+        decode_spans(b'JSON')
+
+    with pytest.raises(CodecError):
+        decode_spans(HEADER[:-1] + b'\x09')
+
+    with pytest.raises(CodecError):
+        decode_spans(encode_spans(finished_spans())[:-3])
+
+
+def test_iter_spans_lazy_and_partial():
+    data = encode_spans(finished_spans())
+
+    spans = iter_spans(io.BytesIO(data))
+    assert next(spans).operation_name == 'child'
+
+    # A record being written is not decoded.
+    assert [r.operation_name for r in iter_spans(io.BytesIO(data[:-3]))] == ['child']
+    assert list(iter_spans(io.BytesIO(b''))) == []
+
+
+def test_span_file_recorder():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'spans.bin')
+
+    recorder = SpanFileRecorder(path, max_bytes=400, backup_count=2)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    for i in range(20):
+        opentracing.tracer.start_span(operation_name='span', tags={'i': i, 'pad': 'x' * 50}).finish()
+
+    recorder.close()
+
+    assert recorder.written == 20
+    assert recorder.rotations > 2
+    assert sorted(os.listdir(directory)) == ['spans.bin', 'spans.bin.1', 'spans.bin.2']
+
+    records = []
+    for name in ('spans.bin.2', 'spans.bin.1', 'spans.bin'):
+        records.extend(read_spans(os.path.join(directory, name)))
+
+    assert all(isinstance(r, SpanRecord) for r in records)
+    indexes = [r.tags['i'] for r in records]
+    # Last spans, in order.
+    assert indexes == list(range(20 - len(indexes), 20))
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+def test_mmap_span_recorder():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'spans.bin')
+
+    recorder = MmapSpanRecorder(path, size=4096)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    assert os.path.getsize(path) == 4096
+    assert list(read_mapped_spans(path)) == []
+
+    for i in range(5):
+        opentracing.tracer.start_span(operation_name='span', tags={'i': i}).finish()
+
+    assert recorder.written == 5
+
+    # Readable while being written, up to the written records.
+    assert [r.tags['i'] for r in read_mapped_spans(path)] == list(range(5))
+    assert [r.tags['i'] for r in read_spans(path)] == list(range(5))
+
+    # Full: later spans are dropped, even if smaller.
+    opentracing.tracer.start_span(operation_name='big', tags={'pad': 'x' * 4096}).finish()
+    opentracing.tracer.start_span(operation_name='span', tags={'i': 5}).finish()
+
+    assert recorder.full is True
+    assert recorder.dropped == 2
+
+    position = recorder.position
+    recorder.close()
+    recorder.close()
+
+    assert os.path.getsize(path) == position
+    records = list(read_mapped_spans(path))
+    assert [r.tags['i'] for r in records] == list(range(5))
+    assert [r.tags for r in read_spans(path)] == [r.tags for r in records]
+
+    opentracing.tracer.start_span(operation_name='span').finish()
+    assert recorder.dropped == 3
+
+    os.remove(path)
+
+    open(path, 'wb').close()
+    assert list(read_mapped_spans(path)) == []
+
+    os.remove(path)
+    os.rmdir(directory)
+
+    with pytest.raises(ValueError):
+        MmapSpanRecorder(path, size=len(HEADER))
+
+
+def test_span_recorders_wide():
+    directory = tempfile.mkdtemp()
+    mmap_path = os.path.join(directory, 'mmap.bin')
+    file_path = os.path.join(directory, 'file.bin')
+
+    mmap_recorder = MmapSpanRecorder(mmap_path, size=4 * 1024 * 1024)
+    file_recorder = SpanFileRecorder(file_path)
+    for recorder in (mmap_recorder, file_recorder):
+        recorder.extend(wide_spans())
+        assert recorder.written == 3
+
+    expected = [(2 ** 100 + 1, 1), (3, 70000), (3, 1)]
+    assert [(r.trace_id, len(r.tags)) for r in read_mapped_spans(mmap_path)] == expected
+
+    mmap_recorder.close()
+    file_recorder.close()
+
+    assert [(r.trace_id, len(r.tags)) for r in read_spans(mmap_path)] == expected
+    assert [(r.trace_id, len(r.tags)) for r in read_spans(file_path)] == expected
+
+    os.remove(mmap_path)
+    os.remove(file_path)
+    os.rmdir(directory)
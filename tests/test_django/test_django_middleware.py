@@ -264,3 +264,48 @@ def test_extract_span():
     request.current_span = '1'
 
     assert '1' == extract_span_from_django_request(request)
+
+
+@pytest.mark.skipif(six.PY2, reason='')
+def test_request_unsampled(client, settings):
+    recorder = get_recorder()
+
+    settings.OPENTRACING_UTILS_SAMPLER = 0.0
+
+    response = client.get('/nested')
+    assert response.content == b'NESTED'
+
+    assert recorder.spans == []
+
+
+@pytest.mark.skipif(six.PY2, reason='')
+def test_request_bound_tracer(client, settings):
+    recorder = get_recorder()
+
+    bound_recorder = Recorder()
+    bound_tracer = BasicTracer(recorder=bound_recorder)
+    bound_tracer.register_required_propagators()
+
+    settings.OPENTRACING_UTILS_TRACER = bound_tracer
+
+    response = client.get('/')
+    assert response.content == b'TRACED'
+
+    assert recorder.spans == []
+    assert [span.operation_name for span in bound_recorder.spans] == ['home']
+
+
+@pytest.mark.skipif(six.PY2, reason='')
+def test_request_unsampled_upstream(client):
+    from basictracer.context import SpanContext
+
+    recorder = get_recorder()
+
+    headers = {}
+    opentracing.tracer.inject(
+        SpanContext(trace_id=123, span_id=456, sampled=False), opentracing.Format.HTTP_HEADERS, headers)
+
+    response = client.get('/nested', **dict(('HTTP_' + k.upper().replace('-', '_'), v) for k, v in headers.items()))
+    assert response.content == b'NESTED'
+
+    assert recorder.spans == []
@@ -15,6 +15,9 @@ except Exception:
 from basictracer import BasicTracer
 
 from opentracing_utils.libs._flask import trace_flask, extract_span_from_flask_request
+from opentracing_utils import trace, extract_span_from_kwargs
+from opentracing_utils.common import get_wsgi_headers, select_wsgi_headers
+from opentracing_utils.sampling import NonRecordingSpan, UNSAMPLED_SPAN, install_overload_sampler, TraceIdRatioSampler
 
 from .conftest import Recorder
 
@@ -440,3 +443,182 @@ def test_trace_flask_skip_span(monkeypatch):
     assert recorder.spans[0].tags[ot_tags.HTTP_METHOD] == 'GET'
     assert recorder.spans[0].tags[ot_tags.HTTP_STATUS_CODE] == str(200)
     assert recorder.spans[0].operation_name == 'root'
+
+
+@pytest.mark.skipif(skip_flask, reason='Flask import failed - probably due to messed up futures dependency!')
+def test_trace_flask_unsampled(monkeypatch):
+    app = get_flask_app()
+    recorder = get_recorder()
+
+    trace_flask(app, sampler=0.0)
+
+    with app.app_context():
+        def assert_unsampled_span():
+            span = extract_span_from_flask_request()
+            assert isinstance(span, NonRecordingSpan)
+            assert span.context.sampled is False
+            return 'unsampled'
+
+        app.add_url_rule('/unsampled', view_func=assert_unsampled_span)
+
+        client = app.test_client()
+
+        r = client.get('/unsampled')
+        assert b'unsampled' in r.data
+
+    assert recorder.spans == []
+
+
+@pytest.mark.skipif(skip_flask, reason='Flask import failed - probably due to messed up futures dependency!')
+def test_trace_flask_overload_sampler(monkeypatch):
+    app = get_flask_app()
+    recorder = get_recorder()
+
+    trace_flask(app)
+
+    # Shedding all traces entering the process, including propagated ones.
+    install_overload_sampler(TraceIdRatioSampler(0.0))
+    try:
+        with app.app_context():
+            client = app.test_client()
+
+            r = client.get('/')
+            assert b'Hello Test' in r.data
+
+            parent = opentracing.tracer.start_span(operation_name='parent')
+            headers = {}
+            opentracing.tracer.inject(parent.context, opentracing.Format.HTTP_HEADERS, headers)
+
+            r = client.get('/', headers=headers)
+            assert b'Hello Test' in r.data
+    finally:
+        install_overload_sampler(None)
+
+    assert recorder.spans == []
+
+
+@pytest.mark.skipif(skip_flask, reason='Flask import failed - probably due to messed up futures dependency!')
+def test_trace_flask_noop_tracer(monkeypatch):
+    app = get_flask_app()
+
+    trace_flask(app)
+
+    opentracing.tracer = opentracing.Tracer()
+    monkeypatch.setattr(opentracing.tracer, 'extract', MagicMock(side_effect=AssertionError('no extract expected')))
+
+    with app.app_context():
+        def assert_noop_span():
+            assert extract_span_from_flask_request() is UNSAMPLED_SPAN
+            return 'noop'
+
+        app.add_url_rule('/noop', view_func=assert_noop_span)
+
+        client = app.test_client()
+
+        r = client.get('/noop')
+        assert b'noop' in r.data
+
+
+@pytest.mark.skipif(skip_flask, reason='Flask import failed - probably due to messed up futures dependency!')
+def test_trace_flask_bound_tracer(monkeypatch):
+    app = get_flask_app()
+    recorder = get_recorder()
+
+    bound_recorder = Recorder()
+    bound_tracer = BasicTracer(recorder=bound_recorder)
+    bound_tracer.register_required_propagators()
+
+    trace_flask(app, tracer=bound_tracer)
+
+    with app.app_context():
+        client = app.test_client()
+
+        r = client.get('/')
+        assert b'Hello Test' in r.data
+
+    assert recorder.spans == []
+    assert [span.operation_name for span in bound_recorder.spans] == ['root']
+
+
+def unsampled_headers(tracer):
+    from basictracer.context import SpanContext
+
+    headers = {}
+    tracer.inject(SpanContext(trace_id=123, span_id=456, sampled=False), opentracing.Format.HTTP_HEADERS, headers)
+    return headers
+
+
+@pytest.mark.skipif(skip_flask, reason='Flask import failed - probably due to messed up futures dependency!')
+@pytest.mark.parametrize('use_scope_manager', (False, True))
+def test_trace_flask_unsampled_upstream(monkeypatch, use_scope_manager):
+    app = get_flask_app()
+    recorder = get_recorder()
+
+    trace_flask(app, use_scope_manager=use_scope_manager)
+
+    sanitize_url = MagicMock(side_effect=AssertionError('no request tags expected'))
+    monkeypatch.setattr('opentracing_utils.libs._flask.sanitize_url', sanitize_url)
+
+    @trace(span_extractor=extract_span_from_flask_request, pass_span=True)
+    def nested(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    with app.app_context():
+        def assert_non_recording_span():
+            span = extract_span_from_flask_request()
+            assert isinstance(span, NonRecordingSpan)
+            assert span.context.trace_id == 123
+            assert nested() is span
+
+            if use_scope_manager:
+                assert opentracing.tracer.active_span is span
+
+            return 'unsampled'
+
+        app.add_url_rule('/unsampled', view_func=assert_non_recording_span)
+
+        client = app.test_client()
+
+        r = client.get('/unsampled', headers=unsampled_headers(opentracing.tracer))
+        assert b'unsampled' in r.data
+
+    assert recorder.spans == []
+    assert opentracing.tracer.active_span is None
+
+
+def test_get_wsgi_headers():
+    environ = {
+        'HTTP_OT_TRACER_TRACEID': '7b',
+        'HTTP_X_CUSTOM': '123',
+        'CONTENT_TYPE': 'application/json',
+        'REQUEST_METHOD': 'GET',
+        'wsgi.url_scheme': 'http',
+    }
+
+    assert get_wsgi_headers(environ) == {
+        'ot-tracer-traceid': '7b', 'x-custom': '123', 'content-type': 'application/json'}
+
+
+def test_select_wsgi_headers():
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+
+    span = tracer.start_span('parent')
+    span.set_baggage_item('user', '42')
+
+    headers = {}
+    tracer.inject(span.context, opentracing.Format.HTTP_HEADERS, headers)
+    environ = dict(('HTTP_' + k.upper().replace('-', '_'), v) for k, v in headers.items())
+    environ.update(HTTP_X_CUSTOM='123', CONTENT_TYPE='application/json', REQUEST_METHOD='GET')
+
+    selected = select_wsgi_headers(environ, ('ot-tracer-traceid', 'ot-tracer-spanid', 'ot-tracer-sampled', 'missing'),
+                                   ('ot-baggage-',))
+
+    assert selected == headers
+
+    span_ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, selected)
+    assert span_ctx.trace_id == span.context.trace_id
+    assert span_ctx.span_id == span.context.span_id
+    assert span_ctx.baggage == {'user': '42'}
+
+    assert select_wsgi_headers(environ, ('Content-Type',)) == {'Content-Type': 'application/json'}
@@ -0,0 +1,203 @@
+import errno
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import AsyncBatchRecorder, ForwardingRecorder, SpanAggregator, trace
+from opentracing_utils.forwarding import MAX_DATAGRAM_SIZE, decode_spans, encode_spans, get_max_datagram_size
+
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__('socket'), 'AF_UNIX'), reason='No unix sockets')
+
+
+class Sink(object):
+
+    def __init__(self, expected):
+        self.spans = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, batch):
+        self.spans.extend(batch)
+        if len(self.spans) >= self.expected:
+            self.done.set()
+
+
+@pytest.fixture
+def socket_path():
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, 'spans.sock')
+    os.rmdir(directory)
+
+
+def test_encode_decode():
+    opentracing.tracer = BasicTracer()
+
+    with opentracing.tracer.start_span(operation_name='parent', tags={'t': 'v', 'flag': True}) as parent:
+        parent.log_kv({'event': 'start'})
+        child = opentracing.tracer.start_span(operation_name='child', child_of=parent)
+        child.finish()
+
+    records = decode_spans(encode_spans([parent, child]))
+
+    assert [r.operation_name for r in records] == ['parent', 'child']
+    assert records[0].tags == {'t': 'v', 'flag': True}
+    assert records[0].logs == [(parent.logs[0].timestamp, {'event': 'start'})]
+    assert records[0].parent_id is None
+    assert records[1].parent_id == parent.context.span_id
+    assert records[1].trace_id == parent.context.trace_id
+    assert records[1].duration == child.duration
+
+
+def test_forwarding(socket_path):
+    sink = Sink(expected=3)
+    aggregator = SpanAggregator(socket_path, sink, flush_interval=0.01).start()
+
+    recorder = ForwardingRecorder(socket_path)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    @trace()
+    def f1():
+        pass
+
+    with opentracing.tracer.start_span(operation_name='parent') as parent:
+        f1(span=parent)
+        f1(span=parent)
+
+    assert sink.done.wait(5)
+
+    aggregator.close(5)
+    recorder.close()
+
+    assert [s.operation_name for s in sink.spans] == ['f1', 'f1', 'parent']
+    assert all(s.trace_id == parent.context.trace_id for s in sink.spans)
+    assert recorder.sent == 3
+    assert aggregator.stats()['received'] == 3
+    assert not os.path.exists(socket_path)
+
+
+def test_forwarding_batches(socket_path):
+    sink = Sink(expected=100)
+    aggregator = SpanAggregator(socket_path, sink, flush_interval=0.01).start()
+
+    recorder = AsyncBatchRecorder(ForwardingRecorder(socket_path).extend, batch_size=50, flush_interval=0.01)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    for i in range(100):
+        opentracing.tracer.start_span(operation_name='span', tags={'i': i}).finish()
+
+    recorder.close(5)
+
+    assert sink.done.wait(5)
+    aggregator.close(5)
+
+    assert sorted(s.tags['i'] for s in sink.spans) == list(range(100))
+
+
+def test_forwarding_no_aggregator(socket_path):
+    recorder = ForwardingRecorder(socket_path)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    opentracing.tracer.start_span(operation_name='span').finish()
+
+    assert recorder.dropped == 1
+    assert recorder.sent == 0
+
+
+def test_forwarding_max_datagram_size(socket_path):
+    sink = Sink(expected=20)
+    aggregator = SpanAggregator(socket_path, sink, flush_interval=0.01).start()
+
+    tracer = BasicTracer()
+    spans = [tracer.start_span(operation_name='span', tags={'i': i}) for i in range(20)]
+    for span in spans:
+        span.finish()
+
+    # Split in datagrams of a few spans.
+    recorder = ForwardingRecorder(socket_path, max_datagram_size=len(encode_spans(spans[:3])))
+    recorder.extend(spans)
+
+    # A single span too big is dropped.
+    recorder.max_datagram_size = 10
+    recorder.record_span(spans[0])
+
+    assert sink.done.wait(5)
+    aggregator.close(5)
+    recorder.close()
+
+    assert sorted(s.tags['i'] for s in sink.spans) == list(range(20))
+    assert recorder.sent == 20
+    assert recorder.dropped == 1
+
+
+def test_forwarding_emsgsize(socket_path):
+    tracer = BasicTracer()
+    spans = [tracer.start_span(operation_name='span', tags={'i': i}) for i in range(8)]
+    limit = len(encode_spans(spans[:2]))
+
+    class SmallDatagramsSocket(object):
+        # Reported SO_SNDBUF higher than the actual datagram limit.
+        sent = []
+
+        def sendto(self, data, address):
+            if len(data) > limit:
+                raise socket.error(errno.EMSGSIZE, 'Message too long')
+            self.sent.append(data)
+
+    recorder = ForwardingRecorder(socket_path, max_datagram_size=MAX_DATAGRAM_SIZE)
+    recorder._socket, recorder._pid = SmallDatagramsSocket(), os.getpid()
+
+    recorder.extend(spans)
+
+    assert recorder.sent == 8
+    assert recorder.dropped == 0
+    assert recorder.max_datagram_size < limit * 2
+    assert [len(decode_spans(data)) for data in SmallDatagramsSocket.sent] == [2, 2, 2, 2]
+
+
+def test_get_max_datagram_size():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        assert 0 < get_max_datagram_size(sock) <= MAX_DATAGRAM_SIZE
+        assert get_max_datagram_size(sock) == min(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+                                                  MAX_DATAGRAM_SIZE)
+    finally:
+        sock.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork') or sys.platform != 'linux', reason='fork')
+def test_forwarding_forked_workers(socket_path):
+    sink = Sink(expected=4)
+    aggregator = SpanAggregator(socket_path, sink, flush_interval=0.01).start()
+
+    # Created before forking, as in pre-fork servers configuration.
+    recorder = ForwardingRecorder(socket_path)
+    recorder.record_span(BasicTracer().start_span(operation_name='master'))
+
+    pids = []
+    for i in range(3):
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            try:
+                tracer = BasicTracer(recorder=recorder)
+                tracer.start_span(operation_name='worker', tags={'pid': os.getpid()}).finish()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    assert sink.done.wait(5)
+    aggregator.close(5)
+
+    workers = [s for s in sink.spans if s.operation_name == 'worker']
+    assert sorted(s.tags['pid'] for s in workers) == sorted(pids)
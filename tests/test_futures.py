@@ -0,0 +1,284 @@
+import multiprocessing
+import sys
+import threading
+
+import pytest
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from .conftest import Recorder
+from opentracing_utils import trace, TracedThreadPoolExecutor, TracedProcessPoolExecutor
+
+
+@trace()
+def traced_task(x):
+    return x * 2
+
+
+def active_trace_id(x):
+    span = opentracing.tracer.active_span
+    return (span.context.trace_id, x) if span is not None else (None, x)
+
+
+def test_thread_pool_submit():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    with opentracing.tracer.start_active_span('parent', finish_on_close=True) as scope:
+        with TracedThreadPoolExecutor(max_workers=2) as executor:
+            assert executor.submit(traced_task, 1).result() == 2
+
+    parent = scope.span
+    task_span = recorder.spans[0]
+
+    assert task_span.operation_name == 'traced_task'
+    assert task_span.parent_id == parent.context.span_id
+    assert task_span.context.trace_id == parent.context.trace_id
+
+
+def test_thread_pool_map_stack_inspection():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    @trace()
+    def fan_out():
+        with TracedThreadPoolExecutor(max_workers=2) as executor:
+            return list(executor.map(traced_task, range(4)))
+
+    assert fan_out() == [0, 2, 4, 6]
+
+    parent = recorder.spans[-1]
+    assert parent.operation_name == 'fan_out'
+    assert len(recorder.spans) == 5
+    assert all(s.parent_id == parent.context.span_id for s in recorder.spans[:-1])
+
+
+def test_thread_pool_map_active_span():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    with opentracing.tracer.start_active_span('parent', finish_on_close=True) as scope:
+        with TracedThreadPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(traced_task, range(3))) == [0, 2, 4]
+            # ``map`` capture does not leak to later ``submit`` calls.
+            assert executor._mapping.captured is None
+
+    parent = scope.span
+    assert [s.operation_name for s in recorder.spans[:3]] == ['traced_task'] * 3
+    assert all(s.parent_id == parent.context.span_id for s in recorder.spans[:3])
+
+
+class LegacyTracer(BasicTracer):
+    # opentracing < 2.0, no ``active_span``.
+
+    @property
+    def active_span(self):
+        raise AttributeError('active_span')
+
+
+def test_thread_pool_legacy_tracer():
+    recorder = Recorder()
+    opentracing.tracer = LegacyTracer(recorder=recorder)
+
+    @trace()
+    def fan_out():
+        with TracedThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(traced_task, 1).result()
+
+    assert fan_out() == 2
+
+    task_span, parent = recorder.spans
+    assert task_span.operation_name == 'traced_task'
+    assert task_span.parent_id == parent.context.span_id
+
+
+def test_thread_pool_task_spans():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait()
+
+    with opentracing.tracer.start_active_span('parent', finish_on_close=True) as scope:
+        with TracedThreadPoolExecutor(max_workers=1, task_spans=True) as executor:
+            executor.submit(blocker)
+            started.wait()
+
+            future = executor.submit(traced_task, 1)
+            release.set()
+
+            assert future.result() == 2
+
+    parent = scope.span
+    blocker_span, traced_task_span, task_span = recorder.spans[:3]
+
+    assert blocker_span.operation_name == 'blocker'
+    assert blocker_span.parent_id == parent.context.span_id
+    assert task_span.operation_name == 'traced_task'
+    assert task_span.parent_id == parent.context.span_id
+    assert task_span.tags['executor.queue_wait_ms'] >= 0
+    assert traced_task_span.parent_id == task_span.context.span_id
+
+
+def test_thread_pool_task_spans_error():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    def failing():
+        raise ValueError('failed')
+
+    with TracedThreadPoolExecutor(max_workers=1, task_spans=True, task_operation_name='task') as executor:
+        with pytest.raises(ValueError):
+            executor.submit(failing).result()
+
+    assert recorder.spans[0].operation_name == 'task'
+    assert recorder.spans[0].tags['error'] is True
+
+
+def test_thread_pool_unsampled():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    @trace(sampler=0.0)
+    def fan_out():
+        with TracedThreadPoolExecutor(max_workers=1, task_spans=True) as executor:
+            return executor.submit(traced_task, 1).result()
+
+    assert fan_out() == 2
+    assert recorder.spans == []
+
+
+def test_thread_pool_noop_tracer():
+    opentracing.tracer = opentracing.Tracer()
+
+    with TracedThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(traced_task, 1).result() == 2
+        assert list(executor.map(traced_task, range(2))) == [0, 2]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7) or sys.platform != 'linux', reason='fork mp_context')
+def test_process_pool():
+    t = BasicTracer(recorder=Recorder())
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    with opentracing.tracer.start_active_span('parent', finish_on_close=True) as scope:
+        with TracedProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            assert executor.submit(active_trace_id, 1).result() == (scope.span.context.trace_id, 1)
+            assert list(executor.map(active_trace_id, range(2))) == [
+                (scope.span.context.trace_id, 0), (scope.span.context.trace_id, 1)]
+
+
+def active_parent_id(x):
+    span = opentracing.tracer.active_span
+    return span.context.trace_id, span.parent_id, span.operation_name, x
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7) or sys.platform != 'linux', reason='fork mp_context')
+def test_process_pool_task_spans():
+    t = BasicTracer(recorder=Recorder())
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    @trace()
+    def fan_out():
+        # Parent from call stack frames inspection, no active span.
+        parent = opentracing.tracer.active_span
+        assert parent is None
+
+        with TracedProcessPoolExecutor(max_workers=1, task_spans=True, task_operation_name='task',
+                                       mp_context=multiprocessing.get_context('fork')) as executor:
+            return executor.submit(active_parent_id, 1).result(), list(executor.map(active_parent_id, range(2)))
+
+    submitted, mapped = fan_out()
+    parent = opentracing.tracer.recorder.spans[-1]
+    expected = (parent.context.trace_id, parent.context.span_id, 'task')
+
+    assert parent.operation_name == 'fan_out'
+    assert submitted == expected + (1,)
+    assert mapped == [expected + (0,), expected + (1,)]
+
+
+def unsampled_span_in_worker(x):
+    from opentracing_utils.sampling import is_unsampled
+
+    span = opentracing.tracer.active_span
+    return span.context.trace_id, is_unsampled(span), x
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7) or sys.platform != 'linux', reason='fork mp_context')
+def test_process_pool_unsampled():
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    @trace(sampler=0.0, pass_span=True)
+    def fan_out(**kwargs):
+        span = kwargs.popitem()[1]
+        with TracedProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            return span, executor.submit(unsampled_span_in_worker, 1).result()
+
+    span, result = fan_out()
+
+    # The worker gets the trace context, still unsampled.
+    assert result == (span.context.trace_id, True, 1)
+    assert recorder.spans == []
+
+
+def test_process_pool_task_in_process():
+    # The submitted task, run in this process (the worker side is not measured in forked workers).
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    executor = TracedProcessPoolExecutor(max_workers=1, task_spans=True)
+    try:
+        with opentracing.tracer.start_active_span('parent', finish_on_close=True) as scope:
+            task = executor._traced_task(executor._capture('task'), active_parent_id)
+
+        assert task(1) == (scope.span.context.trace_id, scope.span.context.span_id, 'task', 1)
+        assert recorder.spans[-1].operation_name == 'task'
+
+        # No caller span: the task runs without parent.
+        task = executor._traced_task(executor._capture('task'), active_trace_id)
+        trace_id, _ = task(1)
+        assert trace_id != scope.span.context.trace_id
+
+        # Tracer without ``TEXT_MAP`` support: no span context passed.
+        opentracing.tracer = BasicTracer(recorder=recorder)
+        with opentracing.tracer.start_active_span('parent', finish_on_close=True):
+            captured = executor._capture('task')
+        assert captured[0] is None
+    finally:
+        executor.shutdown()
+
+
+def test_process_pool_task_in_process_unsampled():
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    executor = TracedProcessPoolExecutor(max_workers=1)
+    try:
+        @trace(sampler=0.0, pass_span=True)
+        def fan_out(**kwargs):
+            return kwargs.popitem()[1], executor._traced_task(executor._capture('task'), unsampled_span_in_worker)
+
+        span, task = fan_out()
+        assert task(1) == (span.context.trace_id, True, 1)
+
+        # The context-less no-op span is passed as a flag.
+        task = executor._traced_task((None, True, 'task', 0), traced_task)
+        assert task(1) == 2
+        assert recorder.spans == []
+    finally:
+        executor.shutdown()
@@ -1,3 +1,9 @@
+import subprocess
+import sys
+
+import pytest
+
+import opentracing_utils
 from opentracing_utils import trace, extract_span_from_kwargs, trace_flask, trace_requests, remove_span_from_kwargs
 
 
@@ -7,3 +13,48 @@ def test_dummy():
     assert trace
     assert trace_flask
     assert trace_requests
+
+
+def test_all():
+    for name in opentracing_utils.__all__:
+        assert getattr(opentracing_utils, name)
+
+    assert opentracing_utils.__version__
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='No module __getattr__')
+def test_lazy_integrations():
+    code = '\n'.join((
+        'import sys',
+        'import opentracing_utils',
+        'assert "opentracing_utils.libs._requests" not in sys.modules',
+        'assert "requests" not in sys.modules',
+        'assert "trace_requests" in dir(opentracing_utils)',
+        'assert opentracing_utils.trace_requests',
+        'assert "opentracing_utils.libs._requests" in sys.modules',
+    ))
+
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='No module __getattr__')
+def test_lazy_recorders():
+    modules = ('recorders', 'metrics', 'span_store', 'codec', 'forwarding', 'lifecycle')
+    code = '\n'.join((
+        'import sys',
+        'import opentracing_utils',
+        'from opentracing_utils import trace, init_opentracing_tracer, OPENTRACING_BASIC',
+        'init_opentracing_tracer(OPENTRACING_BASIC)',
+        'assert not [m for m in {!r} if "opentracing_utils." + m in sys.modules]'.format(modules),
+        'assert not [m for m in ("mmap", "socket") if m in sys.modules]',
+        'assert opentracing_utils.SpanAggregator',
+        'assert "opentracing_utils.forwarding" in sys.modules',
+    ))
+
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='No module __getattr__')
+def test_lazy_unknown_attribute():
+    with pytest.raises(AttributeError):
+        opentracing_utils.trace_unknown
@@ -0,0 +1,202 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import opentracing
+
+from mock import MagicMock
+
+from opentracing_utils import AsyncBatchRecorder, OPENTRACING_BASIC, TracerLifecycle, init_opentracing_tracer
+from opentracing_utils import TailSamplingRecorder, flush_tracer, shutdown_tracer
+from opentracing_utils import lifecycle
+
+
+def test_shutdown_flushes_recorder(monkeypatch):
+    monkeypatch.setattr(lifecycle, '_lifecycle', None)
+    register = MagicMock()
+    monkeypatch.setattr('atexit.register', register)
+    monkeypatch.setattr(lifecycle, '_atexit_registered', False)
+    monkeypatch.setattr(lifecycle, '_sigterm_registered', True)
+
+    assert shutdown_tracer() is None
+
+    spans = []
+    recorder = AsyncBatchRecorder(spans.extend, batch_size=100, flush_interval=60)
+    tracer = init_opentracing_tracer(
+        OPENTRACING_BASIC, recorder=TailSamplingRecorder(recorder, baseline_rate=1.0), shutdown_timeout=5)
+
+    register.assert_called_once_with(shutdown_tracer)
+    assert lifecycle.get_tracer_lifecycle().tracer is tracer
+
+    for _ in range(3):
+        opentracing.tracer.start_span(operation_name='span').finish()
+
+    report = shutdown_tracer()
+    assert report['flushed'] == 3
+    assert report['dropped'] == 0
+    assert report['timed_out'] is False
+    assert len(spans) == 3
+
+    # Once.
+    assert shutdown_tracer() is report
+
+
+def test_shutdown_deadline():
+    blocked = threading.Event()
+
+    class Tracer(opentracing.Tracer):
+        def close(self):
+            blocked.wait(5)
+
+    started = time.time()
+    report = TracerLifecycle(Tracer(), timeout=0.1).shutdown()
+    blocked.set()
+
+    assert time.time() - started < 2
+    assert report['timed_out'] is True
+    assert report['flushed'] is None and report['dropped'] is None
+
+
+def test_shutdown_pending_spans_dropped():
+    release = threading.Event()
+
+    def sink(spans):
+        release.wait(5)
+
+    recorder = AsyncBatchRecorder(sink, batch_size=1, flush_interval=60)
+    tracer = opentracing.Tracer()
+    tracer.recorder = recorder
+
+    for i in range(3):
+        recorder.record_span(i)
+
+    report = TracerLifecycle(tracer, timeout=0.2).shutdown()
+    release.set()
+
+    assert report['timed_out'] is True
+    assert report['dropped'] >= 2
+
+
+def test_shutdown_flush_backends():
+    tracer = MagicMock(spec=['flush', 'close'])
+    TracerLifecycle(tracer).shutdown()
+
+    tracer.flush.assert_called_once_with()
+    tracer.close.assert_called_once_with()
+
+
+class Future(object):
+    # Tornado future like, as returned by the Jaeger tracer ``close()``.
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_done_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def set_result(self, result):
+        for callback in self.callbacks:
+            callback(self)
+
+
+def test_shutdown_waits_close_future():
+    closed = Future()
+
+    class Tracer(opentracing.Tracer):
+        def close(self):
+            threading.Timer(0.2, closed.set_result, (None,)).start()
+            return closed
+
+    report = TracerLifecycle(Tracer(), timeout=5).shutdown()
+
+    assert report['timed_out'] is False
+    assert report['duration'] >= 0.2
+
+
+def test_shutdown_close_future_deadline():
+    class Tracer(opentracing.Tracer):
+        def close(self):
+            return Future()
+
+    started = time.time()
+    report = TracerLifecycle(Tracer(), timeout=0.1).shutdown()
+
+    assert time.time() - started < 2
+    assert report['timed_out'] is True
+
+
+def test_flush_keeps_tracer_usable(monkeypatch):
+    monkeypatch.setattr(lifecycle, '_lifecycle', None)
+    assert flush_tracer() is None
+
+    spans = []
+    recorder = AsyncBatchRecorder(spans.extend, batch_size=100, flush_interval=60)
+    tracer = opentracing.Tracer()
+    tracer.recorder = recorder
+    lifecycle.install_tracer_lifecycle(TracerLifecycle(tracer), register_atexit=False, register_sigterm=False)
+
+    recorder.record_span('span')
+    report = flush_tracer()
+    assert report['flushed'] == 1
+    assert report['timed_out'] is False
+    assert spans == ['span']
+
+    # Not closed.
+    recorder.record_span('late')
+    assert shutdown_tracer()['flushed'] == 1
+    assert spans == ['span', 'late']
+
+    # Closed for good.
+    assert flush_tracer() is shutdown_tracer()
+
+
+def test_sigterm_shutdown():
+    code = '\n'.join((
+        'import os, signal, sys',
+        'import opentracing',
+        'from opentracing_utils import AsyncBatchRecorder, OPENTRACING_BASIC, init_opentracing_tracer',
+        'def sink(spans):',
+        '    print("flushed {}".format(len(spans)))',
+        '    sys.stdout.flush()',
+        'recorder = AsyncBatchRecorder(sink, flush_interval=60)',
+        'init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, shutdown_timeout=5)',
+        'opentracing.tracer.start_span(operation_name="span").finish()',
+        'os.kill(os.getpid(), signal.SIGTERM)',
+        'print("not terminated")',
+    ))
+
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, env=dict(os.environ))
+    out, _ = process.communicate()
+
+    assert process.returncode == -signal.SIGTERM
+    assert out.decode().split('\n') == ['flushed 1', '']
+
+
+def test_sigterm_previous_handler():
+    code = '\n'.join((
+        'import os, signal, sys',
+        'import opentracing',
+        'from opentracing_utils import AsyncBatchRecorder, OPENTRACING_BASIC, init_opentracing_tracer',
+        'def sink(spans):',
+        '    print("flushed {}".format(len(spans)))',
+        '    sys.stdout.flush()',
+        'def handler(signum, frame):',
+        '    print("draining")',
+        'signal.signal(signal.SIGTERM, handler)',
+        'recorder = AsyncBatchRecorder(sink, flush_interval=60)',
+        'init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, shutdown_timeout=5)',
+        'opentracing.tracer.start_span(operation_name="span").finish()',
+        'os.kill(os.getpid(), signal.SIGTERM)',
+        # Still traced after SIGTERM, flushed at exit.
+        'opentracing.tracer.start_span(operation_name="late").finish()',
+        'opentracing.tracer.start_span(operation_name="late").finish()',
+    ))
+
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, env=dict(os.environ))
+    out, _ = process.communicate()
+
+    assert process.returncode == 0
+    assert out.decode().split('\n') == ['flushed 1', 'draining', 'flushed 2', '']
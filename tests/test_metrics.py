@@ -0,0 +1,142 @@
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import MetricsRecorder, trace
+from opentracing_utils.metrics import (
+    BUCKETS_COUNT, OVERFLOW_OPERATION, LatencyHistogram, bucket_bounds, bucket_index, format_prometheus)
+
+from .conftest import Recorder
+
+
+def test_bucket_bounds():
+    assert bucket_index(0) == 0
+    assert bucket_index(-1) == 0
+    assert bucket_index(1e9) == BUCKETS_COUNT - 1
+
+    previous_upper = 0
+    for index in range(BUCKETS_COUNT):
+        lower, upper = bucket_bounds(index)
+        # Contiguous buckets.
+        assert lower == previous_upper
+        assert bucket_index(lower) == index
+        previous_upper = upper
+
+    for duration in (0.000042, 0.0123, 0.5, 3.0, 120.0):
+        lower, upper = bucket_bounds(bucket_index(duration))
+        assert lower <= duration < upper
+        assert (upper - lower) / lower <= 1.0 / 16
+
+
+def test_latency_histogram_quantiles():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0, trace_id=i)
+
+    assert histogram.count == 1000
+    assert histogram.min == 0.001 and histogram.max == 1.0
+
+    for q in (0.5, 0.9, 0.99):
+        assert abs(histogram.quantile(q) - q) / q < 0.04
+
+    assert histogram.quantile(1.0) <= 1.0
+    assert sum(count for _, count in histogram.buckets()) == 1000
+
+    # Last exemplars of the bucket.
+    exemplars = histogram.exemplars[bucket_index(1.0)]
+    assert [trace_id for trace_id, _, _ in exemplars] == [999, 1000]
+
+
+def test_metrics_recorder():
+    recorder = Recorder()
+    metrics = MetricsRecorder(recorder)
+    opentracing.tracer = BasicTracer(recorder=metrics)
+
+    @trace(component='service')
+    def f(fail=False):
+        if fail:
+            raise ValueError('failed')
+
+    for _ in range(3):
+        f()
+
+    try:
+        f(fail=True)
+    except ValueError:
+        pass
+
+    # Spans are passed to the wrapped recorder.
+    assert len(recorder.spans) == 4
+
+    series = metrics.snapshot()
+    assert sorted(series) == [('f', 'service', 'error'), ('f', 'service', 'ok')]
+    assert series[('f', 'service', 'ok')].count == 3
+    assert series[('f', 'service', 'error')].count == 1
+
+    text = metrics.prometheus_text()
+    assert '# TYPE span_duration_seconds histogram' in text
+    assert 'span_duration_seconds_count{operation="f",component="service",status="ok"} 3' in text
+    assert 'span_duration_seconds_bucket{operation="f",component="service",status="error",le="+Inf"} 1' in text
+    assert ' # {trace_id=' not in text
+
+    error_trace_id = recorder.spans[-1].context.trace_id
+    text = metrics.prometheus_text(openmetrics=True)
+    assert '# {{trace_id="{:x}"}}'.format(error_trace_id) in text
+    assert text.endswith('# EOF\n')
+
+    assert metrics.snapshot(reset=True)
+    assert metrics.snapshot() == {}
+
+
+def test_metrics_recorder_max_series():
+    metrics = MetricsRecorder(max_series=2)
+    opentracing.tracer = BasicTracer(recorder=metrics)
+
+    for i in range(5):
+        opentracing.tracer.start_span(operation_name='op_{}'.format(i), tags={'component': 'c'}).finish()
+
+    series = metrics.snapshot()
+    assert sorted(series) == [(OVERFLOW_OPERATION, '', 'ok'), ('op_0', 'c', 'ok'), ('op_1', 'c', 'ok')]
+    assert series[(OVERFLOW_OPERATION, '', 'ok')].count == 3
+
+
+def test_format_prometheus_escaping():
+    histogram = LatencyHistogram()
+    histogram.record(0.5)
+
+    text = format_prometheus({('select "users"\n', 'sql\\', 'ok'): histogram}, name='db_seconds')
+    assert 'db_seconds_count{operation="select \\"users\\"\\n",component="sql\\\\",status="ok"} 1' in text
+
+
+def test_format_prometheus_fixed_buckets():
+    histogram = LatencyHistogram()
+    histogram.record(0.003, trace_id=1)
+
+    def bounds(text):
+        return [line.split('le="')[1].split('"')[0] for line in text.splitlines() if '_bucket{' in line]
+
+    text = format_prometheus({('f', '', 'ok'): histogram}, buckets=(0.01, 0.005, 1.0), openmetrics=True)
+    assert bounds(text) == ['0.005', '0.01', '1.0', '+Inf']
+    assert 'span_duration_seconds_bucket{operation="f",component="",status="ok",le="0.005"} 1 # {trace_id="1"}' in text
+    assert 'le="0.01"} 1\n' in text
+
+    # Same buckets whatever the recorded durations.
+    histogram.record(0.5)
+    histogram.record(20.0)
+    text = format_prometheus({('f', '', 'ok'): histogram}, buckets=(0.01, 0.005, 1.0))
+    assert bounds(text) == ['0.005', '0.01', '1.0', '+Inf']
+    assert 'le="1.0"} 2\n' in text
+    assert 'le="+Inf"} 3\n' in text
+
+
+def test_metrics_recorder_unnamed_span():
+    metrics = MetricsRecorder()
+    opentracing.tracer = BasicTracer(recorder=metrics)
+
+    opentracing.tracer.start_span().finish()
+    opentracing.tracer.start_span(operation_name='f').finish()
+
+    assert sorted(metrics.snapshot()) == [('', '', 'ok'), ('f', '', 'ok')]
+    assert 'span_duration_seconds_count{operation="",component="",status="ok"} 1' in metrics.prometheus_text()
@@ -0,0 +1,278 @@
+import threading
+import time
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import (
+    AsyncBatchRecorder, OPENTRACING_BASIC, TailSamplingRecorder, init_opentracing_tracer, trace)
+
+
+class Sink(object):
+
+    def __init__(self):
+        self.batches = []
+        self.called = threading.Event()
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        self.called.set()
+
+    @property
+    def spans(self):
+        return [span for batch in self.batches for span in batch]
+
+
+def test_async_batch_recorder():
+    sink = Sink()
+    recorder = AsyncBatchRecorder(sink, batch_size=2, flush_interval=60)
+
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder)
+
+    @trace()
+    def f1():
+        pass
+
+    f1()
+    assert recorder.queue_depth == 1
+
+    f1()
+    # Batch is ready, the background thread is woken up.
+    assert sink.called.wait(5)
+
+    recorder.close(5)
+
+    assert [len(batch) for batch in sink.batches] == [2]
+    assert recorder.stats()['flushed'] == 2
+    assert recorder.stats()['queue_depth'] == 0
+
+
+def test_async_batch_recorder_flush_on_close():
+    sink = Sink()
+    recorder = AsyncBatchRecorder(sink, batch_size=10, flush_interval=60)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    for i in range(5):
+        opentracing.tracer.start_span(operation_name='span_{}'.format(i)).finish()
+
+    recorder.close(5)
+
+    assert [span.operation_name for span in sink.spans] == ['span_{}'.format(i) for i in range(5)]
+
+    # Closed: dropped, never buffered.
+    opentracing.tracer.start_span(operation_name='late').finish()
+    assert recorder.queue_depth == 0
+    assert recorder.dropped == 1
+
+
+def test_async_batch_recorder_drops_oldest():
+    sink = Sink()
+    recorder = AsyncBatchRecorder(sink, max_queue_size=3, batch_size=10, flush_interval=60)
+
+    for i in range(5):
+        recorder.record_span(i)
+
+    assert recorder.dropped == 2
+    assert recorder.queue_depth == 3
+
+    recorder.flush()
+    recorder.close(5)
+
+    assert sink.spans == [2, 3, 4]
+
+
+def test_async_batch_recorder_sink_error():
+    def sink(batch):
+        raise RuntimeError('sink down')
+
+    recorder = AsyncBatchRecorder(sink, batch_size=2, flush_interval=60)
+
+    for i in range(3):
+        recorder.record_span(i)
+
+    recorder.flush()
+    recorder.close(5)
+
+    stats = recorder.stats()
+    assert stats['flush_errors'] == 2
+    assert stats['flushed'] == 0
+    assert stats['queue_depth'] == 0
+    assert stats['max_flush_latency'] >= stats['last_flush_latency'] >= 0
+
+
+class ListRecorder(object):
+
+    def __init__(self):
+        self.spans = []
+        self.closed = False
+
+    def record_span(self, span):
+        self.spans.append(span)
+
+    def close(self):
+        self.closed = True
+
+
+def test_tail_sampling_recorder():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, latency_threshold=0.05, baseline_rate=None)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    def request(error=False, sleep=0):
+        with opentracing.tracer.start_span(operation_name='request') as root:
+            with opentracing.tracer.start_span(operation_name='query', child_of=root) as child:
+                if error:
+                    child.set_tag('error', True)
+                time.sleep(sleep)
+
+            assert tail_recorder.buffered_traces == 1
+
+        return root
+
+    request()
+    assert recorder.spans == []
+
+    failed = request(error=True)
+    assert [span.operation_name for span in recorder.spans] == ['query', 'request']
+    assert recorder.spans[1] is failed
+
+    slow = request(sleep=0.06)
+    assert recorder.spans[-1] is slow
+
+    assert tail_recorder.stats() == {
+        'buffered_traces': 0, 'kept_traces': 2, 'dropped_traces': 1, 'evicted_traces': 0, 'upgraded_traces': 0,
+        'dropped_spans': 0}
+
+    tail_recorder.close()
+    assert recorder.closed is True
+
+
+def test_tail_sampling_recorder_baseline():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=1.0)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    opentracing.tracer.start_span(operation_name='request').finish()
+    assert len(recorder.spans) == 1
+
+    tail_recorder.close()
+
+
+def test_tail_sampling_recorder_bounded():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=None, max_traces=2, max_spans_per_trace=2)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    # Remote parents, no local root span.
+    parents = [opentracing.tracer.start_span(operation_name='remote_{}'.format(i)) for i in range(3)]
+
+    for _ in range(3):
+        opentracing.tracer.start_span(operation_name='span', child_of=parents[0], tags={'error': True}).finish()
+
+    assert tail_recorder.dropped_spans == 1
+
+    for parent in parents[1:]:
+        opentracing.tracer.start_span(operation_name='span', child_of=parent).finish()
+
+    # The least recently updated trace is evicted, and kept as interesting.
+    assert tail_recorder.evicted_traces == 1
+    assert tail_recorder.buffered_traces == 2
+    assert len(recorder.spans) == 2
+
+    # Decided traces spans follow the decision.
+    opentracing.tracer.start_span(operation_name='late', child_of=parents[0]).finish()
+    parents[0].finish()
+    assert [span.operation_name for span in recorder.spans[2:]] == ['late', 'remote_0']
+
+    tail_recorder.flush()
+    assert tail_recorder.buffered_traces == 0
+    assert tail_recorder.dropped_traces == 2
+
+    tail_recorder.close()
+
+
+def test_tail_sampling_recorder_decision_wait():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=None, decision_wait=0)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    parent = opentracing.tracer.start_span(operation_name='remote')
+    opentracing.tracer.start_span(operation_name='span', child_of=parent, tags={'error': True}).finish()
+
+    # Decided without the root span.
+    assert tail_recorder.buffered_traces == 0
+    assert len(recorder.spans) == 1
+
+    tail_recorder.close()
+
+
+def test_tail_sampling_recorder_entry_span():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=None)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    # Upstream context, the server span is the local entry span.
+    remote = opentracing.tracer.start_span(operation_name='remote')
+    with opentracing.tracer.start_span(operation_name='request', child_of=remote,
+                                       tags={'span.kind': 'server', 'error': True}) as server:
+        opentracing.tracer.start_span(operation_name='query', child_of=server).finish()
+
+        assert tail_recorder.buffered_traces == 1
+
+    assert tail_recorder.buffered_traces == 0
+    assert [span.operation_name for span in recorder.spans] == ['query', 'request']
+
+    tail_recorder.close()
+
+
+def test_tail_sampling_recorder_late_error():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=None)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    root = opentracing.tracer.start_span(operation_name='request')
+    task = opentracing.tracer.start_span(operation_name='task', child_of=root)
+    opentracing.tracer.start_span(operation_name='early', child_of=root).finish()
+    root.finish()
+
+    assert tail_recorder.dropped_traces == 1
+    assert recorder.spans == []
+
+    # Failing after the request: the trace is upgraded, from now on.
+    task.set_tag('error', True)
+    task.finish()
+    opentracing.tracer.start_span(operation_name='later', child_of=root).finish()
+
+    assert [span.operation_name for span in recorder.spans] == ['task', 'later']
+    assert tail_recorder.stats()['upgraded_traces'] == 1
+    assert tail_recorder.kept_traces == 1
+    assert tail_recorder.dropped_traces == 0
+
+    tail_recorder.close()
+
+
+def test_tail_sampling_recorder_expire_timer():
+    recorder = ListRecorder()
+    tail_recorder = TailSamplingRecorder(recorder, baseline_rate=None, decision_wait=0.05, expire_interval=0.01)
+    opentracing.tracer = BasicTracer(recorder=tail_recorder)
+
+    # Started with the first span.
+    assert tail_recorder._thread is None
+
+    parent = opentracing.tracer.start_span(operation_name='remote')
+    opentracing.tracer.start_span(operation_name='span', child_of=parent, tags={'error': True}).finish()
+    assert tail_recorder.buffered_traces == 1
+
+    # Decided without any new span.
+    for _ in range(100):
+        if recorder.spans:
+            break
+        time.sleep(0.01)
+
+    assert tail_recorder.buffered_traces == 0
+    assert len(recorder.spans) == 1
+
+    tail_recorder.close()
+    tail_recorder._thread.join(1)
+    assert not tail_recorder._thread.is_alive()
@@ -17,6 +17,7 @@ from .conftest import Recorder
 from opentracing_utils import trace
 from opentracing_utils.common import sanitize_url
 from opentracing_utils.libs._requests import OPERATION_NAME_PREFIX
+from opentracing_utils.sampling import NonRecordingSpan
 
 
 URL = 'http://example.com/'
@@ -549,3 +550,113 @@ def test_trace_requests_extract_span_fail(monkeypatch):
 ))
 def test_sanitize_url(url, masked_q, masked_path, res):
     assert sanitize_url(url, mask_url_query=masked_q, mask_url_path=masked_path) == res
+
+
+def test_trace_requests_unsampled(monkeypatch):
+    resp = Response()
+    resp.status_code = 200
+    resp.url = URL
+
+    trace_requests(sampler=0.0)
+
+    def send_request_mock(self, request, **kwargs):
+        # The decision is propagated downstream.
+        assert request.headers['ot-tracer-sampled'] == 'false'
+        assert '__OPENTRACINGUTILS_SPAN' not in kwargs
+        assert request.headers[CUSTOM_HEADER] == CUSTOM_HEADER_VALUE
+        return resp
+
+    monkeypatch.setattr('opentracing_utils.libs._requests.__requests_http_send', send_request_mock)
+
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    try:
+        response = requests.get(URL, headers={CUSTOM_HEADER: CUSTOM_HEADER_VALUE})
+    finally:
+        trace_requests()
+
+    assert response.status_code == resp.status_code
+    assert recorder.spans == []
+
+
+def test_trace_requests_noop_tracer(monkeypatch):
+    resp = Response()
+    resp.status_code = 200
+    resp.url = URL
+
+    monkeypatch.setattr('opentracing_utils.libs._requests.__requests_http_send',
+                        assert_send_request_mock_no_traces(resp))
+
+    opentracing.tracer = opentracing.Tracer()
+    monkeypatch.setattr(opentracing.tracer, 'start_span', MagicMock(side_effect=AssertionError('no span expected')))
+
+    response = requests.get(URL, headers={CUSTOM_HEADER: CUSTOM_HEADER_VALUE})
+
+    assert response.status_code == resp.status_code
+
+
+def test_trace_requests_bound_tracer(monkeypatch):
+    resp = Response()
+    resp.status_code = 200
+    resp.url = URL
+
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    bound_recorder = Recorder()
+    bound_tracer = BasicTracer(recorder=bound_recorder)
+    bound_tracer.register_required_propagators()
+
+    trace_requests(tracer=bound_tracer)
+
+    monkeypatch.setattr('opentracing_utils.libs._requests.__requests_http_send',
+                        assert_send_request_mock(resp))
+
+    try:
+        response = requests.get(URL, headers={CUSTOM_HEADER: CUSTOM_HEADER_VALUE})
+    finally:
+        trace_requests()
+
+    assert response.status_code == resp.status_code
+    assert recorder.spans == []
+    assert [span.operation_name for span in bound_recorder.spans] == ['{}_get'.format(OPERATION_NAME_PREFIX)]
+
+
+def test_trace_requests_unsampled_upstream(monkeypatch):
+    from basictracer.context import SpanContext
+
+    resp = Response()
+    resp.status_code = 200
+    resp.url = URL
+
+    recorder = Recorder()
+    t = BasicTracer(recorder=recorder)
+    t.register_required_propagators()
+    opentracing.tracer = t
+
+    def send_request_mock(self, request, **kwargs):
+        # The upstream decision is propagated.
+        assert request.headers['ot-tracer-traceid'] == '{:x}'.format(123)
+        assert request.headers['ot-tracer-sampled'] == 'false'
+        assert request.headers[CUSTOM_HEADER] == CUSTOM_HEADER_VALUE
+        return resp
+
+    monkeypatch.setattr('opentracing_utils.libs._requests.__requests_http_send', send_request_mock)
+
+    trace_requests()
+
+    span = NonRecordingSpan(t, SpanContext(trace_id=123, span_id=456, sampled=False))
+
+    @trace()
+    def f(**kwargs):
+        return requests.get(URL, headers={CUSTOM_HEADER: CUSTOM_HEADER_VALUE})
+
+    response = f(span=span)
+
+    assert response.status_code == resp.status_code
+    assert recorder.spans == []
@@ -0,0 +1,391 @@
+from mock import MagicMock
+
+import pytest
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from .conftest import Recorder
+from opentracing_utils import (
+    AsyncBatchRecorder, OPENTRACING_BASIC, OverloadSampler, init_opentracing_tracer, trace, extract_span_from_kwargs)
+from opentracing_utils.sampling import (
+    NonRecordingSpan, RateLimitingSampler, TraceIdRatioSampler, UNSAMPLED_SPAN, get_overload_sampler, get_sampler,
+    install_overload_sampler, is_context_unsampled, is_unsampled, trace_id_to_int)
+
+
+def test_sampler_deterministic():
+    sampler = TraceIdRatioSampler(0.5)
+
+    decisions = [sampler.is_sampled(trace_id) for trace_id in range(0, 2 ** 64, 2 ** 58 + 1)]
+
+    assert decisions == [sampler.is_sampled(trace_id) for trace_id in range(0, 2 ** 64, 2 ** 58 + 1)]
+    assert True in decisions
+    assert False in decisions
+
+
+@pytest.mark.parametrize('rate', (0.0, 0.1, 0.5, 1.0))
+def test_sampler_rate(rate):
+    import random
+
+    sampler = TraceIdRatioSampler(rate)
+    rnd = random.Random(42)
+
+    sampled = sum(sampler.is_sampled(rnd.getrandbits(64)) for _ in range(10000))
+
+    assert abs(sampled / 10000.0 - rate) < 0.02
+
+
+def test_sampler_trace_ids():
+    sampler = TraceIdRatioSampler(0.0)
+
+    assert sampler.is_sampled(None) is True
+    assert sampler.is_sampled(123) is False
+    assert sampler.is_sampled('a2f1b3c4d5e6f708') is False
+    assert sampler.is_sampled('not-hex') is False
+
+    assert trace_id_to_int('ff') == 255
+    assert TraceIdRatioSampler(1.0).is_sampled(2 ** 128 - 1) is True
+
+
+def test_get_sampler():
+    sampler = TraceIdRatioSampler(0.1)
+
+    assert get_sampler(None) is None
+    assert get_sampler(sampler) is sampler
+    assert get_sampler(0.5).rate == 0.5
+    assert get_sampler(1).rate == 1.0
+
+    with pytest.raises(ValueError):
+        get_sampler(2.0)
+
+    with pytest.raises(TypeError):
+        get_sampler('0.5')
+
+
+def test_trace_unsampled():
+
+    @trace(tags={'t': 1}, pass_span=True)
+    def parent(**kwargs):
+        span = extract_span_from_kwargs(**kwargs)
+        assert isinstance(span, NonRecordingSpan)
+        # The trace context is kept, with the sampling flag off.
+        assert span.context.trace_id is not None
+        assert span.context.sampled is False
+        nested()
+
+    @trace()
+    def nested():
+        pass
+
+    @trace(sampler=0.0, pass_span=True)
+    def root_with_pass_span(**kwargs):
+        parent(**kwargs)
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    # Root, unsampled
+    root_with_pass_span()
+
+    assert recorder.spans == []
+
+
+def test_trace_sampled_consistently():
+    sampler = TraceIdRatioSampler(0.5)
+
+    @trace(sampler=sampler)
+    def parent():
+        nested()
+
+    @trace(sampler=sampler)
+    def nested():
+        pass
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    for _ in range(100):
+        parent()
+
+    assert 0 < len(recorder.spans) < 200
+
+    # Nested spans are kept if and only if their parent is.
+    assert len(recorder.spans) % 2 == 0
+    for child, parent_span in zip(recorder.spans[::2], recorder.spans[1::2]):
+        assert child.parent_id == parent_span.context.span_id
+        assert sampler.is_sampled(parent_span.context.trace_id)
+
+
+def test_trace_sampled_parent():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    sampler = TraceIdRatioSampler(0.5)
+
+    @trace(sampler=sampler)
+    def f1():
+        pass
+
+    for _ in range(20):
+        with opentracing.tracer.start_span(operation_name='top') as top_span:
+            f1()
+
+        if sampler.is_sampled(top_span.context.trace_id):
+            assert recorder.spans[-2].parent_id == top_span.context.span_id
+        else:
+            assert recorder.spans == [top_span]
+
+        recorder.reset()
+
+
+def test_rate_limiting_sampler(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('opentracing_utils.sampling._now', lambda: now[0])
+
+    sampler = RateLimitingSampler(traces_per_second=2)
+
+    assert [sampler.sampled_operation(1, 'health') for _ in range(4)] == [True, True, False, False]
+    # Other operations have their own bucket.
+    assert sampler.sampled_operation(1, 'rare') is True
+
+    now[0] += 0.5
+    assert [sampler.sampled_operation(1, 'health') for _ in range(2)] == [True, False]
+
+    now[0] += 10
+    assert [sampler.sampled_operation(1, 'health') for _ in range(3)] == [True, True, False]
+
+
+def test_rate_limiting_sampler_rate(monkeypatch):
+    monkeypatch.setattr('opentracing_utils.sampling._now', lambda: 100.0)
+
+    sampler = RateLimitingSampler(traces_per_second=1, rate=1.0)
+
+    assert all(sampler.sampled(trace_id) for trace_id in range(10))
+
+    sampler = RateLimitingSampler(traces_per_second=0, rate=0.0)
+
+    assert sampler.sampled(1) is True
+    assert sampler.sampled(1) is False
+
+
+def test_rate_limiting_sampler_max_operations(monkeypatch):
+    monkeypatch.setattr('opentracing_utils.sampling._now', lambda: 100.0)
+
+    sampler = RateLimitingSampler(traces_per_second=1, max_operations=2)
+
+    assert sampler.sampled_operation(1, 'op1') is True
+    assert sampler.sampled_operation(1, 'op2') is True
+    # Shared bucket for all the other operations.
+    assert sampler.sampled_operation(1, 'op3') is True
+    assert sampler.sampled_operation(1, 'op4') is False
+
+    assert len(sampler._buckets) == 3
+
+    with pytest.raises(ValueError):
+        RateLimitingSampler(traces_per_second=-1)
+
+
+def test_overload_sampler(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('opentracing_utils.sampling._now', lambda: now[0])
+
+    pressure = [0.0]
+    sampler = OverloadSampler(lambda: pressure[0], high_watermark=0.8, low_watermark=0.5, min_rate=0.25)
+    trace_ids = range(0, 2 ** 63, 2 ** 53 + 1)
+
+    def step(value):
+        pressure[0] = value
+        now[0] += 1.0
+        sampled = [trace_id for trace_id in trace_ids if sampler.is_sampled(trace_id)]
+        return sampler.level, sampled
+
+    assert sampler.max_level == 2
+    assert step(0.5) == (0, list(trace_ids))
+
+    level, half = step(0.9)
+    assert level == 1 and sampler.rate == 0.5
+    assert 0.4 < len(half) / float(len(trace_ids)) < 0.6
+
+    level, quarter = step(0.9)
+    assert level == 2 and sampler.rate == 0.25
+    # Lower rates keep a subset of the traces.
+    assert set(quarter) < set(half)
+
+    # Max level.
+    assert step(1.0)[0] == 2
+
+    # Hysteresis: kept between the watermarks.
+    assert step(0.7)[0] == 2
+
+    assert step(0.5)[0] == 1
+    assert step(0.1) == (0, list(trace_ids))
+
+    assert sampler.stats() == {'level': 0, 'rate': 1.0, 'degradations': 2}
+    assert 'tracing_degradation_level 0\n' in sampler.prometheus_text()
+
+    # Not adjusted before the interval.
+    pressure[0] = 1.0
+    sampler.is_sampled(1)
+    assert sampler.level == 0
+
+    with pytest.raises(ValueError):
+        OverloadSampler(lambda: 0, high_watermark=0.5, low_watermark=0.5)
+
+
+def test_overload_sampler_installed(monkeypatch):
+    def sink(spans):
+        pass
+
+    recorder = AsyncBatchRecorder(sink, max_queue_size=10, batch_size=10, flush_interval=60)
+    overload_sampler = OverloadSampler(recorder, high_watermark=0.5, low_watermark=0.1, min_rate=0.0,
+                                       adjust_interval=0)
+
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, overload_sampler=overload_sampler)
+    assert get_overload_sampler() is overload_sampler
+
+    try:
+        @trace(pass_span=True)
+        def f(**kwargs):
+            return extract_span_from_kwargs(**kwargs)
+
+        assert not is_unsampled(f())
+        assert recorder.queue_depth == 1
+
+        for i in range(4):
+            opentracing.tracer.start_span(operation_name='span').finish()
+
+        assert recorder.pressure == 0.5
+
+        # Under pressure, new traces are shed, more and more.
+        spans = [f() for _ in range(10)]
+        assert any(is_unsampled(span) for span in spans)
+        assert overload_sampler.level > 1
+
+        # In process children of sampled spans are kept.
+        with opentracing.tracer.start_active_span('parent'):
+            assert not is_unsampled(f())
+
+        # Recovery, one level per adjustment.
+        recorder.flush()
+        level = overload_sampler.level
+        f()
+        assert overload_sampler.level == level - 1
+
+        while overload_sampler.level:
+            f()
+            recorder.flush()
+
+        assert not is_unsampled(f())
+    finally:
+        install_overload_sampler(None)
+        recorder.close(5)
+
+
+def test_non_recording_span():
+    from basictracer.context import SpanContext
+
+    assert is_unsampled(UNSAMPLED_SPAN)
+
+    span = NonRecordingSpan(BasicTracer(), SpanContext(trace_id=1, span_id=2, sampled=False))
+    assert is_unsampled(span)
+    assert span.set_tag('key', 'value') is span
+
+    assert is_context_unsampled(span.context) is True
+    assert is_context_unsampled(SpanContext(trace_id=1, span_id=2, sampled=True)) is False
+    assert is_context_unsampled(opentracing.SpanContext()) is False
+
+    class JaegerContext(object):
+        def __init__(self, flags):
+            self.flags = flags
+
+    assert is_context_unsampled(JaegerContext(0)) is True
+    assert is_context_unsampled(JaegerContext(1)) is False
+    assert is_context_unsampled(JaegerContext(3)) is False
+
+
+def test_tracer_unsampled_trace():
+    recorder = Recorder()
+    sampler = MagicMock()
+    sampler.sampled_operation.return_value = False
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, sampler=sampler)
+
+    @trace(pass_span=True)
+    def parent(**kwargs):
+        return extract_span_from_kwargs(**kwargs), child()
+
+    @trace(pass_span=True)
+    def child(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    parent_span, child_span = parent()
+
+    # Not sampled by the tracer: no child spans, the trace context is kept.
+    assert isinstance(parent_span, NonRecordingSpan)
+    assert child_span is parent_span
+    assert parent_span.context.trace_id is not None
+    assert recorder.spans == []
+
+
+@pytest.mark.parametrize('use_context_scope_manager', (False, True))
+def test_trace_unsampled_root_nested(use_context_scope_manager):
+    from opentracing_utils import ContextVarsScopeManager
+
+    recorder = Recorder()
+    scope_manager = ContextVarsScopeManager() if use_context_scope_manager else None
+    opentracing.tracer = BasicTracer(recorder=recorder, scope_manager=scope_manager)
+
+    @trace(sampler=0.0, pass_span=True)
+    def root(**kwargs):
+        span = extract_span_from_kwargs(**kwargs)
+        if use_context_scope_manager:
+            assert opentracing.tracer.active_span is span
+        return span, child()
+
+    @trace(pass_span=True)
+    def child(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    for _ in range(5):
+        root_span, child_span = root()
+        # Nested calls find the non recording root, no orphan child traces.
+        assert child_span is root_span
+
+    assert recorder.spans == []
+
+
+def test_tracer_unsampled_root_activated():
+    from opentracing_utils import ContextVarsScopeManager
+    from opentracing_utils._basictracer import OperationSamplingTracer
+
+    recorder = Recorder()
+    sampler = MagicMock()
+    sampler.sampled_operation.return_value = False
+    opentracing.tracer = OperationSamplingTracer(
+        recorder=recorder, sampler=sampler, scope_manager=ContextVarsScopeManager())
+    opentracing.tracer.register_required_propagators()
+
+    @trace(pass_span=True)
+    def root(**kwargs):
+        span = extract_span_from_kwargs(**kwargs)
+
+        # Activated, so the trace context is found by un-decorated code (e.g. outgoing requests).
+        assert opentracing.tracer.active_span is span
+        carrier = {}
+        opentracing.tracer.inject(opentracing.tracer.active_span.context, opentracing.Format.HTTP_HEADERS, carrier)
+
+        return span, child(), carrier
+
+    @trace(pass_span=True)
+    def child(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    root_span, child_span, carrier = root()
+
+    assert isinstance(root_span, NonRecordingSpan)
+    assert root_span is not UNSAMPLED_SPAN
+    assert child_span is root_span
+    assert carrier['ot-tracer-traceid'] == '{:x}'.format(root_span.context.trace_id)
+    assert carrier['ot-tracer-sampled'] == 'false'
+    assert opentracing.tracer.active_span is None
+    assert recorder.spans == []
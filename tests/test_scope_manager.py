@@ -0,0 +1,144 @@
+import sys
+import threading
+
+import pytest
+
+import opentracing
+
+from basictracer import BasicTracer
+
+from .conftest import Recorder
+from opentracing_utils import trace, init_opentracing_tracer, OPENTRACING_BASIC, ContextVarsScopeManager
+
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason='contextvars requires python 3.7+')
+
+
+def test_scope_manager_upstream():
+    from opentracing.scope_managers.contextvars import ContextVarsScopeManager as UpstreamScopeManager
+
+    assert ContextVarsScopeManager is UpstreamScopeManager
+
+
+def test_scope_manager_activate():
+    scope_manager = ContextVarsScopeManager()
+    tracer = BasicTracer(scope_manager=scope_manager)
+
+    assert scope_manager.active is None
+
+    parent = tracer.start_span(operation_name='parent')
+    child = tracer.start_span(operation_name='child')
+
+    with scope_manager.activate(parent, finish_on_close=False) as parent_scope:
+        assert scope_manager.active is parent_scope
+
+        with scope_manager.activate(child, finish_on_close=False) as child_scope:
+            assert scope_manager.active is child_scope
+            assert tracer.active_span is child
+
+        assert scope_manager.active is parent_scope
+
+    assert scope_manager.active is None
+
+
+def test_scope_manager_finish_on_close():
+    recorder = Recorder()
+    tracer = BasicTracer(recorder=recorder, scope_manager=ContextVarsScopeManager())
+
+    with tracer.start_active_span(operation_name='span', finish_on_close=False):
+        pass
+
+    assert recorder.spans == []
+
+    with tracer.start_active_span(operation_name='span', finish_on_close=True):
+        pass
+
+    assert len(recorder.spans) == 1
+
+
+def test_scope_manager_threads():
+    scope_manager = ContextVarsScopeManager()
+    tracer = BasicTracer(scope_manager=scope_manager)
+
+    active = []
+
+    with tracer.start_active_span(operation_name='main'):
+        t = threading.Thread(target=lambda: active.append(scope_manager.active))
+        t.start()
+        t.join()
+
+    assert active == [None]
+
+
+def test_init_tracer_scope_manager():
+    scope_manager = ContextVarsScopeManager()
+
+    tracer = init_opentracing_tracer(OPENTRACING_BASIC, scope_manager=scope_manager)
+    assert tracer.scope_manager is scope_manager
+
+    tracer = init_opentracing_tracer(None, scope_manager=scope_manager)
+    assert tracer.scope_manager is scope_manager
+
+
+def test_trace_context_scope_manager():
+    recorder = Recorder()
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, scope_manager=ContextVarsScopeManager())
+
+    @trace()
+    def parent():
+        assert opentracing.tracer.active_span.operation_name == 'parent'
+        nested()
+
+    @trace()
+    def nested():
+        assert opentracing.tracer.active_span.operation_name == 'nested'
+
+    parent()
+
+    assert len(recorder.spans) == 2
+    assert recorder.spans[0].parent_id == recorder.spans[1].context.span_id
+    assert recorder.spans[1].parent_id is None
+
+
+def test_trace_context_scope_manager_siblings():
+    recorder = Recorder()
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, scope_manager=ContextVarsScopeManager())
+
+    @trace()
+    def f1():
+        pass
+
+    top_span = opentracing.tracer.start_span(operation_name='top_trace')
+    with opentracing.tracer.scope_manager.activate(top_span, finish_on_close=True):
+        broken_span = opentracing.tracer.start_span(operation_name='broken_trace', ignore_active_span=True)
+        with broken_span:
+            f1(span=broken_span)
+
+        # No call stack frames inspection, ``broken_span`` is not picked as parent.
+        f1()
+
+    f1_broken, _, f1_top, _ = recorder.spans
+
+    assert f1_broken.parent_id == broken_span.context.span_id
+    assert f1_top.parent_id == top_span.context.span_id
+
+
+def test_trace_context_scope_manager_inspect_stack_opt_in():
+    recorder = Recorder()
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, scope_manager=ContextVarsScopeManager())
+
+    @trace()
+    def f1():
+        pass
+
+    @trace(inspect_stack=True)
+    def f2():
+        pass
+
+    test_span = opentracing.tracer.start_span(operation_name='test_trace')
+    with test_span:
+        f1()
+        f2()
+
+    assert recorder.spans[0].parent_id is None
+    assert recorder.spans[1].parent_id == test_span.context.span_id
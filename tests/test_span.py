@@ -1,4 +1,5 @@
 import gc
+import sys
 
 import opentracing
 
@@ -12,7 +13,7 @@ from opentracing_utils.span import (
     get_new_span, adjust_span, extract_span_from_kwargs, remove_span_from_kwargs,
     inspect_span_from_stack
 )
-from opentracing_utils.span import DEFAULT_SPAN_ARG_NAME
+from opentracing_utils.span import DEFAULT_SPAN_ARG_NAME, FRAME_SPANS
 
 import pytest
 import six
@@ -174,6 +175,24 @@ def test_inspect_span_from_stack_does_not_create_reference_cycle():
         assert previous_generation['collected'] == current_generation['collected']
 
 
+def test_inspect_span_from_stack_frame_markers():
+    opentracing.tracer = BasicTracer()
+
+    span = opentracing.tracer.start_span()  # noqa
+
+    assert inspect_span_from_stack() is span
+    assert inspect_span_from_stack(frame_markers_only=True) is None
+
+    def marked():
+        FRAME_SPANS[id(sys._getframe())] = span
+        try:
+            return inspect_span_from_stack(frame_markers_only=True)
+        finally:
+            FRAME_SPANS.clear()
+
+    assert marked() is span
+
+
 def test_get_new_span_with_extractor_with_scope():
     opentracing.tracer = BasicTracer()
     parent_span = opentracing.tracer.start_span()
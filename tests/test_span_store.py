@@ -0,0 +1,90 @@
+import opentracing
+
+from basictracer import BasicTracer
+
+from opentracing_utils import AsyncBatchRecorder, SpanRecord, SpanStore, trace
+
+
+def test_span_store():
+    store = SpanStore()
+    opentracing.tracer = BasicTracer(recorder=store)
+
+    @trace(tags={'static': 'tag', 'flag': True})
+    def f1(**kwargs):
+        pass
+
+    with opentracing.tracer.start_span(operation_name='parent') as parent:
+        parent.log_kv({'event': 'start'})
+        f1(span=parent)
+        f1(span=parent)
+
+    assert len(store) == 3
+
+    child1, child2, top = list(store)
+
+    assert isinstance(top, SpanRecord)
+    assert top.operation_name == 'parent'
+    assert top.parent_id is None
+    assert top.trace_id == parent.context.trace_id
+    assert top.span_id == parent.context.span_id
+    assert top.start_time == parent.start_time
+    assert top.duration == parent.duration
+    assert top.tags == {}
+    assert top.logs == [(parent.logs[0].timestamp, {'event': 'start'})]
+
+    assert child1.operation_name == 'f1'
+    assert child1.parent_id == parent.context.span_id
+    assert child1.tags == {'static': 'tag', 'flag': True}
+
+    # Same tags, same interned tuple.
+    assert store._tags[0] is store._tags[1]
+    assert store.operation_names == ['f1', 'parent']
+
+    assert [r.span_id for r in store.trace(parent.context.trace_id)] == [child1.span_id, child2.span_id, top.span_id]
+    assert store.trace(1) == []
+
+    lock = store._lock
+    store.clear()
+    assert len(store) == 0
+    assert store.operation_names == []
+    assert store._lock is lock
+
+
+def test_span_store_tag_types():
+    store = SpanStore()
+    opentracing.tracer = BasicTracer(recorder=store)
+
+    opentracing.tracer.start_span(operation_name='s1', tags={'error': True}).finish()
+    opentracing.tracer.start_span(operation_name='s2', tags={'error': 1}).finish()
+    opentracing.tracer.start_span(operation_name='s3', tags={'list': [1]}).finish()
+
+    assert [type(record.tags['error']) for record in list(store)[:2]] == [bool, int]
+    assert store[2].tags == {'list': [1]}
+
+
+def test_span_store_async_batch_recorder_compact():
+    store = SpanStore()
+    recorder = AsyncBatchRecorder(store.extend, compact=True, flush_interval=60)
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    opentracing.tracer.start_span(operation_name='s1', tags={'t': 'v'}).finish()
+    assert isinstance(recorder._queue[0], SpanRecord)
+
+    recorder.close(5)
+
+    assert store[0].operation_name == 's1'
+    assert store[0].tags == {'t': 'v'}
+
+
+def test_span_store_intern_limit(monkeypatch):
+    monkeypatch.setattr('opentracing_utils.span_store.MAX_INTERNED', 2)
+
+    store = SpanStore()
+    opentracing.tracer = BasicTracer(recorder=store)
+
+    for index in range(4):
+        opentracing.tracer.start_span(operation_name='s', tags={'k{}'.format(index): 'v'}).finish()
+
+    assert len(store._interned_items) == 2
+    assert len(store._interned_tags) == 2
+    assert [record.tags for record in store] == [{'k{}'.format(index): 'v'} for index in range(4)]
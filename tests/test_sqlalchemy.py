@@ -2,6 +2,8 @@ import opentracing
 import pytest
 import ctypes
 
+from mock import MagicMock
+
 from sqlalchemy import event
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -404,3 +406,55 @@ def test_trace_sqlalchemy_scope_legacy_tracer(monkeypatch, session, legacy_recor
 
     assert sql_span.tags['db.statement'] == 'INSERT INTO users (name, is_active) VALUES (?, ?)'
     assert_sqlalchemy_span(sql_span, operation_name='insert')
+
+
+def test_trace_sqlalchemy_unsampled(monkeypatch, session, recorder):
+    trace_sqlalchemy(sampler=0.0)
+
+    top_span = opentracing.tracer.start_span(operation_name='top_span')
+
+    with top_span:
+        user = User(name='Tracer', is_active=True)
+        session.add(user)
+        session.commit()
+
+    assert recorder.spans == [top_span]
+
+
+def test_trace_sqlalchemy_unsampled_parent(monkeypatch, session, recorder):
+    trace_sqlalchemy()
+
+    @trace(sampler=0.0)
+    def f1():
+        user = User(name='Tracer', is_active=True)
+        session.add(user)
+        session.commit()
+
+    f1()
+
+    assert recorder.spans == []
+
+
+def test_trace_sqlalchemy_noop_tracer(monkeypatch, session):
+    trace_sqlalchemy()
+
+    opentracing.tracer = opentracing.Tracer()
+    monkeypatch.setattr(opentracing.tracer, 'start_span', MagicMock(side_effect=AssertionError('no span expected')))
+
+    user = User(name='Tracer', is_active=True)
+    session.add(user)
+    session.commit()
+
+    assert session.query(User).count() == 1
+
+
+def test_trace_sqlalchemy_bound_tracer(monkeypatch, session, recorder):
+    bound_recorder = Recorder()
+    trace_sqlalchemy(tracer=BasicTracer(recorder=bound_recorder))
+
+    user = User(name='Tracer', is_active=True)
+    session.add(user)
+    session.commit()
+
+    assert recorder.spans == []
+    assert [span.operation_name for span in bound_recorder.spans] == ['insert']
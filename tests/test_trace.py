@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 import opentracing
@@ -9,7 +11,9 @@ from opentracing.ext import tags as opentracing_tags
 from basictracer import BasicTracer
 
 from .conftest import Recorder
-from opentracing_utils import trace, extract_span_from_kwargs
+from opentracing_utils import trace, extract_span_from_kwargs, INSPECT_FRAME_MARKERS
+from opentracing_utils.sampling import UNSAMPLED_SPAN
+from opentracing_utils.span import DEFAULT_SPAN_ARG_NAME, FRAME_SPANS
 
 
 def is_span_in_kwargs(**kwargs):
@@ -108,12 +112,16 @@ def test_trace_generator():
 
     assert len(recorder.spans) == 4
 
+    # Inside generator takes generator as parent!
+    assert recorder.spans[0].operation_name == 'f2'
     assert recorder.spans[0].context.trace_id == test_span.context.trace_id
-    assert recorder.spans[0].parent_id == recorder.spans[2].context.span_id
+    assert recorder.spans[0].parent_id == recorder.spans[1].context.span_id
 
-    # Inside generator takes generator as parent!
+    # Generator span is finished on exhaustion.
+    assert recorder.spans[1].operation_name == 'l2_gen'
     assert recorder.spans[1].context.trace_id == test_span.context.trace_id
-    assert recorder.spans[1].parent_id == recorder.spans[0].context.span_id
+    assert recorder.spans[1].parent_id == recorder.spans[2].context.span_id
+    assert recorder.spans[1].tags['generator.items'] == 10
 
     assert recorder.spans[2].context.trace_id == test_span.context.trace_id
     assert recorder.spans[2].parent_id == recorder.spans[3].context.span_id
@@ -304,6 +312,28 @@ def test_trace_single_with_tracer_args():
     assert recorder.spans[0].tags == tags
 
 
+def test_trace_static_tags_frozen():
+    tags = {'t1': 'v1'}
+
+    @trace(tags=tags, component='component', pass_span=True)
+    def f1(**kwargs):
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.set_tag('call', True)
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    # Changes after decoration do not affect the spans.
+    tags['t2'] = 'v2'
+
+    f1()
+    f1()
+
+    expected = {'t1': 'v1', opentracing_tags.COMPONENT: 'component', 'call': True}
+    assert [span.tags for span in recorder.spans] == [expected, expected]
+    assert recorder.spans[0].tags is not recorder.spans[1].tags
+
+
 @pytest.mark.parametrize('return_span', (True, False))
 def test_trace_single_with_extractor(return_span):
     recorder = Recorder()
@@ -494,12 +524,254 @@ def test_trace_generator_span_kwargs_with_scope_manager():
 
     assert len(recorder.spans) == 4
 
+    # Inside generator takes generator as parent!
+    assert recorder.spans[0].operation_name == 'f2'
     assert recorder.spans[0].context.trace_id == test_span.context.trace_id
-    assert recorder.spans[0].parent_id == recorder.spans[2].context.span_id
+    assert recorder.spans[0].parent_id == recorder.spans[1].context.span_id
 
-    # Inside generator takes generator as parent!
+    # Generator span is finished on exhaustion.
+    assert recorder.spans[1].operation_name == 'l2_gen'
     assert recorder.spans[1].context.trace_id == test_span.context.trace_id
-    assert recorder.spans[1].parent_id == recorder.spans[0].context.span_id
+    assert recorder.spans[1].parent_id == recorder.spans[2].context.span_id
+    assert recorder.spans[1].tags['generator.items'] == 10
 
     assert recorder.spans[2].context.trace_id == test_span.context.trace_id
     assert recorder.spans[2].parent_id == recorder.spans[3].context.span_id
+
+
+def test_trace_frame_markers():
+
+    @trace()
+    def parent():
+        intermediate(5)
+
+    def intermediate(depth):
+        if depth:
+            return intermediate(depth - 1)
+
+        nested()
+
+    @trace(inspect_stack=INSPECT_FRAME_MARKERS)
+    def nested():
+        pass
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    test_span = opentracing.tracer.start_span(operation_name='test_trace')
+
+    with test_span:
+        parent()
+
+        # ``test_span`` is not started by a traced call, thus not detected by frame markers.
+        nested()
+
+    assert len(recorder.spans) == 4
+
+    assert recorder.spans[0].operation_name == 'nested'
+    assert recorder.spans[0].parent_id == recorder.spans[1].context.span_id
+
+    assert recorder.spans[1].operation_name == 'parent'
+    assert recorder.spans[1].parent_id == test_span.context.span_id
+
+    assert recorder.spans[2].operation_name == 'nested'
+    assert recorder.spans[2].parent_id is None
+
+    assert FRAME_SPANS == {}
+
+
+def test_trace_frame_markers_cleanup_on_error():
+
+    @trace()
+    def f1():
+        raise RuntimeError('failed')
+
+    opentracing.tracer = BasicTracer(recorder=Recorder())
+
+    with pytest.raises(RuntimeError):
+        f1()
+
+    assert FRAME_SPANS == {}
+
+
+def test_trace_generator_lazy_span():
+
+    @trace()
+    def gen():
+        time.sleep(0.05)
+        yield 1
+        time.sleep(0.05)
+        yield 2
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    g = gen()
+    assert recorder.spans == []
+
+    assert list(g) == [1, 2]
+
+    assert len(recorder.spans) == 1
+    assert recorder.spans[0].duration >= 0.1
+    assert recorder.spans[0].tags['generator.items'] == 2
+    assert recorder.spans[0].tags['generator.first_item_ms'] >= 50
+
+
+def test_trace_generator_nested_parent():
+
+    @trace()
+    def gen():
+        f1()
+        yield 1
+
+    @trace()
+    def f1():
+        pass
+
+    @trace()
+    def consumer():
+        for _ in gen():
+            # consumer calls do not get the generator span as parent.
+            f1()
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    consumer()
+
+    f1_in_gen, f1_in_consumer, gen_span, consumer_span = recorder.spans
+
+    assert gen_span.parent_id == consumer_span.context.span_id
+    assert f1_in_gen.parent_id == gen_span.context.span_id
+    assert f1_in_consumer.parent_id == consumer_span.context.span_id
+
+
+def test_trace_generator_close_and_error():
+
+    @trace()
+    def gen():
+        yield 1
+        raise RuntimeError('failed')
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    g = gen()
+    assert next(g) == 1
+    g.close()
+
+    assert len(recorder.spans) == 1
+    assert recorder.spans[0].tags['generator.items'] == 1
+    assert opentracing_tags.ERROR not in recorder.spans[0].tags
+
+    with pytest.raises(RuntimeError):
+        list(gen())
+
+    assert len(recorder.spans) == 2
+    assert recorder.spans[1].tags[opentracing_tags.ERROR] is True
+
+    # Abandoned iteration.
+    for _ in gen():
+        break
+
+    assert len(recorder.spans) == 3
+    assert FRAME_SPANS == {}
+
+
+def test_trace_generator_send():
+
+    @trace()
+    def gen():
+        received = yield 1
+        yield received
+
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    g = gen()
+    assert next(g) == 1
+    assert g.send('sent') == 'sent'
+
+    with pytest.raises(StopIteration):
+        next(g)
+
+    assert len(recorder.spans) == 1
+
+
+@pytest.mark.parametrize('pass_span', (True, False))
+def test_trace_noop_tracer(monkeypatch, pass_span):
+    opentracing.tracer = opentracing.Tracer()
+    monkeypatch.setattr(opentracing.tracer, 'start_span', MagicMock(side_effect=AssertionError('no span expected')))
+
+    @trace(pass_span=pass_span)
+    def f1(**kwargs):
+        return kwargs
+
+    @trace()
+    def gen():
+        yield 1
+
+    parent_span = opentracing.Span(opentracing.tracer, opentracing.SpanContext())
+
+    assert f1(x=1) == ({'x': 1, DEFAULT_SPAN_ARG_NAME: UNSAMPLED_SPAN} if pass_span else {'x': 1})
+    assert f1(span=parent_span) == ({'span': UNSAMPLED_SPAN} if pass_span else {})
+    assert list(gen()) == [1]
+
+
+def test_trace_noop_tracer_fixed_signature():
+    opentracing.tracer = opentracing.Tracer()
+
+    @trace()
+    def f(x, parent=None):
+        return x, parent
+
+    @trace()
+    def gen(x):
+        yield x
+
+    parent_span = opentracing.Span(opentracing.tracer, opentracing.SpanContext())
+
+    # No ``**kwargs``: only kwargs ``f`` does not accept are dropped.
+    assert f(1, span=parent_span) == (1, None)
+    assert f(x=1, parent=parent_span) == (1, parent_span)
+    assert list(gen(1, span=parent_span)) == [1]
+
+
+def test_trace_bound_tracer():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    bound_recorder = Recorder()
+    bound_tracer = BasicTracer(recorder=bound_recorder)
+
+    @trace(tracer=bound_tracer)
+    def bound():
+        return nested()
+
+    @trace(tracer=bound_tracer, pass_span=True)
+    def nested(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    @trace()
+    def global_tracer():
+        pass
+
+    span = bound()
+    global_tracer()
+
+    assert span.tracer is bound_tracer
+    assert [s.operation_name for s in bound_recorder.spans] == ['nested', 'bound']
+    assert bound_recorder.spans[0].parent_id == bound_recorder.spans[1].context.span_id
+    assert [s.operation_name for s in recorder.spans] == ['global_tracer']
+
+
+def test_trace_bound_noop_tracer():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(recorder=recorder)
+
+    @trace(tracer=opentracing.Tracer(), pass_span=True)
+    def f(**kwargs):
+        return extract_span_from_kwargs(**kwargs)
+
+    assert f() is UNSAMPLED_SPAN
+    assert recorder.spans == []
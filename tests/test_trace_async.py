@@ -0,0 +1,278 @@
+import asyncio
+
+import pytest
+
+import opentracing
+
+from opentracing.ext import tags as opentracing_tags
+
+from basictracer import BasicTracer
+
+from .conftest import Recorder
+from opentracing_utils import trace, extract_span_from_kwargs
+
+
+contextvars_scope_manager = pytest.importorskip('opentracing.scope_managers.contextvars')
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def recorder():
+    recorder = Recorder()
+    opentracing.tracer = BasicTracer(
+        recorder=recorder, scope_manager=contextvars_scope_manager.ContextVarsScopeManager())
+    return recorder
+
+
+def test_trace_coroutine(recorder):
+
+    @trace()
+    async def f1():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        with opentracing.tracer.start_active_span(operation_name='test_trace') as scope:
+            result = await f1()
+            return scope.span, result
+
+    test_span, result = run(main())
+
+    assert result == 'done'
+    assert len(recorder.spans) == 2
+
+    assert recorder.spans[0].operation_name == 'f1'
+    assert recorder.spans[0].context.trace_id == test_span.context.trace_id
+    assert recorder.spans[0].parent_id == test_span.context.span_id
+    # The span is kept open until the coroutine completes.
+    assert recorder.spans[0].duration >= 0.05
+
+
+def test_trace_coroutine_nested(recorder):
+
+    @trace()
+    async def parent():
+        await asyncio.gather(nested(), nested())
+
+    @trace(pass_span=True)
+    async def nested(**kwargs):
+        current_span = extract_span_from_kwargs(**kwargs)
+        assert current_span.operation_name == 'nested'
+        assert opentracing.tracer.active_span is current_span
+
+        await asyncio.sleep(0.01)
+
+    async def main():
+        with opentracing.tracer.start_active_span(operation_name='test_trace') as scope:
+            await parent()
+            return scope.span
+
+    test_span = run(main())
+
+    assert len(recorder.spans) == 4
+
+    parent_span = recorder.spans[2]
+    assert parent_span.operation_name == 'parent'
+    assert parent_span.parent_id == test_span.context.span_id
+
+    for span in recorder.spans[:2]:
+        assert span.context.trace_id == test_span.context.trace_id
+        assert span.parent_id == parent_span.context.span_id
+
+
+def test_trace_coroutine_concurrent_tasks(recorder):
+
+    @trace()
+    async def f1():
+        await asyncio.sleep(0.01)
+
+    async def task(name):
+        with opentracing.tracer.start_active_span(operation_name=name) as scope:
+            await f1()
+            return scope.span
+
+    async def main():
+        return await asyncio.gather(task('first'), task('second'))
+
+    first, second = run(main())
+
+    children = [s for s in recorder.spans if s.operation_name == 'f1']
+    assert len(children) == 2
+    assert {s.parent_id for s in children} == {first.context.span_id, second.context.span_id}
+
+    for span in children:
+        root = first if span.parent_id == first.context.span_id else second
+        assert span.context.trace_id == root.context.trace_id
+
+
+def test_trace_coroutine_error(recorder):
+
+    @trace()
+    async def f1():
+        raise RuntimeError('failed')
+
+    with pytest.raises(RuntimeError):
+        run(f1())
+
+    assert len(recorder.spans) == 1
+    assert recorder.spans[0].tags[opentracing_tags.ERROR] is True
+
+
+def test_trace_coroutine_skip_span(recorder):
+
+    @trace(skip_span=lambda skip_me: skip_me)
+    async def f1(skip_me):
+        return skip_me
+
+    assert run(f1(True)) is True
+    assert run(f1(False)) is False
+
+    assert len(recorder.spans) == 1
+
+
+def test_trace_async_generator(recorder):
+
+    @trace()
+    def f2():
+        pass
+
+    @trace()
+    async def agen(count):
+        for i in range(count):
+            f2()
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def main():
+        items = []
+        with opentracing.tracer.start_active_span(operation_name='test_trace') as scope:
+            async for i in agen(3):
+                # Consumer does not run inside the async generator span.
+                assert opentracing.tracer.active_span is scope.span
+                items.append(i)
+            return scope.span, items
+
+    test_span, items = run(main())
+
+    assert items == [0, 1, 2]
+    assert len(recorder.spans) == 5
+
+    agen_span = recorder.spans[3]
+    assert agen_span.operation_name == 'agen'
+    assert agen_span.parent_id == test_span.context.span_id
+    assert agen_span.duration >= 0.03
+
+    for span in recorder.spans[:3]:
+        assert span.operation_name == 'f2'
+        assert span.parent_id == agen_span.context.span_id
+
+
+def test_trace_async_generator_aclose(recorder):
+
+    @trace()
+    async def agen():
+        while True:
+            yield 1
+
+    async def main():
+        gen = agen()
+        assert await gen.__anext__() == 1
+        assert len(recorder.spans) == 0
+
+        await gen.aclose()
+
+    run(main())
+
+    assert len(recorder.spans) == 1
+    assert recorder.spans[0].operation_name == 'agen'
+
+
+@pytest.fixture
+def thread_local_recorder():
+    recorder = Recorder()
+    # Default ``ThreadLocalScopeManager``, shared by all the tasks of the event loop thread.
+    opentracing.tracer = BasicTracer(recorder=recorder)
+    return recorder
+
+
+def test_trace_coroutine_thread_local_scope_manager(thread_local_recorder):
+    recorder = thread_local_recorder
+
+    @trace()
+    def sync_child():
+        pass
+
+    @trace(pass_span=True)
+    async def a(**kwargs):
+        await asyncio.sleep(0.02)
+        await nested()
+        return extract_span_from_kwargs(**kwargs)
+
+    @trace(pass_span=True)
+    async def b(**kwargs):
+        await asyncio.sleep(0.01)
+        return extract_span_from_kwargs(**kwargs)
+
+    @trace()
+    async def nested():
+        sync_child()
+
+    @trace()
+    async def c():
+        pass
+
+    async def main():
+        spans = await asyncio.gather(a(), b())
+        await c()
+        return spans
+
+    a_span, b_span = run(main())
+
+    assert opentracing.tracer.active_span is None
+    assert {s.operation_name for s in recorder.spans} == {'a', 'b', 'c', 'nested', 'sync_child'}
+
+    spans = dict((s.operation_name, s) for s in recorder.spans)
+
+    # Concurrent tasks are siblings, and all finished.
+    assert spans['a'] is a_span and spans['b'] is b_span
+    assert spans['a'].parent_id is None
+    assert spans['b'].parent_id is None
+    assert spans['a'].context.trace_id != spans['b'].context.trace_id
+    assert spans['c'].parent_id is None
+
+    # Parents are passed through the task context, and the coroutine frame to sync traced calls.
+    assert spans['nested'].parent_id == a_span.context.span_id
+    assert spans['sync_child'].parent_id == spans['nested'].context.span_id
+
+
+def test_trace_async_generator_thread_local_scope_manager(thread_local_recorder):
+    recorder = thread_local_recorder
+
+    @trace()
+    async def child():
+        pass
+
+    @trace()
+    async def agen(count):
+        for i in range(count):
+            await child()
+            yield i
+
+    @trace()
+    async def consumer():
+        return [i async for i in agen(2)]
+
+    assert run(consumer()) == [0, 1]
+
+    spans = dict((s.operation_name, s) for s in recorder.spans)
+    assert len(recorder.spans) == 4
+    assert spans['agen'].parent_id == spans['consumer'].context.span_id
+    assert all(s.parent_id == spans['agen'].context.span_id for s in recorder.spans if s.operation_name == 'child')
+    assert opentracing.tracer.active_span is None
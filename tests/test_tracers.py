@@ -8,7 +8,9 @@ from .conftest import Recorder
 
 from basictracer import BasicTracer
 
-from opentracing_utils import init_opentracing_tracer
+from opentracing_utils import init_opentracing_tracer, RateLimitingSampler
+from opentracing_utils.tracers import (
+    get_propagation_keys, get_wsgi_carrier, is_noop_tracer, register_propagation_headers, set_propagation_keys)
 from opentracing_utils import OPENTRACING_INSTANA, OPENTRACING_BASIC, OPENTRACING_LIGHTSTEP, OPENTRACING_JAEGER
 
 
@@ -31,6 +33,24 @@ def test_init_basic():
     assert opentracing.tracer.recorder == recorder
 
 
+def test_init_basic_rate_limiting_sampler():
+    recorder = Recorder()
+
+    init_opentracing_tracer(OPENTRACING_BASIC, recorder=recorder, sampler=RateLimitingSampler(traces_per_second=1))
+
+    assert isinstance(opentracing.tracer, BasicTracer)
+
+    for _ in range(10):
+        with opentracing.tracer.start_span(operation_name='health') as span:
+            with opentracing.tracer.start_span(operation_name='child', child_of=span):
+                pass
+
+    with opentracing.tracer.start_span(operation_name='rare'):
+        pass
+
+    assert [s.operation_name for s in recorder.spans] == ['child', 'health', 'rare']
+
+
 def test_init_instana(monkeypatch):
     init_opentracing_tracer(OPENTRACING_INSTANA)
 
@@ -47,6 +67,23 @@ def test_init_lightstep(monkeypatch):
         collector_port=443, collector_encryption="tls", verbosity=2)
 
 
+def test_init_lightstep_scope_manager(monkeypatch):
+    tracer = MagicMock()
+    scope_manager = MagicMock()
+
+    monkeypatch.setattr('lightstep.Tracer', tracer)
+
+    init_opentracing_tracer(OPENTRACING_LIGHTSTEP, component_name='test_lightstep', scope_manager=scope_manager)
+
+    # Passed at construction.
+    assert tracer.call_args[1]['scope_manager'] is scope_manager
+
+
+def test_init_instana_scope_manager():
+    with pytest.raises(ValueError):
+        init_opentracing_tracer(OPENTRACING_INSTANA, scope_manager=MagicMock())
+
+
 def test_init_lightstep_env_vars(monkeypatch):
     tracer = MagicMock()
 
@@ -109,3 +146,134 @@ def test_init_jaeger_with_config(monkeypatch):
     config.assert_called_once_with(config={'logging': True}, service_name='component')
 
     assert opentracing.tracer == 'jaeger'
+
+
+def test_is_noop_tracer():
+    opentracing.tracer = opentracing.Tracer()
+    assert is_noop_tracer() is True
+    assert is_noop_tracer() is True
+
+    opentracing.tracer = BasicTracer()
+    assert is_noop_tracer() is False
+
+    opentracing.tracer = opentracing.Tracer()
+    assert is_noop_tracer() is True
+
+
+def test_propagation_keys_basic():
+    recorder = Recorder()
+    sampler = MagicMock()
+    tracer = BasicTracer(recorder=recorder, sampler=sampler)
+    tracer.register_required_propagators()
+    tracer.start_span = MagicMock()
+
+    names, prefixes = get_propagation_keys(tracer)
+
+    assert set(prefixes) == {'ot-tracer-', 'ot-baggage-'}
+    assert names == {'traceparent', 'tracestate', 'b3'}
+
+    # Learned once, from a probe span context: no span started, nor sampling decision.
+    assert get_propagation_keys(tracer) is get_propagation_keys(tracer)
+    tracer.start_span.assert_not_called()
+    sampler.sampled.assert_not_called()
+    assert recorder.spans == []
+
+
+def test_propagation_keys_jaeger():
+    jaeger_client = pytest.importorskip('jaeger_client')
+    from jaeger_client.reporter import NullReporter
+
+    sampler = MagicMock(wraps=jaeger_client.ConstSampler(True))
+    tracer = jaeger_client.Tracer(SERVICE_NAME, NullReporter(), sampler)
+
+    names, prefixes = get_propagation_keys(tracer)
+
+    assert {'uber-trace-id', 'jaeger-debug-id', 'jaeger-baggage'} <= names
+    assert prefixes == ('uberctx-',)
+    sampler.is_sampled.assert_not_called()
+
+
+def test_propagation_keys_unknown():
+    assert get_propagation_keys(opentracing.Tracer()) is None
+
+    # Unknown span context.
+    tracer = MagicMock()
+    assert get_propagation_keys(tracer) is None
+    tracer.inject.assert_not_called()
+
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+    tracer.inject = MagicMock(side_effect=Exception)
+    assert get_propagation_keys(tracer) is None
+
+    # ``extract`` replaced on the tracer: any header may be read.
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+    tracer.extract = MagicMock()
+    assert get_propagation_keys(tracer) is None
+
+
+def test_set_propagation_keys():
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+    environ = {'HTTP_OT_TRACER_TRACEID': '7b', 'HTTP_X_TRACE_ID': '1', 'HTTP_HOST': 'localhost'}
+
+    set_propagation_keys(tracer, (['X-Trace-Id'], ['OT-Tracer-']))
+    assert get_wsgi_carrier(environ, tracer) == {'ot-tracer-traceid': '7b', 'x-trace-id': '1'}
+
+    # Opt-out.
+    set_propagation_keys(tracer, None)
+    assert get_propagation_keys(tracer) is None
+    assert get_wsgi_carrier(environ, tracer) == {'ot-tracer-traceid': '7b', 'x-trace-id': '1', 'host': 'localhost'}
+
+
+def test_register_propagation_headers(monkeypatch):
+    monkeypatch.setattr('opentracing_utils.tracers._extra_propagation_keys', (frozenset(), ()))
+
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+    environ = {'HTTP_OT_TRACER_TRACEID': '7b', 'HTTP_X_TRACE_ID': '1', 'HTTP_X_TENANT_ID': 'a', 'HTTP_HOST': 'h'}
+
+    assert get_wsgi_carrier(environ, tracer) == {'ot-tracer-traceid': '7b'}
+
+    # Learned again with the extra headers.
+    register_propagation_headers(names=['X-Trace-Id'], prefixes=['x-tenant-'])
+
+    names, prefixes = get_propagation_keys(tracer)
+    assert 'x-trace-id' in names
+    assert 'x-tenant-' in prefixes
+    assert get_wsgi_carrier(environ, tracer) == {'ot-tracer-traceid': '7b', 'x-trace-id': '1', 'x-tenant-id': 'a'}
+
+
+def test_propagation_keys_unsupported_format(monkeypatch):
+    logger = MagicMock()
+    monkeypatch.setattr('opentracing_utils.tracers.logger', logger)
+
+    # No registered propagators.
+    assert get_propagation_keys(BasicTracer()) is None
+    logger.exception.assert_not_called()
+
+
+def test_get_wsgi_carrier():
+    tracer = BasicTracer()
+    tracer.register_required_propagators()
+
+    span = tracer.start_span('parent')
+    span.set_baggage_item('user', '42')
+
+    headers = {}
+    tracer.inject(span.context, opentracing.Format.HTTP_HEADERS, headers)
+    environ = dict(('HTTP_' + k.upper().replace('-', '_'), v) for k, v in headers.items())
+    environ.update(HTTP_HOST='localhost', HTTP_X_REQUEST_ID='1', HTTP_TRACEPARENT='00-1-2-01', REQUEST_METHOD='GET')
+
+    carrier = get_wsgi_carrier(environ, tracer)
+
+    assert carrier == dict(headers, traceparent='00-1-2-01')
+
+    span_ctx = tracer.extract(opentracing.Format.HTTP_HEADERS, carrier)
+    assert span_ctx.trace_id == span.context.trace_id
+    assert span_ctx.baggage == {'user': '42'}
+
+    # All the headers for unknown tracers.
+    assert dict(get_wsgi_carrier(environ, MagicMock())) == dict(
+        headers, host='localhost', traceparent='00-1-2-01', **{'x-request-id': '1'})